@@ -5,9 +5,17 @@ CAMPAIGN_SESSION = 'Updated session time for campaign "{}" with ID "{}" to "{}"'
 CAMPAIGN_CHANNEL = 'Updated channel for notifications for campaign "{}" with ID "{}" to "{}"'
 CAMPAIGN_ROLE = 'Updated notification role for campaign "{}" with ID "{}" to "{}"'
 CAMPAIGN_EXTRA_NOTIFICATION = 'Updated extra notification state for campaign "{}" with ID "{}" to "{}"'
+CAMPAIGN_REMINDER_LEAD = 'Updated reminder lead time for campaign "{}" with ID "{}" to {} minutes'
 
 ONESHOT_ADD = 'Added oneshot "{}" with ID "{}" by user "{}"'
 ONESHOT_DELETE = 'Deleted oneshot "{}" with ID "{}"'
 ONESHOT_DESCRIPTION = 'Updated description for oneshot "{}" with ID "{}" to "{}"'
 ONESHOT_CHANNEL = 'Updated channel for oneshot "{}" with ID "{}" to "{}"'
 ONESHOT_TIME = 'Updated time for oneshot "{}" with ID "{}" to "{}"'
+ONESHOT_REMINDER_LEAD = 'Updated reminder lead time for oneshot "{}" with ID "{}" to {} minutes'
+
+REMINDER_DROPPED = 'Dropped {} reminder for {} with ID "{}", it was {} minutes late'
+REMINDER_FAILED = 'Failed to send {} reminder for {} with ID "{}": {}'
+REMINDER_LOOP_FAILED = 'Error in the reminder loop, it keeps running: {}'
+
+STORE_WRITE_FAILED = 'Failed to write the database to "{}", retrying later: {}'
@@ -0,0 +1,123 @@
+import json
+import logging
+import sys
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from os import getenv
+from queue import SimpleQueue
+from typing import Dict, Optional, Tuple
+
+import ActionType
+
+# template -> (name of the action, kind of entity it changes, fields of the data the template is filled with)
+TEMPLATES: Dict[str, Tuple[str, Optional[str], Tuple[str, ...]]] = {
+    ActionType.CAMPAIGN_ADD: ('campaign_add', 'campaign', ('name', 'id', 'user')),
+    ActionType.CAMPAIGN_DELETE: ('campaign_delete', 'campaign', ('name', 'id')),
+    ActionType.CAMPAIGN_DESCRIPTION: ('campaign_description', 'campaign', ('name', 'id', 'description')),
+    ActionType.CAMPAIGN_SESSION: ('campaign_session', 'campaign', ('name', 'id', 'date')),
+    ActionType.CAMPAIGN_ROLE: ('campaign_role', 'campaign', ('name', 'id', 'role')),
+    ActionType.CAMPAIGN_CHANNEL: ('campaign_channel', 'campaign', ('name', 'id', 'channel')),
+    ActionType.CAMPAIGN_EXTRA_NOTIFICATION: ('campaign_extra_notification', 'campaign', ('name', 'id', 'status')),
+    ActionType.CAMPAIGN_REMINDER_LEAD: ('campaign_reminder_lead', 'campaign', ('name', 'id', 'lead')),
+    ActionType.ONESHOT_ADD: ('oneshot_add', 'oneshot', ('name', 'id', 'user')),
+    ActionType.ONESHOT_DELETE: ('oneshot_delete', 'oneshot', ('name', 'id')),
+    ActionType.ONESHOT_DESCRIPTION: ('oneshot_description', 'oneshot', ('name', 'id', 'description')),
+    ActionType.ONESHOT_TIME: ('oneshot_time', 'oneshot', ('name', 'id', 'date')),
+    ActionType.ONESHOT_CHANNEL: ('oneshot_channel', 'oneshot', ('name', 'id', 'channel')),
+    ActionType.ONESHOT_REMINDER_LEAD: ('oneshot_reminder_lead', 'oneshot', ('name', 'id', 'lead')),
+    # Reminders name the kind of entity they belong to in their data
+    ActionType.REMINDER_DROPPED: ('reminder_dropped', None, ('kind', 'entity', 'id', 'late')),
+    ActionType.REMINDER_FAILED: ('reminder_failed', None, ('kind', 'entity', 'id', 'error')),
+    ActionType.REMINDER_LOOP_FAILED: ('reminder_loop_failed', None, ('error',)),
+    ActionType.STORE_WRITE_FAILED: ('store_write_failed', None, ('file', 'error')),
+}
+
+# Guild, user and start of the command that is handled in the current task, set by the CommandRouter
+command_context: ContextVar[Optional[Tuple[Optional[int], Optional[int], float]]] = ContextVar('command_context', default=None)
+
+
+class JsonLineFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        line = {'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds')}
+        line.update(record.audit)
+        return json.dumps(line, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        return '[{}] {}'.format(datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S'), record.audit['message'])
+
+
+class AuditLog:
+    """Records every change as a JSON line in a log file that is rotated by size, and as a readable line on stdout.
+    The command handlers only put the record into a queue, formatting and writing happens in a background thread."""
+
+    def __init__(self) -> None:
+        self.logger = logging.getLogger('campaign-bot.audit')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.INFO)
+        self.console = getenv('AUDIT_LOG_CONSOLE', 'true') == 'true'
+        self.file_name = getenv('AUDIT_LOG_FILE', 'audit.log')
+        self.max_bytes = int(getenv('AUDIT_LOG_MAX_BYTES', str(10 * 1024 * 1024)))
+        self.backups = int(getenv('AUDIT_LOG_BACKUPS', '5'))
+        self.listener: Optional[QueueListener] = None
+        self.queue_handler: Optional[QueueHandler] = None
+
+    def start(self) -> None:
+        """Starts the background thread, done by the first record"""
+        handlers = []
+        if self.console:
+            console_handler = logging.StreamHandler(sys.stdout)
+            console_handler.setFormatter(ConsoleFormatter())
+            handlers.append(console_handler)
+        if self.file_name != '':
+            file_handler = RotatingFileHandler(self.file_name, maxBytes=self.max_bytes, backupCount=self.backups, encoding='utf-8')
+            file_handler.setFormatter(JsonLineFormatter())
+            handlers.append(file_handler)
+
+        queue = SimpleQueue()
+        self.queue_handler = QueueHandler(queue)
+        self.logger.addHandler(self.queue_handler)
+        self.listener = QueueListener(queue, *handlers, respect_handler_level=False)
+        self.listener.start()
+
+    def stop(self) -> None:
+        """Writes everything that is still queued, call before shutting down"""
+        if self.listener is not None:
+            self.logger.removeHandler(self.queue_handler)
+            self.listener.stop()
+            self.listener = None
+
+    @staticmethod
+    def begin_command(guild_id: Optional[int], user_id: Optional[int]) -> None:
+        """Everything logged until the command is handled is attributed to that guild and user"""
+        command_context.set((guild_id, user_id, time.perf_counter()))
+
+    def log(self, action_type: str, data: Dict) -> None:
+        if action_type in TEMPLATES:
+            action, entity_kind, fields = TEMPLATES[action_type]
+            message = action_type.format(*[data[field] for field in fields])
+        else:
+            action, entity_kind, message = 'unknown', None, '(empty message)'
+
+        context = command_context.get()
+        guild_id, user_id, started = context if context is not None else (data.get('guild'), None, None)
+        record = {
+            'action': action,
+            'message': message,
+            'guild': guild_id,
+            'user': user_id,
+            'entity': {'kind': entity_kind or data.get('entity'), 'id': data.get('id'), 'name': data.get('name')},
+            'latency_ms': round((time.perf_counter() - started) * 1000, 3) if started is not None else None,
+            'data': data
+        }
+
+        if self.listener is None:
+            self.start()
+        # Neither formatted nor written here, the record is only handed to the background thread
+        self.logger.info(message, extra={'audit': record})
+
+
+audit_log = AuditLog()
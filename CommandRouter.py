@@ -0,0 +1,75 @@
+from os import getenv
+from typing import Awaitable, Callable, Dict, FrozenSet, Optional, Tuple
+
+from discord import Member
+from discord.ext.commands import Context
+
+from AuditLog import audit_log
+from MessageHelper import MessageHelper
+from Metrics import metrics
+from MessageTypes import WARN
+
+Handler = Callable[[object, Member, Tuple], Awaitable[None]]
+
+
+class CommandRouter:
+    """Subcommands of one command, registered once at import. Gated subcommands need one of the roles listed in the roles variable,
+    whether a member has one of them is remembered until their roles change."""
+
+    def __init__(self, command: str, roles_variable: str) -> None:
+        self.command = command
+        self.roles_variable = roles_variable
+        self.routes: Dict[str, Tuple[Handler, bool]] = {}
+        role_string = getenv(roles_variable)
+        self.gated_roles: FrozenSet[int] = frozenset(map(int, role_string.split(','))) if role_string is not None else frozenset()
+        self.permissions: Dict[Tuple[Optional[int], int], bool] = {}
+        self.dispatch_count = 0
+        self.permission_hits = 0
+        self.permission_misses = 0
+
+    def register(self, subcommand: str, handler: Handler, gated: bool = False) -> None:
+        """The handler is called with the command instance, the member and the arguments after the subcommand"""
+        self.routes[subcommand] = (handler, gated)
+
+    def has_permission(self, member: Member) -> bool:
+        key = (getattr(getattr(member, 'guild', None), 'id', None), member.id)
+        if key in self.permissions:
+            self.permission_hits += 1
+            return self.permissions[key]
+
+        self.permission_misses += 1
+        permitted = any(role.id in self.gated_roles for role in getattr(member, 'roles', []))
+        self.permissions[key] = permitted
+        return permitted
+
+    def forget_member(self, guild_id: int, member_id: int) -> None:
+        """Call when the roles of a member changed or they left the guild"""
+        self.permissions.pop((guild_id, member_id), None)
+
+    def forget_guild(self, guild_id: int) -> None:
+        """Call when a role of the guild was deleted, which changes the roles of its members without an update for each of them"""
+        for key in [key for key in self.permissions.keys() if key[0] == guild_id]:
+            del self.permissions[key]
+
+    async def dispatch(self, target, context: Context, sender: Member, args: Tuple) -> None:
+        self.dispatch_count += 1
+        audit_log.begin_command(getattr(context.guild, 'id', None), getattr(sender, 'id', None))
+        subcommand = args[0] if len(args) > 0 else 'help'
+        if subcommand not in self.routes:
+            await MessageHelper.message(context, text='Unknown subcommand. Try `{}{} help` for a full list of subcommands'.format(target.prefix, self.command), message_type=WARN)
+            return
+
+        handler, gated = self.routes[subcommand]
+        if gated and not self.has_permission(sender):
+            await MessageHelper.message(context=context, text='You do not have the required role to use this command!', message_type=WARN)
+            return
+        with metrics.command_latency.time(self.command, subcommand):
+            await handler(target, sender, args[1:])
+
+    def stats(self) -> Dict:
+        return {
+            'dispatches': self.dispatch_count,
+            'permission_hits': self.permission_hits,
+            'permission_misses': self.permission_misses,
+            'cached_members': len(self.permissions)
+        }
@@ -1,11 +1,13 @@
-from datetime import datetime
 from typing import Any, Dict
 
-from discord import Embed, Color
+from discord import Embed, Color, Message
+from discord.abc import Messageable
 from discord.ext.commands import Context
 
 import ActionType
 import MessageTypes
+from AuditLog import audit_log
+from MessageQueue import dispatcher
 from MessageTypes import INFO, WARN, ERROR
 
 
@@ -13,35 +15,8 @@ class MessageHelper:
 
     @staticmethod
     def log(action_type: ActionType, data: Dict) -> None:
-
-        if action_type == ActionType.CAMPAIGN_ADD:
-            message = ActionType.CAMPAIGN_ADD.format(data['name'], data['id'], data['user'])
-        elif action_type == ActionType.CAMPAIGN_DELETE:
-            message = ActionType.CAMPAIGN_DELETE.format(data['name'], data['id'])
-        elif action_type == ActionType.CAMPAIGN_DESCRIPTION:
-            message = ActionType.CAMPAIGN_DESCRIPTION.format(data['name'], data['id'], data['description'])
-        elif action_type == ActionType.CAMPAIGN_SESSION:
-            message = ActionType.CAMPAIGN_SESSION.format(data['name'], data['id'], data['date'])
-        elif action_type == ActionType.CAMPAIGN_ROLE:
-            message = ActionType.CAMPAIGN_ROLE.format(data['name'], data['id'], data['role'])
-        elif action_type == ActionType.CAMPAIGN_CHANNEL:
-            message = ActionType.CAMPAIGN_CHANNEL.format(data['name'], data['id'], data['channel'])
-        elif action_type == ActionType.CAMPAIGN_EXTRA_NOTIFICATION:
-            message = ActionType.CAMPAIGN_EXTRA_NOTIFICATION.format(data['name'], data['id'], data['status'])
-        elif action_type == ActionType.ONESHOT_ADD:
-            message = ActionType.ONESHOT_ADD.format(data['name'], data['id'], data['user'])
-        elif action_type == ActionType.ONESHOT_DELETE:
-            message = ActionType.ONESHOT_DELETE.format(data['name'], data['id'])
-        elif action_type == ActionType.ONESHOT_DESCRIPTION:
-            message = ActionType.ONESHOT_DESCRIPTION.format(data['name'], data['id'], data['description'])
-        elif action_type == ActionType.ONESHOT_TIME:
-            message = ActionType.ONESHOT_TIME.format(data['name'], data['id'], data['date'])
-        elif action_type == ActionType.ONESHOT_CHANNEL:
-            message = ActionType.ONESHOT_CHANNEL.format(data['name'], data['id'], data['channel'])
-        else:
-            message = '(empty message)'
-
-        print('[{}] {}'.format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'), message))
+        """Hands the change to the audit log, which writes it in the background"""
+        audit_log.log(action_type, data)
 
     @staticmethod
     async def message(context: Context, text: str, message_type: MessageTypes) -> None:
@@ -58,4 +33,9 @@ class MessageHelper:
 
         embed.description = text
 
-        await context.send(embed=embed)
+        await MessageHelper.send(context, embed=embed)
+
+    @staticmethod
+    async def send(destination: Messageable, **kwargs) -> Message:
+        """Every message goes through the dispatcher, so replies and reminders share its queues and rate limit handling"""
+        return await dispatcher.send(destination, **kwargs)
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from collections import deque
+from os import getenv
+from typing import Dict, Optional
+
+from discord import HTTPException, RateLimited, Message
+from discord.abc import Messageable
+
+
+class MessageDispatcher:
+    """Sends all outgoing messages through one queue per channel. Channels are worked on concurrently, up to
+    SEND_CONCURRENCY sends at a time, and sends that hit a rate limit or a server error are retried with backoff."""
+
+    def __init__(self) -> None:
+        self.max_retries = int(getenv('SEND_MAX_RETRIES', '3'))
+        self.base_delay = 1.0
+        self.semaphore = asyncio.Semaphore(int(getenv('SEND_CONCURRENCY', '5')))
+        self.queues: Dict[int, asyncio.Queue] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+        self.sent_count = 0
+        self.failed_count = 0
+        self.retry_count = 0
+        self.latencies = deque(maxlen=1000)
+
+    @staticmethod
+    def channel_key(destination: Messageable) -> int:
+        # A Context sends to its channel, so both share one queue
+        return getattr(destination, 'channel', destination).id
+
+    async def send(self, destination: Messageable, **kwargs) -> Message:
+        """Queue a message for the destination and wait until it was sent, raises the error of the last attempt if it failed"""
+        future = asyncio.get_running_loop().create_future()
+        key = self.channel_key(destination)
+        queue = self.queues.setdefault(key, asyncio.Queue())
+        queue.put_nowait((destination, kwargs, future, time.monotonic()))
+
+        if key not in self.workers:
+            self.workers[key] = asyncio.create_task(self.work(key, queue))
+        return await future
+
+    async def work(self, key: int, queue: asyncio.Queue) -> None:
+        """Sends the messages of one channel in order, ends once the queue is empty"""
+        while not queue.empty():
+            destination, kwargs, future, queued_at = queue.get_nowait()
+            try:
+                message = await self.send_with_retries(destination, kwargs)
+            except Exception as error:
+                self.failed_count += 1
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                self.sent_count += 1
+                if not future.done():
+                    future.set_result(message)
+            self.latencies.append(time.monotonic() - queued_at)
+
+        # No await between the last empty check and here, so nothing can be queued in between
+        del self.workers[key]
+        del self.queues[key]
+
+    async def send_with_retries(self, destination: Messageable, kwargs: Dict) -> Message:
+        attempt = 0
+        while True:
+            try:
+                async with self.semaphore:
+                    return await destination.send(**kwargs)
+            except RateLimited as error:
+                if attempt >= self.max_retries:
+                    raise
+                delay = error.retry_after
+            except HTTPException as error:
+                if attempt >= self.max_retries or (error.status != 429 and error.status < 500):
+                    raise
+                delay = self.get_retry_after(error)
+
+            self.retry_count += 1
+            await asyncio.sleep(delay if delay is not None else self.base_delay * 2 ** attempt)
+            attempt += 1
+
+    @staticmethod
+    def get_retry_after(error: HTTPException) -> Optional[float]:
+        try:
+            return float(error.response.headers.get('Retry-After'))
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def queue_depth(self) -> int:
+        """Messages that are waiting to be sent, not counting the ones that are being sent right now"""
+        return sum(queue.qsize() for queue in self.queues.values())
+
+    def metrics(self) -> Dict:
+        latencies = sorted(self.latencies)
+        return {
+            'queue_depth': self.queue_depth(),
+            'active_channels': len(self.workers),
+            'sent': self.sent_count,
+            'failed': self.failed_count,
+            'retries': self.retry_count,
+            'latency_p50': latencies[len(latencies) // 2] if len(latencies) > 0 else None,
+            'latency_p95': latencies[int(len(latencies) * 0.95)] if len(latencies) > 0 else None
+        }
+
+
+dispatcher = MessageDispatcher()
@@ -0,0 +1,202 @@
+import asyncio
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from os import getenv
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+# Upper bounds in seconds, from a cache hit to a slow Discord round trip
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(label_names: Tuple[str, ...], label_values: Tuple, extra: str = '') -> str:
+    pairs = ['{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for name, value in zip(label_names, label_values)]
+    if extra != '':
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if len(pairs) > 0 else ''
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if not isinstance(value, int) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values: Dict[Tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} counter'.format(self.name)]
+        for label_values, value in self.values.items():
+            lines.append('{}{} {}'.format(self.name, format_labels(self.label_names, label_values), format_value(value)))
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.values: Dict[Tuple, float] = {}
+        # Returns label values -> value on every scrape, for values that are read instead of set
+        self.collect: Optional[Callable[[], Dict[Tuple, float]]] = None
+
+    def set(self, value: float, *label_values) -> None:
+        self.values[label_values] = value
+
+    def render(self) -> List[str]:
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} gauge'.format(self.name)]
+        values = self.collect() if self.collect is not None else self.values
+        for label_values, value in values.items():
+            lines.append('{}{} {}'.format(self.name, format_labels(self.label_names, label_values), format_value(value)))
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, label_names: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.description = description
+        self.label_names = label_names
+        self.buckets = buckets
+        # label values -> (count per bucket, the last one for values above all bounds, sum of all values)
+        self.values: Dict[Tuple, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *label_values) -> None:
+        if label_values not in self.values:
+            self.values[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+        counts, total = self.values[label_values]
+        counts[bisect_left(self.buckets, value)] += 1
+        total[0] += value
+
+    @contextmanager
+    def time(self, *label_values) -> Iterator[None]:
+        """Observes how long the block took, also when it raised"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values)
+
+    def render(self) -> List[str]:
+        lines = ['# HELP {} {}'.format(self.name, self.description), '# TYPE {} histogram'.format(self.name)]
+        for label_values, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(self.name, format_labels(self.label_names, label_values, 'le="{}"'.format(format_value(bound))), cumulative))
+            lines.append('{}_sum{} {}'.format(self.name, format_labels(self.label_names, label_values), format_value(total[0])))
+            lines.append('{}_count{} {}'.format(self.name, format_labels(self.label_names, label_values), cumulative))
+        return lines
+
+
+class Metrics:
+    """Counters and histograms of the bot, and gauges read from the stats of other parts when scraped.
+    Served in the Prometheus text format on METRICS_PORT, which is off unless the variable is set."""
+
+    def __init__(self) -> None:
+        self.started = time.monotonic()
+        self.command_latency = Histogram('campaignbot_command_seconds', 'Time to handle a subcommand, including the replies.', ('command', 'subcommand'))
+        self.store_operations = Histogram('campaignbot_store_seconds', 'Time of loading, recording and writing the stored data.', ('operation',))
+        self.store_errors = Counter('campaignbot_store_errors_total', 'Store operations that raised.', ('operation',))
+        self.reminder_tick = Histogram('campaignbot_reminder_tick_seconds', 'Time to handle the reminders that were due at once.')
+        self.reminder_send = Histogram('campaignbot_reminder_send_seconds', 'Time to send one reminder message.', ('outcome',))
+        self.event_loop_lag = Histogram('campaignbot_event_loop_lag_seconds', 'How much later than planned the event loop woke up a sleeping task.')
+        self.startup = Gauge('campaignbot_startup_seconds', 'Seconds from the start of the process until all of its shards were ready the first time.')
+        self.shard_ready = Gauge('campaignbot_shard_ready', 'Whether the shard is connected and ready.', ('shard',))
+        self.shard_ready_time = Gauge('campaignbot_shard_ready_seconds', 'Seconds from the start of the process until the shard was ready the first time.', ('shard',))
+        self.shard_latency = Gauge('campaignbot_shard_latency_seconds', 'Heartbeat latency of the shard.', ('shard',))
+        self.shard_events = Counter('campaignbot_shard_events_total', 'Connects, readies, disconnects and resumes per shard.', ('shard', 'event'))
+        self.metrics = [self.command_latency, self.store_operations, self.store_errors, self.reminder_tick, self.reminder_send, self.event_loop_lag,
+                        self.startup, self.shard_ready, self.shard_ready_time, self.shard_latency, self.shard_events]
+        # prefix -> function returning the gauges, called on every scrape
+        self.collectors: Dict[str, Callable[[], Dict]] = {}
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.lag_task: Optional[asyncio.Task] = None
+
+    def shard_event(self, shard_id: int, event: str) -> None:
+        """Call on every connect, ready, disconnect and resume of a shard"""
+        self.shard_events.inc(shard_id, event)
+        self.shard_ready.set(1 if event in ('ready', 'resumed') else 0, shard_id)
+        if event == 'ready' and (shard_id,) not in self.shard_ready_time.values:
+            self.shard_ready_time.set(round(time.monotonic() - self.started, 3), shard_id)
+
+    def all_shards_ready(self) -> None:
+        if () not in self.startup.values:
+            self.startup.set(round(time.monotonic() - self.started, 3))
+
+    def register_collector(self, prefix: str, collect: Callable[[], Dict]) -> None:
+        """Every number in the dict the function returns is exposed as a gauge named campaignbot_<prefix>_<key>"""
+        self.collectors[prefix] = collect
+
+    @contextmanager
+    def time_store(self, operation: str) -> Iterator[None]:
+        try:
+            with self.store_operations.time(operation):
+                yield
+        except Exception:
+            self.store_errors.inc(operation)
+            raise
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for prefix, collect in self.collectors.items():
+            for key, value in collect().items():
+                # Values that are not known yet, e.g. percentiles without any sample, are left out
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                name = 'campaignbot_{}_{}'.format(prefix, key)
+                lines.extend(['# TYPE {} gauge'.format(name), '{} {}'.format(name, format_value(value))])
+        return '\n'.join(lines) + '\n'
+
+    async def start(self) -> None:
+        port = getenv('METRICS_PORT', '')
+        if port == '' or self.server is not None:
+            return
+        self.server = await asyncio.start_server(self.handle_request, getenv('METRICS_HOST', '127.0.0.1'), int(port))
+        self.lag_task = asyncio.create_task(self.measure_event_loop_lag(float(getenv('METRICS_LAG_INTERVAL', '1'))))
+
+    async def stop(self) -> None:
+        if self.lag_task is not None:
+            self.lag_task.cancel()
+            self.lag_task = None
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    async def measure_event_loop_lag(self, interval: float) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            planned = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.event_loop_lag.observe(max(0.0, loop.time() - planned))
+
+    async def handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answers every GET with the metrics, the scraper is the only client"""
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # The headers are not needed, but have to be read before answering
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b'\r\n', b'\n', b''):
+                pass
+            if request_line.startswith(b'GET '):
+                status, body = '200 OK', self.render().encode()
+            else:
+                status, body = '405 Method Not Allowed', b''
+            writer.write('HTTP/1.1 {}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\nContent-Length: {}\r\nConnection: close\r\n\r\n'.format(status, len(body)).encode() + body)
+            await writer.drain()
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+metrics = Metrics()
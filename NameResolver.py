@@ -0,0 +1,97 @@
+from typing import Dict, List, Optional
+
+from discord import Guild, Role, TextChannel
+
+
+class NameResolver:
+    """Role and text channel IDs by name per guild, so commands do not have to scan every role or channel of the guild.
+    The names of a guild are indexed on its first lookup and kept up to date from the role and channel events."""
+
+    def __init__(self) -> None:
+        # guild id -> name -> IDs with that name, role names are lowercase since they match case-insensitively
+        self.roles: Dict[int, Dict[str, List[int]]] = {}
+        self.channels: Dict[int, Dict[str, List[int]]] = {}
+        # guild id -> ID -> indexed name, to find the old name on updates and deletions
+        self.role_names: Dict[int, Dict[int, str]] = {}
+        self.channel_names: Dict[int, Dict[int, str]] = {}
+
+    @staticmethod
+    def add(ids_by_name: Dict[str, List[int]], names: Dict[int, str], name: str, object_id: int) -> None:
+        ids_by_name.setdefault(name, []).append(object_id)
+        names[object_id] = name
+
+    @staticmethod
+    def remove(ids_by_name: Dict[str, List[int]], names: Dict[int, str], object_id: int) -> None:
+        name = names.pop(object_id, None)
+        if name is None:
+            return
+        ids_by_name[name].remove(object_id)
+        if len(ids_by_name[name]) == 0:
+            del ids_by_name[name]
+
+    def index_roles(self, guild: Guild) -> None:
+        self.roles[guild.id], self.role_names[guild.id] = {}, {}
+        for role in guild.roles:
+            self.add(self.roles[guild.id], self.role_names[guild.id], role.name.lower(), role.id)
+
+    def index_channels(self, guild: Guild) -> None:
+        self.channels[guild.id], self.channel_names[guild.id] = {}, {}
+        for channel in guild.text_channels:
+            self.add(self.channels[guild.id], self.channel_names[guild.id], channel.name, channel.id)
+
+    def find_role(self, guild: Guild, name: str) -> Optional[Role]:
+        """The first role of the guild with that name, ignoring case"""
+        if guild.id not in self.roles:
+            self.index_roles(guild)
+        roles = [role for role in map(guild.get_role, self.roles[guild.id].get(name.lower(), [])) if role is not None]
+        # Of several roles with the same name, the one that comes first in guild.roles, which is sorted like this
+        return min(roles, key=lambda role: (role.position, role.id)) if len(roles) > 0 else None
+
+    def find_channel(self, guild: Guild, name: str) -> Optional[TextChannel]:
+        """The first text channel of the guild with exactly that name"""
+        if guild.id not in self.channels:
+            self.index_channels(guild)
+        channels = [channel for channel in map(guild.get_channel, self.channels[guild.id].get(name, [])) if channel is not None]
+        # The order of guild.text_channels, as above
+        return min(channels, key=lambda channel: (channel.position, channel.id)) if len(channels) > 0 else None
+
+    def role_changed(self, role: Role) -> None:
+        """Call when a role was created or renamed"""
+        guild_id = role.guild.id
+        if guild_id in self.roles:
+            self.remove(self.roles[guild_id], self.role_names[guild_id], role.id)
+            self.add(self.roles[guild_id], self.role_names[guild_id], role.name.lower(), role.id)
+
+    def role_deleted(self, role: Role) -> None:
+        guild_id = role.guild.id
+        if guild_id in self.roles:
+            self.remove(self.roles[guild_id], self.role_names[guild_id], role.id)
+
+    def channel_changed(self, channel) -> None:
+        """Call when a channel was created or renamed, only text channels are indexed"""
+        guild_id = channel.guild.id
+        if guild_id not in self.channels:
+            return
+        self.remove(self.channels[guild_id], self.channel_names[guild_id], channel.id)
+        if isinstance(channel, TextChannel):
+            self.add(self.channels[guild_id], self.channel_names[guild_id], channel.name, channel.id)
+
+    def channel_deleted(self, channel) -> None:
+        guild_id = channel.guild.id
+        if guild_id in self.channels:
+            self.remove(self.channels[guild_id], self.channel_names[guild_id], channel.id)
+
+    def forget_guild(self, guild_id: int) -> None:
+        """Call when the bot left the guild"""
+        for index in (self.roles, self.channels, self.role_names, self.channel_names):
+            index.pop(guild_id, None)
+
+    def stats(self) -> Dict:
+        return {
+            'guilds': len(set(self.roles.keys()) | set(self.channels.keys())),
+            'roles': sum(len(names) for names in self.role_names.values()),
+            'channels': sum(len(names) for names in self.channel_names.values())
+        }
+
+
+name_resolver = NameResolver()
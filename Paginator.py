@@ -0,0 +1,95 @@
+from typing import Callable, Dict, List, Optional, Tuple
+
+from discord import ButtonStyle, Color, Embed, HTTPException, Interaction, Message
+from discord.abc import Messageable
+from discord.ui import Button, View, button
+
+from MessageHelper import MessageHelper
+from database import Database, sort_key
+
+
+class Paginator(View):
+    """Shows campaigns or oneshots one page at a time. Only the shown page is fetched from the database,
+    the buttons fetch the page before or after it, starting at the sort key of its first or last entry."""
+
+    def __init__(self, db: Database, kind: str, order: str, title: str, empty_text: str, render_entry: Callable[[Dict], Tuple[str, str]], page_size: int = 10,
+                 guild_id: Optional[int] = None, colour: Color = Color.blue(), timeout: float = 300) -> None:
+        super().__init__(timeout=timeout)
+        self.db = db
+        self.kind = kind
+        self.order = order
+        self.title = title
+        self.empty_text = empty_text
+        self.render_entry = render_entry
+        self.page_size = page_size
+        self.guild_id = guild_id
+        self.colour = colour
+        self.page: List[Dict] = []
+        self.page_number = 1
+        self.has_previous = False
+        self.has_next = False
+        self.message: Optional[Message] = None
+
+    async def start(self, destination: Messageable) -> None:
+        self.page, self.has_next = await self.db.list_page(self.kind, self.order, limit=self.page_size, guild_id=self.guild_id)
+        self.update_buttons()
+        embed = await self.build_embed()
+        # A single page does not need any buttons
+        if self.has_next:
+            self.message = await MessageHelper.send(destination, embed=embed, view=self)
+        else:
+            self.stop()
+            await MessageHelper.send(destination, embed=embed)
+
+    async def build_embed(self) -> Embed:
+        if len(self.page) == 0:
+            return Embed(colour=self.colour, title=self.title, description=self.empty_text)
+
+        first = (self.page_number - 1) * self.page_size + 1
+        embed = Embed(colour=self.colour, title='{} (showing {}-{} of {})'.format(self.title, first, first + len(self.page) - 1, await self.db.count_entries(self.kind, self.guild_id)), description='')
+        for entry in self.page:
+            name, value = self.render_entry(entry)
+            embed.add_field(name=name, value=value, inline=False)
+        return embed
+
+    def update_buttons(self) -> None:
+        self.previous_page.disabled = not self.has_previous
+        self.next_page.disabled = not self.has_next
+
+    async def turn_page(self, interaction: Interaction, forward: bool) -> None:
+        cursor = sort_key(self.order, self.page[-1] if forward else self.page[0])
+        page, has_more = await self.db.list_page(self.kind, self.order, cursor, forward, self.page_size, self.guild_id)
+
+        if len(page) == 0:
+            # Everything in that direction was deleted in the meantime
+            page, has_more = await self.db.list_page(self.kind, self.order, limit=self.page_size, guild_id=self.guild_id)
+            forward = True
+            self.page_number = 1
+        elif forward:
+            self.page_number += 1
+        else:
+            self.page_number = self.page_number - 1 if has_more else 1
+
+        self.page = page
+        if forward:
+            self.has_previous, self.has_next = self.page_number > 1, has_more
+        else:
+            self.has_previous, self.has_next = has_more, True
+        self.update_buttons()
+        await interaction.response.edit_message(embed=await self.build_embed(), view=self)
+
+    @button(label='Previous', style=ButtonStyle.secondary)
+    async def previous_page(self, interaction: Interaction, _: Button) -> None:
+        await self.turn_page(interaction, forward=False)
+
+    @button(label='Next', style=ButtonStyle.secondary)
+    async def next_page(self, interaction: Interaction, _: Button) -> None:
+        await self.turn_page(interaction, forward=True)
+
+    async def on_timeout(self) -> None:
+        if self.message is None:
+            return
+        try:
+            await self.message.edit(view=None)
+        except HTTPException:
+            pass
@@ -0,0 +1,112 @@
+import asyncio
+import heapq
+import time
+from itertools import count
+from typing import Callable, Dict, List, Optional
+
+from TimeHelper import TimeHelper
+
+DEFAULT_REMINDER_LEAD = 60
+MAX_REMINDER_LEAD = 7 * 24 * 60
+GAME_DAY_HOUR = 9
+# Upper bound for one sleep, so that changes of the system clock are noticed eventually
+MAX_SLEEP = 60
+
+
+class ReminderScheduler:
+    """Keeps the upcoming reminders of all campaigns and oneshots in a heap ordered by their due time.
+    Reminders of an entry are recomputed only when that entry changes."""
+
+    def __init__(self, clock: Callable[[], float] = time.time, max_lateness: float = 30 * 60) -> None:
+        self.clock = clock
+        self.max_lateness = max_lateness
+        self.heap = []
+        self.generations: Dict[str, int] = {}
+        self.sequence = count()
+        self.changed = asyncio.Event()
+
+    @staticmethod
+    def reminders_for(kind: str, entry_id: str, entry: Dict) -> List[Dict]:
+        """Campaigns need a session, a role and a channel, oneshots a time and a channel"""
+        if kind == 'campaigns':
+            start = entry.get('session_ts')
+            role = int(entry['role']) if 'role' in entry else None
+            if role is None:
+                return []
+        else:
+            start = entry.get('time_ts')
+            role = None
+        if start is None or entry.get('channel') is None:
+            return []
+
+        start = int(start)
+        lead = int(entry.get('reminder_lead', DEFAULT_REMINDER_LEAD))
+        reminder = {'source': kind, 'id': entry_id, 'name': entry['name'], 'session': start, 'display_time': TimeHelper.display_timestamp(start), 'lead': lead, 'role': role, 'channel': int(entry['channel']),
+                    'guild': entry.get('guild_id')}
+        reminders = [dict(reminder, kind='lead', due=start - lead * 60)]
+        if kind == 'campaigns' and entry.get('extra-notification', 'false') == 'true':
+            reminders.append(dict(reminder, kind='game-day', due=int(TimeHelper.morning_of(TimeHelper.from_epoch(start), GAME_DAY_HOUR).timestamp())))
+        for single_reminder in reminders:
+            # The due time is part of the key, so moving the session results in a new reminder
+            single_reminder['key'] = '{}:{}:{}:{}'.format(kind, entry_id, single_reminder['kind'], single_reminder['due'])
+        return reminders
+
+    def clear(self) -> None:
+        self.heap = []
+        self.changed.set()
+
+    def update_entry(self, kind: str, entry_id: str, entry: Optional[Dict]) -> List[Dict]:
+        """(Re-)schedule the reminders of a campaign or oneshot, None removes them.
+        Returns the reminders that were not scheduled because they are later than the allowed lateness already."""
+        # Heap entries of older generations are skipped instead of searched and removed
+        generation_key = '{}:{}'.format(kind, entry_id)
+        generation = self.generations.get(generation_key, 0) + 1
+        self.generations[generation_key] = generation
+
+        too_late = []
+        if entry is not None:
+            # Reminders that are overdue but within the allowed lateness are still scheduled, e.g. after a restart
+            earliest_due = self.clock() - self.max_lateness
+            for reminder in self.reminders_for(kind, entry_id, entry):
+                reminder['generation'] = generation
+                if reminder['due'] >= earliest_due:
+                    heapq.heappush(self.heap, (reminder['due'], next(self.sequence), generation, reminder))
+                else:
+                    too_late.append(reminder)
+        self.changed.set()
+        return too_late
+
+    def retry(self, reminder: Dict, delay: float) -> None:
+        """Schedule a reminder that could not be sent again after the delay, unless its entry changed since"""
+        if self.generations.get('{}:{}'.format(reminder['source'], reminder['id'])) != reminder['generation']:
+            return
+        heapq.heappush(self.heap, (self.clock() + delay, next(self.sequence), reminder['generation'], reminder))
+        self.changed.set()
+
+    def is_current(self, entry: tuple) -> bool:
+        return self.generations.get('{}:{}'.format(entry[3]['source'], entry[3]['id'])) == entry[2]
+
+    def next_due(self) -> Optional[float]:
+        while len(self.heap) > 0 and not self.is_current(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if len(self.heap) > 0 else None
+
+    def pop_due(self) -> List[Dict]:
+        """All reminders that are due by now, in order, including the ones that are overdue"""
+        now = self.clock()
+        due = []
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if self.is_current(entry):
+                due.append(entry[3])
+        return due
+
+    async def wait_for_due(self) -> None:
+        """Sleep until the next reminder is due or the schedule changes"""
+        self.changed.clear()
+        next_due = self.next_due()
+        timeout = MAX_SLEEP if next_due is None else min(MAX_SLEEP, max(0.0, next_due - self.clock()))
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
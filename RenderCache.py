@@ -0,0 +1,81 @@
+import json
+from collections import OrderedDict
+from os import getenv
+from typing import Callable, Dict, Optional, Tuple
+
+from discord import Embed
+
+
+class RenderCache:
+    """Rendered detail embeds per (guild, kind, entry id, version), least recently used ones are evicted first.
+    The version of an entry is raised by every change of it, so embeds rendered before a change are never served after it."""
+
+    def __init__(self) -> None:
+        self.max_entries = int(getenv('RENDER_CACHE_SIZE', '500'))
+        self.max_bytes = int(getenv('RENDER_CACHE_MAX_BYTES', str(1024 * 1024)))
+        self.payloads: OrderedDict[Tuple, Tuple[Dict, int]] = OrderedDict()
+        self.versions: Dict[Tuple[str, str], int] = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def version(self, kind: str, entry_id: str) -> int:
+        return self.versions.get((kind, entry_id), 0)
+
+    def on_database_change(self, kind: str, entry_id: Optional[str], _: Optional[Dict]) -> None:
+        if entry_id is None:
+            # Everything of that kind may have changed, e.g. after a reload
+            for version_key in [version_key for version_key in self.versions.keys() if version_key[0] == kind]:
+                self.versions[version_key] += 1
+            for key in [key for key in self.payloads.keys() if key[1] == kind]:
+                self.remove(key)
+            return
+
+        version_key = (kind, entry_id)
+        self.versions[version_key] = self.versions.get(version_key, 0) + 1
+        for key in [key for key in self.payloads.keys() if key[1:3] == version_key]:
+            self.remove(key)
+
+    def get_or_render(self, guild_id: Optional[int], kind: str, entry: Dict, render: Callable[[Dict], Embed]) -> Embed:
+        """The cached embed of the entry, rendered with the given function if there is none"""
+        entry_id = str(entry['id'])
+        key = (guild_id, kind, entry_id, self.version(kind, entry_id))
+        if key in self.payloads:
+            self.hits += 1
+            self.payloads.move_to_end(key)
+            # Every caller gets its own Embed, so nobody can change the cached one
+            return Embed.from_dict(self.payloads[key][0])
+
+        self.misses += 1
+        embed = render(entry)
+        self.put(key, embed.to_dict())
+        return embed
+
+    def put(self, key: Tuple, payload: Dict) -> None:
+        size = len(json.dumps(payload))
+        if size > self.max_bytes:
+            return
+        if key in self.payloads:
+            self.remove(key)
+        self.payloads[key] = (payload, size)
+        self.size += size
+        while len(self.payloads) > self.max_entries or self.size > self.max_bytes:
+            self.remove(next(iter(self.payloads)))
+            self.evictions += 1
+
+    def remove(self, key: Tuple) -> None:
+        _, size = self.payloads.pop(key)
+        self.size -= size
+
+    def stats(self) -> Dict:
+        return {
+            'entries': len(self.payloads),
+            'bytes': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+render_cache = RenderCache()
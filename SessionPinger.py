@@ -1,64 +1,226 @@
-from datetime import datetime, timedelta
-from typing import Dict, List
+import asyncio
+import time
+from os import getenv
+from typing import Callable, Dict, Optional, List, Set, Tuple
 
-import pytz
-from discord import Guild, TextChannel, Embed, Color
-from discord.ext import tasks
+from discord import Client, Guild, TextChannel, Embed, Color
 
+import ActionType
+from MessageHelper import MessageHelper
+from Metrics import metrics
+from ReminderScheduler import ReminderScheduler
+from TimeHelper import TimeHelper
 from database import Database
 
+BATCH_TITLE = 'Session Reminders'
+# Discord's limits for a single embed
+MAX_EMBED_FIELDS = 25
+MAX_EMBED_LENGTH = 6000
+MAX_FIELD_NAME_LENGTH = 256
+
 
 class SessionPinger:
-    def __init__(self, guild: Guild):
-        self.guild = guild
-
-    async def get_session_times(self) -> List[Dict]:
-        session_times = []
-
-        db = Database()
-        campaigns = await db.list_campaigns()
-
-        for campaign in campaigns.values():
-            session_time = str(campaign['session']) if 'session' in campaign else None
-            role_id = int(campaign['role']) if 'role' in campaign else None
-            channel_id = int(campaign['channel']) if 'channel' in campaign else None
-
-            if session_time is not None and role_id is not None and channel_id is not None:
-                role = self.guild.get_role(role_id)
-                channel = self.guild.get_channel(channel_id)
-                if role is not None and channel is not None:
-                    session_times.append({'time': session_time, 'role': role_id, 'channel': channel_id, 'extra-notification': campaign['extra-notification'] if 'extra-notification' in campaign else 'false'})
-
-        return session_times
-
-    @tasks.loop(minutes=1)
-    async def perform_loop(self):
-        session_times = await self.get_session_times()
-        current = pytz.timezone('Europe/Berlin').localize(datetime.now().replace(second=0, microsecond=0))
-
-        for session_data in session_times:
-            session_time = pytz.timezone('Europe/Berlin').localize(datetime.strptime(session_data['time'], '%Y-%m-%d %I:%M%p'))
-
-            if current + timedelta(hours=1) == session_time:
-                channel: TextChannel = self.guild.get_channel(session_data['channel'])
-                if channel is not None:
-                    await channel.send(content='<@&{}>'.format(session_data['role']), embed=Embed(
-                        title='Session Reminder',
-                        colour=Color.orange(),
-                        description='The session starts in 1 hour, at <t:{0}> (<t:{0}:R>)'.format(int(session_time.replace(tzinfo=pytz.timezone('utc')).timestamp()))
-                    ))
-
-            if session_data['extra-notification'] == 'true':
-                today_morning = pytz.timezone('Europe/Berlin').localize(datetime.now().replace(second=0, microsecond=0, minute=0, hour=9))
-
-                if today_morning == current and current.date() == session_time.date():
-                    channel: TextChannel = self.guild.get_channel(session_data['channel'])
-                    if channel is not None:
-                        await channel.send(content='<@&{}>'.format(session_data['role']), embed=Embed(
-                            title='Session Reminder',
-                            colour=Color.orange(),
-                            description='Today is game day! The session is at <t:{0}> (<t:{0}:R>)'.format(int(session_time.replace(tzinfo=pytz.timezone('utc')).timestamp()))
-                        ))
+    """One reminder loop for all guilds of the shards this process runs. Entries of guilds on other shards are left to the processes running those."""
+
+    def __init__(self, client: Client, db: Database, owns_guild: Callable[[Optional[int]], bool] = lambda guild_id: True):
+        self.client = client
+        self.db = db
+        self.owns_guild = owns_guild
+        self.scheduler = ReminderScheduler(max_lateness=int(getenv('REMINDER_MAX_LATENESS', '30')) * 60)
+        # Seconds until a reminder that could not be sent is tried again, as long as it is within the allowed lateness
+        self.retry_delay = int(getenv('REMINDER_RETRY_DELAY', '60'))
+        self.sent_reminders: Set[str] = set()
+        # Reminders that were missed can only be told apart from those that were sent once the sent ones are loaded
+        self.sent_reminders_loaded = False
+        # kind:id of the entries that belong to guilds of other shards
+        self.foreign_entries: Set[str] = set()
+        self.task: Optional[asyncio.Task] = None
+        # The event loop only keeps weak references to tasks, these must not be collected before they are done
+        self.reschedule_tasks: Set[asyncio.Task] = set()
+        self.db.subscribe(self.on_database_change)
+
+    async def start(self) -> None:
+        # on_ready is called again after reconnects, the loop keeps running through those
+        if self.task is not None and not self.task.done():
+            return
+        # Reminders of sessions that started are not scheduled anymore, those of upcoming sessions must be kept to not be taken for missed ones
+        await self.db.prune_sent_reminders(self.scheduler.clock())
+        self.sent_reminders = set((await self.db.list_sent_reminders()).keys())
+        self.sent_reminders_loaded = True
+        # Which guilds belong to this process is only known once the shards connected, so everything scheduled before is redone
+        await self.reschedule_all()
+        self.task = asyncio.create_task(self.perform_loop())
+
+    async def schedule_all(self, kind: str) -> None:
+        entries = await (self.db.list_campaigns() if kind == 'campaigns' else self.db.list_oneshots())
+        for entry_id, entry in entries.items():
+            self.schedule(kind, entry_id, entry)
+
+    async def reschedule_all(self) -> None:
+        self.scheduler.clear()
+        self.foreign_entries.clear()
+        await self.schedule_all('campaigns')
+        await self.schedule_all('oneshots')
+
+    def on_database_change(self, kind: str, entry_id: Optional[str], entry: Optional[Dict]) -> None:
+        if entry_id is not None:
+            self.schedule(kind, entry_id, entry)
+        elif kind == 'oneshots':
+            # A reload notifies for campaigns and oneshots, rescheduling once is enough
+            task = asyncio.create_task(self.reschedule_all())
+            self.reschedule_tasks.add(task)
+            task.add_done_callback(self.reschedule_done)
+
+    def reschedule_done(self, task: asyncio.Task) -> None:
+        self.reschedule_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            MessageHelper.log(ActionType.REMINDER_LOOP_FAILED, {'error': task.exception()})
+
+    def schedule(self, kind: str, entry_id: str, entry: Optional[Dict]) -> None:
+        key = '{}:{}'.format(kind, entry_id)
+        if entry is not None and not self.owns_guild(entry.get('guild_id')):
+            # Also removes reminders scheduled while the entry belonged to a guild of this process
+            self.foreign_entries.add(key)
+            entry = None
+        else:
+            self.foreign_entries.discard(key)
+        now = self.scheduler.clock()
+        for reminder in self.scheduler.update_entry(kind, entry_id, entry):
+            # Reminders of sessions that already started are history, the ones missed for an upcoming session were dropped
+            if self.sent_reminders_loaded and reminder['key'] not in self.sent_reminders and reminder['session'] > now:
+                self.log_dropped(reminder, now)
+                # Not logged again when the entry changes later on
+                self.sent_reminders.add(reminder['key'])
+
+    async def perform_loop(self) -> None:
+        while True:
+            await self.scheduler.wait_for_due()
+            try:
+                with metrics.reminder_tick.time():
+                    await self.tick()
+            except Exception as error:
+                # E.g. a reload of a half-written file, the reminders of all guilds must not end with it
+                MessageHelper.log(ActionType.REMINDER_LOOP_FAILED, {'error': error})
+                # Reminders that were not popped yet are still due, waiting keeps the loop from failing over and over
+                await asyncio.sleep(self.retry_delay)
+
+    async def tick(self) -> None:
+        """Sends all reminders that are due by now"""
+        # Picks up changes made to the file outside the bot, the reload notifies us to reschedule
+        self.db.reload_if_changed()
+        reminders_by_guild = self.partition_by_guild(await self.filter_due(self.scheduler.pop_due()))
+        if len(reminders_by_guild) > 0:
+            await asyncio.gather(*[self.send_reminders(guild, reminders) for guild, reminders in reminders_by_guild.items()])
+
+    async def filter_due(self, reminders: List[Dict]) -> List[Dict]:
+        """Leaves out reminders that were already sent and drops those that are later than the allowed lateness"""
+        now = self.scheduler.clock()
+        due = []
+        for reminder in reminders:
+            if reminder['key'] in self.sent_reminders:
+                continue
+            if now - reminder['due'] > self.scheduler.max_lateness:
+                self.log_dropped(reminder, now)
+                await self.mark_sent(reminder)
+                continue
+            due.append(reminder)
+        return due
+
+    @staticmethod
+    def log_dropped(reminder: Dict, now: float) -> None:
+        MessageHelper.log(ActionType.REMINDER_DROPPED, {'kind': reminder['kind'], 'entity': reminder['source'][:-1], 'guild': reminder.get('guild'), 'id': reminder['id'], 'name': reminder['name'], 'late': int((now - reminder['due']) // 60)})
+
+    async def mark_sent(self, reminder: Dict) -> None:
+        self.sent_reminders.add(reminder['key'])
+        await self.db.mark_reminder_sent(reminder['key'], reminder['due'], reminder['session'])
+
+    def partition_by_guild(self, reminders: List[Dict]) -> Dict[Guild, List[Dict]]:
+        """Reminders of entries that were not assigned to a guild yet go to the guild that has their channel"""
+        reminders_by_guild = {}
+        for reminder in reminders:
+            if reminder['guild'] is not None:
+                guild = self.client.get_guild(reminder['guild'])
+            else:
+                guild = getattr(self.client.get_channel(reminder['channel']), 'guild', None)
+            if guild is None or guild.get_channel(reminder['channel']) is None or (reminder['role'] is not None and guild.get_role(reminder['role']) is None):
+                continue
+            reminders_by_guild.setdefault(guild, []).append(reminder)
+        return reminders_by_guild
+
+    async def send_reminders(self, guild: Guild, reminders: List[Dict]) -> None:
+        reminders_by_channel = {}
+        for reminder in reminders:
+            reminders_by_channel.setdefault(reminder['channel'], []).append(reminder)
+        # The dispatcher keeps the order per channel and limits how many are sent at once
+        await asyncio.gather(*[self.deliver(guild.get_channel(channel_id), channel_reminders) for channel_id, channel_reminders in reminders_by_channel.items()])
+
+    async def deliver(self, channel: TextChannel, reminders: List[Dict]) -> None:
+        for batch, message in self.build_messages(reminders):
+            start = time.perf_counter()
+            try:
+                await MessageHelper.send(channel, **message)
+            except Exception as error:
+                metrics.reminder_send.observe(time.perf_counter() - start, 'failed')
+                # One failing guild or channel must not keep the others from getting their reminders
+                for reminder in batch:
+                    MessageHelper.log(ActionType.REMINDER_FAILED, {'kind': reminder['kind'], 'entity': reminder['source'][:-1], 'guild': reminder.get('guild'), 'id': reminder['id'], 'name': reminder['name'], 'error': error})
+                    # Tried again later, filter_due drops it if that is too late by then
+                    self.scheduler.retry(reminder, self.retry_delay)
+                continue
+            metrics.reminder_send.observe(time.perf_counter() - start, 'sent')
+            for reminder in batch:
+                await self.mark_sent(reminder)
+
+    @staticmethod
+    def describe_reminder(reminder: Dict) -> str:
+        if reminder['source'] == 'oneshots':
+            return 'The oneshot "{0}" starts in {1}, at <t:{2}> (<t:{2}:R>)'.format(reminder['name'], TimeHelper.describe_minutes(reminder['lead']), reminder['display_time'])
+        if reminder['kind'] == 'lead':
+            return 'The session starts in {0}, at <t:{1}> (<t:{1}:R>)'.format(TimeHelper.describe_minutes(reminder['lead']), reminder['display_time'])
+        return 'Today is game day! The session is at <t:{0}> (<t:{0}:R>)'.format(reminder['display_time'])
+
+    @staticmethod
+    def build_messages(reminders: List[Dict]) -> List[Tuple[List[Dict], Dict]]:
+        """The messages for reminders of one channel that are due at the same time, as (reminders, send arguments).
+        Several reminders are merged into one embed with a field each, split where Discord's embed limits require it."""
+        if len(reminders) == 1:
+            reminder = reminders[0]
+            embed = Embed(title='Oneshot Reminder' if reminder['source'] == 'oneshots' else 'Session Reminder', colour=Color.orange(), description=SessionPinger.describe_reminder(reminder))
+            message = {'embed': embed}
+            if reminder['role'] is not None:
+                message['content'] = '<@&{}>'.format(reminder['role'])
+            return [(reminders, message)]
+
+        batches = [[]]
+        length = len(BATCH_TITLE)
+        for reminder in reminders:
+            field_length = len(reminder['name'][:MAX_FIELD_NAME_LENGTH]) + len(SessionPinger.describe_reminder(reminder))
+            if len(batches[-1]) == MAX_EMBED_FIELDS or length + field_length > MAX_EMBED_LENGTH:
+                batches.append([])
+                length = len(BATCH_TITLE)
+            batches[-1].append(reminder)
+            length += field_length
+
+        messages = []
+        for batch in batches:
+            embed = Embed(title=BATCH_TITLE, colour=Color.orange())
+            for reminder in batch:
+                embed.add_field(name=reminder['name'][:MAX_FIELD_NAME_LENGTH], value=SessionPinger.describe_reminder(reminder), inline=False)
+            message = {'embed': embed}
+            roles = list(dict.fromkeys(reminder['role'] for reminder in batch if reminder['role'] is not None))
+            if len(roles) > 0:
+                message['content'] = ' '.join('<@&{}>'.format(role) for role in roles)
+            messages.append((batch, message))
+        return messages
+
+    def stats(self) -> Dict:
+        return {
+            'heap_entries': len(self.scheduler.heap),
+            'foreign_entries': len(self.foreign_entries)
+        }
 
     async def stop(self):
-        self.perform_loop.cancel()
+        if self.task is not None:
+            self.task.cancel()
+        for task in list(self.reschedule_tasks):
+            task.cancel()
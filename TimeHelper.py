@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+import pytz
+
+# Resolved once, pytz timezone lookups are not free
+TIMEZONE = pytz.timezone('Europe/Berlin')
+SESSION_FORMAT = '%Y-%m-%d %I:%M%p'
+
+
+class TimeHelper:
+
+    @staticmethod
+    def parse_session_time(time_string: str) -> Optional[datetime]:
+        """Session times are entered in Berlin local time, None if the string is not a valid session time"""
+        try:
+            return TIMEZONE.localize(datetime.strptime(time_string, SESSION_FORMAT))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def to_epoch(time_string: str) -> Optional[int]:
+        """UTC epoch of a session time string, as stored next to the string in the database"""
+        moment = TimeHelper.parse_session_time(time_string)
+        return int(moment.timestamp()) if moment is not None else None
+
+    @staticmethod
+    def from_epoch(epoch: int) -> datetime:
+        return datetime.fromtimestamp(epoch, TIMEZONE)
+
+    @staticmethod
+    def morning_of(moment: datetime, hour: int) -> datetime:
+        """The given full hour in Berlin on the day of the moment"""
+        local = moment.astimezone(TIMEZONE).replace(tzinfo=None)
+        return TIMEZONE.localize(datetime(local.year, local.month, local.day) + timedelta(hours=hour))
+
+    @staticmethod
+    def display_timestamp(epoch: int) -> int:
+        """Timestamp used for <t:...> in messages, the wall-clock time of the session is interpreted as UTC there"""
+        return int(epoch + TimeHelper.from_epoch(epoch).utcoffset().total_seconds())
+
+    @staticmethod
+    def example_time() -> str:
+        """The current time in the format users have to enter session times in"""
+        return datetime.now(TIMEZONE).strftime(SESSION_FORMAT)
+
+    @staticmethod
+    def describe_minutes(minutes: int) -> str:
+        """E.g. '1 hour', '45 minutes' or '2 hours and 30 minutes'"""
+        hours, minutes = divmod(minutes, 60)
+        parts = []
+        if hours > 0:
+            parts.append('{} hour{}'.format(hours, '' if hours == 1 else 's'))
+        if minutes > 0 or hours == 0:
+            parts.append('{} minute{}'.format(minutes, '' if minutes == 1 else 's'))
+        return ' and '.join(parts)
@@ -0,0 +1,190 @@
+"""Drives the $campaign and $oneshot command handlers of main.py with stand-ins for Discord, entirely offline.
+Commands are started at a fixed rate, whether the earlier ones finished or not, and their latency is counted from
+the moment they were due, so a bot that falls behind shows it in the tail latency. The report is printed as JSON.
+
+Run from the repository root with: python -m benchmarks.load_generator [--rate 200] [--duration 10] [--write-ratio 0.2] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from os import environ, path
+from typing import Callable, Dict, List, Tuple
+
+from tests.fakes import FakeContext, FakeGuild, FakeMember
+
+COMMANDS_PER_KIND = ['list', 'details']
+WORDS = ['curse', 'strahd', 'tomb', 'lost', 'mine', 'dragon', 'heist', 'storm', 'king', 'wild', 'beyond', 'frozen', 'sea', 'crown', 'keep', 'abyss']
+
+
+def percentile(latencies: List[float], fraction: float) -> float:
+    return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 3)
+
+
+def summarize(latencies: List[float], elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+    if len(latencies) == 0:
+        return {'commands': 0}
+    return {
+        'commands': len(latencies),
+        'throughput_per_second': round(len(latencies) / elapsed, 2),
+        'p50_ms': percentile(latencies, 0.5),
+        'p95_ms': percentile(latencies, 0.95),
+        'p99_ms': percentile(latencies, 0.99),
+        'max_ms': round(latencies[-1] * 1000, 3)
+    }
+
+
+class LoadGenerator:
+    def __init__(self, main, guilds: List[FakeGuild], write_ratio: float, rng: random.Random) -> None:
+        self.main = main
+        self.guilds = guilds
+        self.write_ratio = write_ratio
+        self.rng = rng
+        self.session = (datetime.now() + timedelta(days=3)).strftime('%Y-%m-%d %I:%M%p')
+        # guild id -> (ID, name, owner) of the campaigns and oneshots created before the run
+        self.campaigns: Dict[int, List[Tuple[str, str, FakeMember]]] = {guild.id: [] for guild in guilds}
+        self.oneshots: Dict[int, List[Tuple[str, str, FakeMember]]] = {guild.id: [] for guild in guilds}
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors = 0
+
+    def random_name(self) -> str:
+        return ' '.join(self.rng.choices(WORDS, k=3))
+
+    async def populate(self, entries_per_guild: int) -> None:
+        """Creates campaigns and oneshots through the database directly, they are not part of the measurement"""
+        for guild in self.guilds:
+            members = list(guild.members.values())
+            for i in range(entries_per_guild):
+                owner = self.rng.choice(members)
+                campaign_id, campaign_name = '{}-{}'.format(guild.id, i), self.random_name()
+                await self.main.db.add_campaign(campaign_name, owner.id, 'Homebrew', 'Synthetic campaign', campaign_id, guild_id=guild.id)
+                await self.main.db.update_campaign_session_date(campaign_id, self.session)
+                self.campaigns[guild.id].append((campaign_id, campaign_name, owner))
+                oneshot_name = self.random_name()
+                oneshot_id = await self.main.db.add_oneshot(oneshot_name, owner, 'Synthetic oneshot', self.session, guild.text_channels[0].id, guild_id=guild.id)
+                self.oneshots[guild.id].append((str(oneshot_id), oneshot_name, owner))
+
+    def next_command(self) -> Tuple[str, Callable, FakeContext, Tuple]:
+        """A random command of the configured read/write mix, writes are sent by the owner of the entry"""
+        guild = self.rng.choice(self.guilds)
+        channel = self.rng.choice(guild.text_channels)
+        kind = self.rng.choice(['campaign', 'oneshot'])
+        handler = self.main.campaigns if kind == 'campaign' else self.main.oneshots
+        entries = self.campaigns[guild.id] if kind == 'campaign' else self.oneshots[guild.id]
+        entry_id, entry_name, owner = self.rng.choice(entries)
+
+        if self.rng.random() < self.write_ratio:
+            subcommand = self.rng.choice(['description', 'session' if kind == 'campaign' else 'time', 'lead'])
+            value = {'description': 'Changed at {}'.format(time.time()), 'session': self.session, 'time': self.session, 'lead': str(self.rng.randint(10, 120))}[subcommand]
+            return '{} {}'.format(kind, subcommand), handler, FakeContext(owner, channel), (subcommand, entry_id, value)
+
+        author = self.rng.choice(list(guild.members.values()))
+        subcommand = self.rng.choice(COMMANDS_PER_KIND)
+        if subcommand == 'list':
+            args = ('list', self.rng.choice(['id', 'name', 'session']))
+        elif self.rng.random() < 0.5:
+            args = ('details', entry_id)
+        else:
+            # Searched by name, which may match a few other entries as well
+            args = ('details', entry_name)
+        return '{} {}'.format(kind, subcommand), handler, FakeContext(author, channel), args
+
+    async def run_command(self, name: str, handler, context: FakeContext, args: Tuple, due: float) -> None:
+        try:
+            # The callback is the handler function below the @bot.command decorator
+            await handler.callback(context, *args)
+        except Exception as error:
+            self.errors += 1
+            print('{} failed: {!r}'.format(name, error), file=sys.stderr)
+            return
+        self.latencies.setdefault(name, []).append(time.perf_counter() - due)
+
+    async def run(self, rate: float, duration: float) -> float:
+        tasks = []
+        start = time.perf_counter()
+        for i in range(int(rate * duration)):
+            due = start + i / rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(self.run_command(*self.next_command(), due)))
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - start
+
+
+async def run(arguments: argparse.Namespace) -> Dict:
+    rng = random.Random(arguments.seed)
+    guilds = [FakeGuild(guild_id, member_count=arguments.members, send_latency=arguments.send_latency / 1000) for guild_id in range(1, arguments.guilds + 1)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        # main.py reads its configuration on import, and load_dotenv does not override what is set here
+        environ['DB_STORAGE'] = arguments.storage
+        environ['DB_FILE'] = path.join(directory, 'db.json')
+        environ['SQLITE_FILE'] = path.join(directory, 'db.sqlite3')
+        environ['DB_FLUSH_DELAY'] = '2'
+        environ['AUDIT_LOG_FILE'] = ''
+        environ['AUDIT_LOG_CONSOLE'] = 'true' if arguments.verbose else 'false'
+        environ['METRICS_PORT'] = ''
+        environ['PREFIX'] = '$'
+        environ['CAMPAIGN_ROLES'] = environ['ONESHOT_ROLES'] = ','.join(str(guild.roles[0].id) for guild in guilds)
+        import main
+
+        generator = LoadGenerator(main, guilds, arguments.write_ratio, rng)
+        await generator.populate(arguments.entries)
+        # Commands reply through the message dispatcher, so its queues are part of what is measured
+        elapsed = await generator.run(arguments.rate, arguments.duration)
+        await main.db.flush()
+        main.audit_log.stop()
+
+    all_latencies = [latency for latencies in generator.latencies.values() for latency in latencies]
+    return {
+        'benchmark': 'load',
+        'storage': arguments.storage,
+        'rate': arguments.rate,
+        'duration': arguments.duration,
+        'write_ratio': arguments.write_ratio,
+        'send_latency_ms': arguments.send_latency,
+        'guilds': arguments.guilds,
+        'entries_per_guild': arguments.entries,
+        'seed': arguments.seed,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'errors': generator.errors,
+        'messages_sent': sum(channel.sent for guild in guilds for channel in guild.text_channels),
+        'overall': summarize(all_latencies, elapsed),
+        'commands': {name: summarize(latencies, elapsed) for name, latencies in sorted(generator.latencies.items())}
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rate', type=float, default=200, help='commands started per second')
+    parser.add_argument('--duration', type=float, default=10, help='seconds to start commands for')
+    parser.add_argument('--write-ratio', type=float, default=0.2, help='share of commands that change a campaign or oneshot')
+    parser.add_argument('--guilds', type=int, default=5)
+    parser.add_argument('--members', type=int, default=50, help='members per guild')
+    parser.add_argument('--entries', type=int, default=200, help='campaigns and oneshots per guild before the run')
+    parser.add_argument('--send-latency', type=float, default=0, help='milliseconds every send to a fake channel takes')
+    parser.add_argument('--storage', choices=['json', 'journal', 'sqlite'], default='json')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='file to write the JSON to instead of stdout')
+    parser.add_argument('--verbose', action='store_true', help='print the audit log of the commands before the report')
+    arguments = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(arguments)), indent=2)
+    if arguments.output is None:
+        print(report)
+    else:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Compares the name search index against the linear scan it replaced, and times completions and suggestions.
+
+Run from the repository root with: python -m benchmarks.search_benchmark
+"""
+import random
+import string
+import timeit
+from typing import Dict, List
+
+from search import AutocompleteIndex, NameIndex
+
+SIZES = [10_000, 100_000]
+QUERIES = 200
+
+
+def random_name(rng: random.Random) -> str:
+    return ' '.join(''.join(rng.choices(string.ascii_letters, k=rng.randint(3, 9))) for _ in range(rng.randint(1, 4)))
+
+
+def linear_scan(entries: Dict, identifier: str) -> List[str]:
+    """The lookup Database.campaign_details used before the index"""
+    entry_ids = []
+    for entry in entries.values():
+        if identifier.lower() in entry['name'].lower():
+            entry_ids.append(str(entry['id']))
+    return entry_ids
+
+
+def main() -> None:
+    rng = random.Random(42)
+    for size in SIZES:
+        entries = {str(i): {'id': str(i), 'name': random_name(rng)} for i in range(size)}
+        name_index = NameIndex()
+        name_index.rebuild(entries)
+
+        # Substrings of existing names, so that every query has at least one match
+        queries = []
+        for entry in rng.sample(list(entries.values()), QUERIES):
+            start = rng.randint(0, max(0, len(entry['name']) - 4))
+            queries.append(entry['name'][start:start + rng.randint(3, 6)])
+
+        for query in queries:
+            assert linear_scan(entries, query) == name_index.search(query), query
+
+        scan_time = timeit.timeit(lambda: [linear_scan(entries, query) for query in queries], number=1) / QUERIES
+        index_time = timeit.timeit(lambda: [name_index.search(query) for query in queries], number=1) / QUERIES
+        print('{:>7} entries: scan {:8.3f} ms, index {:8.3f} ms per lookup ({:.0f}x)'.format(size, scan_time * 1000, index_time * 1000, scan_time / index_time))
+
+        autocomplete_index = AutocompleteIndex()
+        autocomplete_index.rebuild(entries)
+        # What is typed while completing, and words of existing names with a typo
+        prefixes = [query[:rng.randint(1, 3)] for query in queries]
+        typos = []
+        for entry in rng.sample(list(entries.values()), QUERIES):
+            word = rng.choice(entry['name'].lower().split())
+            position = rng.randrange(len(word))
+            typos.append(word[:position] + rng.choice(string.ascii_lowercase) + word[position + 1:])
+        complete_time = timeit.timeit(lambda: [autocomplete_index.complete(prefix, 25) for prefix in prefixes], number=1) / QUERIES
+        suggest_time = timeit.timeit(lambda: [autocomplete_index.suggest(typo, 3) for typo in typos], number=1) / QUERIES
+        print('{:>7} entries: complete {:8.3f} ms, suggest {:8.3f} ms per call'.format(size, complete_time * 1000, suggest_time * 1000))
+
+
+if __name__ == '__main__':
+    main()
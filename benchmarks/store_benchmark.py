@@ -0,0 +1,219 @@
+"""Times loading the store, every mutator, the detail lookups and a reminder tick on synthetic data of growing size.
+The results are printed as JSON, so they can be kept and compared between releases.
+
+Run from the repository root with: python -m benchmarks.store_benchmark [--sizes 100 1000] [--storage json] [--output results.json]
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from os import environ, path
+from typing import Awaitable, Callable, Dict, List
+
+from tests.fakes import FakeClient, FakeGuild
+
+# Set before the bot's modules are imported, they read their configuration then or on first use
+environ['AUDIT_LOG_FILE'] = ''
+# Changes are written by the benchmark itself, not by the background flush
+environ['DB_FLUSH_DELAY'] = '3600'
+
+from SessionPinger import SessionPinger  # noqa: E402
+from TimeHelper import SESSION_FORMAT, TIMEZONE  # noqa: E402
+from database import create_database  # noqa: E402
+from sqlite_database import SqliteDatabase  # noqa: E402
+from storage import EMPTY_DATABASE  # noqa: E402
+
+SIZES = [100, 1_000, 10_000, 100_000]
+GUILDS = 5
+CALLS = 200
+LOOKUPS = 500
+TICK_REMINDERS = 1_000
+WORDS = ['curse', 'strahd', 'tomb', 'lost', 'mine', 'dragon', 'heist', 'storm', 'king', 'wild', 'beyond', 'frozen', 'sea', 'crown', 'keep', 'abyss']
+
+
+class Member:
+    def __init__(self, member_id: int) -> None:
+        self.id = member_id
+
+
+def session_string(start: datetime, rng: random.Random) -> str:
+    return (start + timedelta(minutes=15 * rng.randint(8, 7 * 24 * 4))).strftime(SESSION_FORMAT)
+
+
+def generate_data(size: int, guilds: List[FakeGuild], rng: random.Random) -> Dict:
+    """size campaigns and size oneshots spread over the guilds, with sessions in the coming week"""
+    data = json.loads(json.dumps(EMPTY_DATABASE))
+    start = datetime.now(TIMEZONE).replace(second=0, microsecond=0)
+    for i in range(size):
+        guild = guilds[i % len(guilds)]
+        data['campaigns'][str(i + 1)] = {
+            'id': str(i + 1),
+            'name': ' '.join(rng.choices(WORDS, k=3)) + ' {}'.format(i),
+            'module': 'Homebrew',
+            'description': 'Synthetic campaign',
+            'creator_id': rng.randint(1, 1000),
+            'session': session_string(start, rng),
+            'role': rng.choice(guild.roles).id,
+            'channel': rng.choice(guild.text_channels).id,
+            'guild_id': guild.id
+        }
+        data['oneshots'][str(i + 1)] = {
+            'id': i + 1,
+            'name': ' '.join(rng.choices(WORDS, k=2)) + ' {}'.format(i),
+            'description': 'Synthetic oneshot',
+            'creator_id': rng.randint(1, 1000),
+            'channel': rng.choice(guild.text_channels).id,
+            'time': session_string(start, rng),
+            'guild_id': guild.id
+        }
+    data['last_oneshot_id'] = size
+    return data
+
+
+def summarize(durations: List[float]) -> Dict:
+    durations = sorted(durations)
+    return {
+        'calls': len(durations),
+        'mean_us': round(statistics.fmean(durations) * 1e6, 2),
+        'p50_us': round(durations[len(durations) // 2] * 1e6, 2),
+        'p95_us': round(durations[int(len(durations) * 0.95)] * 1e6, 2),
+        'max_us': round(durations[-1] * 1e6, 2)
+    }
+
+
+async def time_calls(calls: List[Callable[[], Awaitable]]) -> Dict:
+    durations = []
+    for call in calls:
+        start = time.perf_counter()
+        await call()
+        durations.append(time.perf_counter() - start)
+    return summarize(durations)
+
+
+def open_database(directory: str, storage: str, data: Dict):
+    """Writes the data in the format of the storage and returns how long opening it took, and the database"""
+    json_path = path.join(directory, 'db.json')
+    with open(json_path, 'w') as db_file:
+        json.dump(data, db_file)
+    environ['DB_STORAGE'] = storage
+    if storage == 'sqlite':
+        environ['SQLITE_FILE'] = path.join(directory, 'db.sqlite3')
+        importer = SqliteDatabase()
+        importer.import_json(json_path)
+        importer.executor.submit(importer.connection.close).result()
+    else:
+        environ['DB_FILE'] = json_path
+
+    start = time.perf_counter()
+    db = create_database()
+    return time.perf_counter() - start, db
+
+
+async def run_size(size: int, storage: str, rng: random.Random) -> Dict:
+    guilds = [FakeGuild(guild_id) for guild_id in range(1, GUILDS + 1)]
+    client = FakeClient(guilds)
+    result = {'size': size}
+
+    with tempfile.TemporaryDirectory() as directory:
+        load_time, db = open_database(directory, storage, generate_data(size, guilds, rng))
+        result['load_ms'] = round(load_time * 1000, 3)
+
+        campaign_ids = [str(rng.randint(1, size)) for _ in range(LOOKUPS)]
+        oneshot_ids = [str(rng.randint(1, size)) for _ in range(LOOKUPS)]
+        words = [rng.choice(WORDS)[:4] for _ in range(LOOKUPS)]
+        result['lookups'] = {
+            'campaign_details_by_id': await time_calls([lambda entry_id=entry_id: db.campaign_details(entry_id, guild_id=1) for entry_id in campaign_ids]),
+            'campaign_details_by_name': await time_calls([lambda word=word: db.campaign_details(word, guild_id=1) for word in words]),
+            'oneshot_details_by_id': await time_calls([lambda entry_id=entry_id: db.oneshot_details(entry_id, guild_id=1) for entry_id in oneshot_ids]),
+            'oneshot_details_by_name': await time_calls([lambda word=word: db.oneshot_details(word, guild_id=1) for word in words])
+        }
+
+        pinger = SessionPinger(client, db)
+        pinger.scheduler.max_lateness = float('inf')
+        start = time.perf_counter()
+        await pinger.schedule_all('campaigns')
+        await pinger.schedule_all('oneshots')
+        result['schedule_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        # Move the clock to the due time of the TICK_REMINDERS-th reminder, so that one tick sends all reminders before it
+        due_times = sorted(entry[0] for entry in pinger.scheduler.heap)
+        pinger.scheduler.clock = lambda: due_times[min(TICK_REMINDERS, len(due_times)) - 1]
+        start = time.perf_counter()
+        await pinger.tick()
+        result['tick'] = {
+            'ms': round((time.perf_counter() - start) * 1000, 3),
+            'reminders': min(TICK_REMINDERS, len(due_times)),
+            # Reminders for the same channel are batched into one message
+            'messages': sum(channel.sent for guild in guilds for channel in guild.text_channels)
+        }
+
+        member = Member(1)
+        session = datetime.now(TIMEZONE).strftime(SESSION_FORMAT)
+        targets = [str(rng.randint(1, size)) for _ in range(CALLS)]
+        new_ids = ['new-{}'.format(i) for i in range(CALLS)]
+        result['mutators'] = {
+            'add_campaign': await time_calls([lambda entry_id=entry_id: db.add_campaign('New ' + entry_id, 1, 'Homebrew', 'Added', entry_id, guild_id=1) for entry_id in new_ids]),
+            'update_campaign_description': await time_calls([lambda entry_id=entry_id: db.update_campaign_description(entry_id, 'Changed') for entry_id in targets]),
+            'update_campaign_session_date': await time_calls([lambda entry_id=entry_id: db.update_campaign_session_date(entry_id, session) for entry_id in targets]),
+            'update_campaign_role': await time_calls([lambda entry_id=entry_id: db.update_campaign_role(entry_id, guilds[0].roles[0].id) for entry_id in targets]),
+            'campaign_change_channel': await time_calls([lambda entry_id=entry_id: db.campaign_change_channel(entry_id, guilds[0].text_channels[0].id) for entry_id in targets]),
+            'update_extra_campaign_notification': await time_calls([lambda entry_id=entry_id: db.update_extra_campaign_notification(entry_id, 'true') for entry_id in targets]),
+            'update_campaign_reminder_lead': await time_calls([lambda entry_id=entry_id: db.update_campaign_reminder_lead(entry_id, 30) for entry_id in targets]),
+            'delete_campaign': await time_calls([lambda entry_id=entry_id: db.delete_campaign(entry_id) for entry_id in new_ids]),
+            'add_oneshot': await time_calls([lambda: db.add_oneshot('New oneshot', member, 'Added', session, guilds[0].text_channels[0].id, guild_id=1) for _ in range(CALLS)]),
+            'update_oneshot_description': await time_calls([lambda entry_id=entry_id: db.update_oneshot_description(entry_id, 'Changed') for entry_id in targets]),
+            'oneshot_change_time': await time_calls([lambda entry_id=entry_id: db.oneshot_change_time(entry_id, session) for entry_id in targets]),
+            'oneshot_change_channel': await time_calls([lambda entry_id=entry_id: db.oneshot_change_channel(entry_id, guilds[0].text_channels[0].id) for entry_id in targets]),
+            'oneshot_change_reminder_lead': await time_calls([lambda entry_id=entry_id: db.oneshot_change_reminder_lead(entry_id, 30) for entry_id in targets]),
+            'delete_oneshot': await time_calls([lambda entry_id=entry_id: db.delete_oneshot(str(entry_id)) for entry_id in range(size + 1, size + CALLS + 1)])
+        }
+
+        # The cost of save_data itself is in the mutators above, this is the write to disk that follows it
+        start = time.perf_counter()
+        await db.flush()
+        result['flush_ms'] = round((time.perf_counter() - start) * 1000, 3)
+        if isinstance(db, SqliteDatabase):
+            db.executor.submit(db.connection.close).result()
+    return result
+
+
+async def run(sizes: List[int], storage: str, seed: int) -> Dict:
+    rng = random.Random(seed)
+    results = []
+    for size in sizes:
+        results.append(await run_size(size, storage, rng))
+        print('{:>7} entries done'.format(size), file=sys.stderr)
+    return {
+        'benchmark': 'store',
+        'storage': storage,
+        'seed': seed,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'results': results
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES, help='number of campaigns and of oneshots to generate')
+    parser.add_argument('--storage', choices=['json', 'journal', 'sqlite'], default='json')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help='file to write the JSON to instead of stdout')
+    arguments = parser.parse_args()
+
+    report = json.dumps(asyncio.run(run(arguments.sizes, arguments.storage, arguments.seed)), indent=2)
+    if arguments.output is None:
+        print(report)
+    else:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(report + '\n')
+
+
+if __name__ == '__main__':
+    main()
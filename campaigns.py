@@ -1,31 +1,29 @@
 import re
-import time
-from datetime import datetime
-from itertools import islice
-from os import getenv
 from typing import Tuple, Dict, Union
 
-import pytz
 from discord import Embed, Color, Member, Guild, Role
 from discord.ext.commands import Context
 
 import ActionType
+from CommandRouter import CommandRouter
 from MessageHelper import MessageHelper
 from MessageTypes import INFO, WARN, ERROR
-from database import Database
+from NameResolver import name_resolver
+from Paginator import Paginator
+from ReminderScheduler import MAX_REMINDER_LEAD
+from RenderCache import render_cache
+from TimeHelper import TimeHelper
+from database import Database, LIST_ORDERS
 
 
 class Campaigns:
-    FREE_COMMANDS = ['help', 'list', 'details']
-    GATED_COMMANDS = ['add', 'delete', 'description', 'session', 'role', 'channel', 'notify']
     PAGE_SIZE = 10
 
     def __init__(self, context: Context, db: Database, prefix: str):
         self.context = context
         self.db = db
         self.prefix = prefix
-        role_string = getenv('CAMPAIGN_ROLES')
-        self.GATED_ROLES = list(map(int, role_string.split(','))) if role_string is not None else []
+        self.guild_id = getattr(context.guild, 'id', None)
 
     async def help(self):
         """Your average help command"""
@@ -33,47 +31,31 @@ class Campaigns:
         help_embed.colour = Color.purple()
 
         help_embed.add_field(name='help', value='Displays this help.', inline=False)
-        help_embed.add_field(name='list [offset]', value='Lists all campaigns, up to a maximum of {} per page. To see more campaigns use an offset, e.g. `{}campaign list 10`'.format(self.PAGE_SIZE, self.prefix), inline=False)
+        help_embed.add_field(name='list [id|name|session]', value='Lists all campaigns, up to a maximum of {} per page, sorted by ID (default), name or next session. Use the buttons to see more campaigns, e.g. `{}campaign list name`'.format(self.PAGE_SIZE, self.prefix), inline=False)
         help_embed.add_field(name='details <campaign-id|campaign-name>', value='Display a detailed overview about one campaign. If multiple are found, all matches will be shown.', inline=False)
         help_embed.add_field(name='add <name> <module> <description> <campaign-id>', value='Add a new campaign.', inline=False)
         help_embed.add_field(name='delete <campaign-name> <campaign-id>', value='Deletes a campaign. This cannot be undone!', inline=False)
         help_embed.add_field(name='description <campaign-id> <description>', value='Update the description of a campaign.', inline=False)
         help_embed.add_field(name='session <campaign-id> <date>',
-                             value='Update the date of the next session. Requires to use the format \'YYYY-MM-DD hour:minute[am/pm]\' (e.g. {}) for the date and time.'.format(datetime.now(pytz.timezone('Europe/Berlin')).strftime('%Y-%m-%d %I:%M%p')),
+                             value='Update the date of the next session. Requires to use the format \'YYYY-MM-DD hour:minute[am/pm]\' (e.g. {}) for the date and time.'.format(TimeHelper.example_time()),
                              inline=False)
         help_embed.add_field(name='role <campaign-id> <role-id|role-name>', value='Update the role to be pinged for sessions.', inline=False)
         help_embed.add_field(name='channel <campaign-id> <channel-id|channel-name>', value='Update the channel to to receive notifications for sessions.', inline=False)
         help_embed.add_field(name='notify <campaign-id> <true|false>', value='Set if you want to receive an additional notification in the morning of the session.', inline=False)
+        help_embed.add_field(name='lead <campaign-id> <minutes>', value='Set how many minutes before the session the reminder is sent (default: 60).', inline=False)
 
-        await self.context.send(embed=help_embed)
+        await MessageHelper.send(self.context, embed=help_embed)
 
     async def show_list(self, args: Tuple) -> None:
-        """Prints a list of all currently active campaigns"""
-        campaign_list = await self.db.list_campaigns()
-        if len(campaign_list) == 0:
-            out = Embed(colour=Color.blue(), title='List of campaigns', description='No campaigns found.')
-        else:
-            if len(args) > 0:
-                try:
-                    offset = int(args[0])
-                except ValueError:
-                    await MessageHelper.message(context=self.context, text='The offset you provided is not a number.', message_type=WARN)
-                    return
-            else:
-                offset = 0
-
-            if offset >= len(campaign_list):
-                await MessageHelper.message(context=self.context, text='You specified an offset greater than the total number of campaigns.', message_type=WARN)
-                return
-
-            short_campaign_list = dict(islice(campaign_list.items(), offset, min(offset + self.PAGE_SIZE, len(campaign_list))))
-
-            out = Embed(colour=Color.blue(), title='List of campaigns (showing {}-{} of {})'.format(offset + 1, min(offset + 1 + self.PAGE_SIZE, len(campaign_list)), len(campaign_list)), description='')
-
-            for campaign in short_campaign_list.values():
-                out.add_field(name=campaign.get('name'), value='*Module*: {}\n*Description*: {}'.format(campaign['module'], campaign['description']), inline=False)
+        """Prints a list of all currently active campaigns, one page at a time"""
+        order = args[0].lower() if len(args) > 0 else 'id'
+        if order not in LIST_ORDERS:
+            await MessageHelper.message(context=self.context, text='Unknown order, please use one of: {}'.format(', '.join(LIST_ORDERS)), message_type=WARN)
+            return
 
-        await self.context.send(embed=out)
+        paginator = Paginator(self.db, 'campaigns', order, title='List of campaigns', empty_text='No campaigns found.', page_size=self.PAGE_SIZE, guild_id=self.guild_id,
+                              render_entry=lambda campaign: (campaign['name'], '*Module*: {}\n*Description*: {}'.format(campaign['module'], campaign['description'])))
+        await paginator.start(self.context)
 
     async def details(self, args: Tuple) -> None:
         """Show the details of all campaigns, that match the given identifier"""
@@ -81,26 +63,32 @@ class Campaigns:
             await MessageHelper.message(context=self.context, text='You have to specify a campaign to show details for!', message_type=WARN)
             return
 
-        details = await self.db.campaign_details(args[0])
+        details = await self.db.campaign_details(args[0], guild_id=self.guild_id)
 
         if not details or len(details) == 0:
-            await MessageHelper.message(context=self.context, text='Could not find the campaign you specified.', message_type=WARN)
+            suggestions = await self.db.suggest('campaigns', args[0], guild_id=self.guild_id)
+            text = 'Could not find the campaign you specified.'
+            if len(suggestions) > 0:
+                text += ' Did you mean {}?'.format(' or '.join('`{}` ({})'.format(entry['id'], entry['name']) for entry in suggestions))
+            await MessageHelper.message(context=self.context, text=text, message_type=WARN)
             return
 
         for campaign in details:
-            embed = Embed(title='Campaign Information - ' + campaign['name'], colour=Color.blue())
-            embed.add_field(name='Campaign-ID', value=campaign['id'])
-            embed.add_field(name='Name', value=campaign['name'])
-            embed.add_field(name='Module', value=campaign['module'])
+            embed = render_cache.get_or_render(getattr(self.context.guild, 'id', None), 'campaigns', campaign, self.render_details)
+            await MessageHelper.send(self.context, embed=embed)
 
-            dm = self.context.guild.get_member(campaign['creator_id'])
-            embed.add_field(name='DM', value='<@{}>'.format(dm.id) if dm else 'Unknown User')
-            embed.add_field(name='Description', value=campaign['description'])
+    def render_details(self, campaign: Dict) -> Embed:
+        embed = Embed(title='Campaign Information - ' + campaign['name'], colour=Color.blue())
+        embed.add_field(name='Campaign-ID', value=campaign['id'])
+        embed.add_field(name='Name', value=campaign['name'])
+        embed.add_field(name='Module', value=campaign['module'])
 
-            embed.add_field(name='Next Session', value='<t:{0}>\n\n<t:{0}:R>'.format(int(datetime.strptime(campaign['session'], '%Y-%m-%d %I:%M%p').replace(tzinfo=pytz.timezone('utc')).timestamp())) if 'session' in campaign and len(
-                campaign['session']) > 0 else 'TBA')
+        dm = self.context.guild.get_member(campaign['creator_id'])
+        embed.add_field(name='DM', value='<@{}>'.format(dm.id) if dm else 'Unknown User')
+        embed.add_field(name='Description', value=campaign['description'])
 
-            await self.context.send(embed=embed)
+        embed.add_field(name='Next Session', value='<t:{0}>\n\n<t:{0}:R>'.format(TimeHelper.display_timestamp(campaign['session_ts'])) if campaign.get('session_ts') is not None else 'TBA')
+        return embed
 
     async def add(self, creator: Member, args: Tuple) -> None:
         """Add a new campaign to the database"""
@@ -122,7 +110,7 @@ class Campaigns:
         description = args[2]
         campaign_id = args[3]
 
-        success = await self.db.add_campaign(name, creator.id, module, description, campaign_id)
+        success = await self.db.add_campaign(name, creator.id, module, description, campaign_id, guild_id=self.guild_id)
         if success:
             MessageHelper.log(ActionType.CAMPAIGN_ADD, {'name': name, 'id': campaign_id, 'user': creator.display_name})
             await MessageHelper.message(context=self.context, text='Created campaign "{}" with ID {}.'.format(name, campaign_id), message_type=INFO)
@@ -138,7 +126,7 @@ class Campaigns:
             await MessageHelper.message(context=self.context, text='You need to specify a campaign and its ID to delete it!', message_type=WARN)
             return
 
-        campaigns = await self.db.campaign_details(identifier=args[1])
+        campaigns = await self.db.campaign_details(args[1], guild_id=self.guild_id)
         if not campaigns or len(campaigns) != 1:
             if not campaigns or len(campaigns) == 0:
                 await MessageHelper.message(context=self.context, text='You specified an invalid campaign!', message_type=WARN)
@@ -151,8 +139,9 @@ class Campaigns:
             await MessageHelper.message(context=self.context, text='The campaign name and id do not match!', message_type=WARN)
         elif campaign['creator_id'] != requester.id:
             await MessageHelper.message(context=self.context, text='You are not the owner of the campaign!', message_type=WARN)
+        elif not await self.db.delete_campaign(str(campaign['id']), campaign.get('version', 0)):
+            await MessageHelper.message(context=self.context, text='The campaign was changed by someone else in the meantime, please try again.', message_type=WARN)
         else:
-            await self.db.delete_campaign(str(campaign['id']))
             MessageHelper.log(ActionType.CAMPAIGN_DELETE, {'name': campaign['name'], 'id': campaign['id'], 'user': requester.display_name})
             await MessageHelper.message(context=self.context, text='Deleted campaign "{}" successfully.'.format(campaign['name']), message_type=INFO)
 
@@ -167,7 +156,7 @@ class Campaigns:
 
         campaign_id = args[0]
         description = args[1]
-        campaigns = await self.db.campaign_details(identifier=campaign_id)
+        campaigns = await self.db.campaign_details(campaign_id, guild_id=self.guild_id)
         if not campaigns or len(campaigns) != 1:
             if not campaigns or len(campaigns) == 0:
                 await MessageHelper.message(context=self.context, text='You specified an invalid campaign!', message_type=WARN)
@@ -180,7 +169,9 @@ class Campaigns:
             await MessageHelper.message(context=self.context, text='You are not the owner of the campaign!', message_type=WARN)
             return
 
-        await self.db.update_campaign_description(str(campaign['id']), description)
+        if not await self.db.update_campaign_description(str(campaign['id']), description, campaign.get('version', 0)):
+            await MessageHelper.message(context=self.context, text='The campaign was changed by someone else in the meantime, please try again.', message_type=WARN)
+            return
         MessageHelper.log(ActionType.CAMPAIGN_DESCRIPTION, {'name': campaign['name'], 'id': campaign['id'], 'description': description})
         await MessageHelper.message(context=self.context, text='Description for campaign {} has been updated.'.format(campaign['name']), message_type=INFO)
 
@@ -195,7 +186,7 @@ class Campaigns:
 
         campaign_id = args[0]
         session_string = args[1]
-        campaigns = await self.db.campaign_details(identifier=campaign_id)
+        campaigns = await self.db.campaign_details(campaign_id, guild_id=self.guild_id)
         if not campaigns or len(campaigns) != 1:
             if not campaigns or len(campaigns) == 0:
                 await MessageHelper.message(context=self.context, text='You specified an invalid campaign!', message_type=WARN)
@@ -208,26 +199,21 @@ class Campaigns:
             await MessageHelper.message(context=self.context, text='You are not the owner of the campaign!', message_type=WARN)
             return
 
-        try:
-            time.strptime(session_string, '%Y-%m-%d %I:%M%p')
-            time_valid = True
-        except ValueError:
-            time_valid = False
-
-        if not time_valid:
+        session_ts = TimeHelper.to_epoch(session_string)
+        if session_ts is None:
             await MessageHelper.message(context=self.context,
-                                        text='The time you specified is incorrectly formatted. Please use the format "YYYY-MM-DD hour:minute[am/pm]" (e.g. {})'.format(datetime.now(tz=pytz.timezone('Europe/Berlin')).strftime('%Y-%m-%d %I:%M%p')),
+                                        text='The time you specified is incorrectly formatted. Please use the format "YYYY-MM-DD hour:minute[am/pm]" (e.g. {})'.format(TimeHelper.example_time()),
                                         message_type=ERROR)
             return
 
-        success = await self.db.update_campaign_session_date(str(campaign['id']), session_string)
+        success = await self.db.update_campaign_session_date(str(campaign['id']), session_string, campaign.get('version', 0))
         if success:
             MessageHelper.log(ActionType.CAMPAIGN_SESSION, {'name': campaign['name'], 'id': campaign['id'], 'date': session_string})
             await MessageHelper.message(context=self.context,
-                                        text='Successfully changed the session time to <t:{0}>.'.format(int(datetime.strptime(session_string, '%Y-%m-%d %I:%M%p').replace(tzinfo=pytz.timezone('utc')).timestamp())),
+                                        text='Successfully changed the session time to <t:{0}>.'.format(TimeHelper.display_timestamp(session_ts)),
                                         message_type=INFO)
         else:
-            await MessageHelper.message(context=self.context, text='Failed to update session time: An unknown error occurred.', message_type=ERROR)
+            await MessageHelper.message(context=self.context, text='The campaign was changed by someone else in the meantime, please try again.', message_type=WARN)
 
     async def update_notification_role(self, requester: Member, args: Tuple) -> None:
         if len(args) < 1:
@@ -235,7 +221,7 @@ class Campaigns:
             return
 
         campaign_id = args[0]
-        campaigns = await self.db.campaign_details(identifier=campaign_id)
+        campaigns = await self.db.campaign_details(campaign_id, guild_id=self.guild_id)
         if not campaigns or len(campaigns) != 1:
             if not campaigns or len(campaigns) == 0:
                 await MessageHelper.message(context=self.context, text='You specified an invalid campaign!', message_type=WARN)
@@ -258,16 +244,15 @@ class Campaigns:
             if len(role) == len(filtered_role):
                 role_object: Union[Role, None] = guild.get_role(int(role))
             else:
-                for single_role in guild.roles:
-                    if single_role.name.lower() == role.lower():
-                        role_object = single_role
-                        break
+                role_object = name_resolver.find_role(guild, role)
 
             if role_object is None:
                 await MessageHelper.message(context=self.context, text='You specified an invalid role!', message_type=WARN)
                 return
 
-            await self.db.update_campaign_role(campaign_id, role_object.id)
+            if not await self.db.update_campaign_role(str(campaign['id']), role_object.id, campaign.get('version', 0)):
+                await MessageHelper.message(context=self.context, text='The campaign was changed by someone else in the meantime, please try again.', message_type=WARN)
+                return
             MessageHelper.log(ActionType.CAMPAIGN_ROLE, {'name': campaign['name'], 'id': campaign['id'], 'role': role_object.name})
             await MessageHelper.message(context=self.context, text='Updated campaign role successfully.', message_type=INFO)
         else:
@@ -288,7 +273,7 @@ class Campaigns:
         campaign_id = args[0]
         channel_string = args[1]
 
-        campaigns = await self.db.campaign_details(identifier=campaign_id)
+        campaigns = await self.db.campaign_details(campaign_id, guild_id=self.guild_id)
         if not campaigns or len(campaigns) != 1:
             if not campaigns or len(campaigns) == 0:
                 await MessageHelper.message(context=self.context, text='You specified an invalid campaign!', message_type=WARN)
@@ -315,16 +300,16 @@ class Campaigns:
                 await MessageHelper.message(context=self.context, text='Invalid Channel ID!', message_type=WARN)
                 return
         else:
-            for text_channel in guild.text_channels:
-                if text_channel.name == channel_string:
-                    channel = text_channel.id
-                    break
+            text_channel = name_resolver.find_channel(guild, channel_string)
+            channel = text_channel.id if text_channel is not None else None
         if channel is None:
             await MessageHelper.message(context=self.context, text='Invalid Channel ID or name!', message_type=WARN)
             return
 
-        await self.db.campaign_change_channel(campaign_id, channel)
-        MessageHelper.log(ActionType.CAMPAIGN_CHANNEL, {'id': campaign_id, 'name': (await self.db.campaign_details(campaign_id))[0]['name'], 'channel': channel})
+        if not await self.db.campaign_change_channel(str(campaign['id']), channel, campaign.get('version', 0)):
+            await MessageHelper.message(context=self.context, text='The campaign was changed by someone else in the meantime, please try again.', message_type=WARN)
+            return
+        MessageHelper.log(ActionType.CAMPAIGN_CHANNEL, {'id': campaign['id'], 'name': campaign['name'], 'channel': channel})
         await MessageHelper.message(context=self.context, text='Successfully changed the channel to <#{}>.'.format(channel), message_type=INFO)
 
     async def update_extra_notification(self, requester: Member, args: Tuple) -> None:
@@ -339,7 +324,7 @@ class Campaigns:
         campaign_id = args[0]
         new_status = args[1]
 
-        campaigns = await self.db.campaign_details(identifier=campaign_id)
+        campaigns = await self.db.campaign_details(campaign_id, guild_id=self.guild_id)
         if not campaigns or len(campaigns) != 1:
             if not campaigns or len(campaigns) == 0:
                 await MessageHelper.message(context=self.context, text='You specified an invalid campaign!', message_type=WARN)
@@ -356,53 +341,59 @@ class Campaigns:
             await MessageHelper.message(context=self.context, text='Invalid status specified, please use "true" or "false".', message_type=WARN)
             return
 
-        await self.db.update_extra_campaign_notification(campaign_id, new_status)
+        if not await self.db.update_extra_campaign_notification(str(campaign['id']), new_status, campaign.get('version', 0)):
+            await MessageHelper.message(context=self.context, text='The campaign was changed by someone else in the meantime, please try again.', message_type=WARN)
+            return
         MessageHelper.log(ActionType.CAMPAIGN_EXTRA_NOTIFICATION, {'id': campaign['id'], 'name': campaign['name'], 'status': new_status})
         await MessageHelper.message(context=self.context, text='Successfully updated the extra notification to be {}.'.format('enabled' if new_status == 'true' else 'disabled'), message_type=INFO)
 
-    async def process_commands(self, sender: Member, args) -> None:
-        if len(args) == 0:
-            subcommand = 'help'
-        else:
-            subcommand = args[0]
-
-        has_permission = await self.check_permissions_for_command(sender, subcommand)
+    async def update_reminder_lead(self, requester: Member, args: Tuple) -> None:
+        if len(args) < 2:
+            if len(args) == 0:
+                await MessageHelper.message(context=self.context, text='Please specify a valid campaign-ID.', message_type=WARN)
+                return
+            if len(args) == 1:
+                await MessageHelper.message(context=self.context, text='Please specify how many minutes before the session the reminder should be sent.', message_type=WARN)
+                return
 
-        if has_permission is None:
-            subcommand = ''
-        elif not has_permission:
-            await MessageHelper.message(context=self.context, text='You do not have the required role to use this command!', message_type=WARN)
+        campaign_id = args[0]
+        campaigns = await self.db.campaign_details(campaign_id, guild_id=self.guild_id)
+        if not campaigns or len(campaigns) != 1:
+            if not campaigns or len(campaigns) == 0:
+                await MessageHelper.message(context=self.context, text='You specified an invalid campaign!', message_type=WARN)
+                return
+            await MessageHelper.message(context=self.context, text='Multiple campaigns that match found. Please specify only one campaign.', message_type=WARN)
             return
 
-        if subcommand == 'help':
-            await self.help()
-        elif subcommand == 'list':
-            await self.show_list(args[1:])
-        elif subcommand == 'add':
-            await self.add(sender, args[1:])
-        elif subcommand == 'details':
-            await self.details(args[1:])
-        elif subcommand == 'delete':
-            await self.delete(sender, args[1:])
-        elif subcommand == 'description':
-            await self.update_description(sender, args[1:])
-        elif subcommand == 'session':
-            await self.update_session_date(sender, args[1:])
-        elif subcommand == 'role':
-            await self.update_notification_role(sender, args[1:])
-        elif subcommand == 'channel':
-            await self.change_channel(sender, args[1:])
-        elif subcommand == 'notify':
-            await self.update_extra_notification(sender, args[1:])
-        else:
-            await MessageHelper.message(self.context, text='Unknown subcommand. Try `{}campaign help` for a full list of subcommands'.format(self.prefix), message_type='WARN')
+        campaign = campaigns[0]
+        if campaign['creator_id'] != requester.id:
+            await MessageHelper.message(context=self.context, text='You are not the owner of the campaign!', message_type=WARN)
+            return
 
-    async def check_permissions_for_command(self, requester: Member, command: str) -> Union[bool, None]:
-        if command in self.FREE_COMMANDS:
-            return True
+        if not args[1].isdigit() or not 0 < int(args[1]) <= MAX_REMINDER_LEAD:
+            await MessageHelper.message(context=self.context, text='Please specify a number of minutes between 1 and {}.'.format(MAX_REMINDER_LEAD), message_type=WARN)
+            return
 
-        if command in self.GATED_COMMANDS:
-            role_ids = list(map(lambda role: role.id, requester.roles))
-            return not set(role_ids).isdisjoint(self.GATED_ROLES)
+        minutes = int(args[1])
+        if not await self.db.update_campaign_reminder_lead(str(campaign['id']), minutes, campaign.get('version', 0)):
+            await MessageHelper.message(context=self.context, text='The campaign was changed by someone else in the meantime, please try again.', message_type=WARN)
+            return
+        MessageHelper.log(ActionType.CAMPAIGN_REMINDER_LEAD, {'id': campaign['id'], 'name': campaign['name'], 'lead': minutes})
+        await MessageHelper.message(context=self.context, text='The reminder will now be sent {} before the session.'.format(TimeHelper.describe_minutes(minutes)), message_type=INFO)
 
-        return None
+    async def process_commands(self, sender: Member, args) -> None:
+        await router.dispatch(self, self.context, sender, args)
+
+
+router = CommandRouter('campaign', 'CAMPAIGN_ROLES')
+router.register('help', lambda campaigns, sender, args: campaigns.help())
+router.register('list', lambda campaigns, sender, args: campaigns.show_list(args))
+router.register('details', lambda campaigns, sender, args: campaigns.details(args))
+router.register('add', Campaigns.add, gated=True)
+router.register('delete', Campaigns.delete, gated=True)
+router.register('description', Campaigns.update_description, gated=True)
+router.register('session', Campaigns.update_session_date, gated=True)
+router.register('role', Campaigns.update_notification_role, gated=True)
+router.register('channel', Campaigns.change_channel, gated=True)
+router.register('notify', Campaigns.update_extra_notification, gated=True)
+router.register('lead', Campaigns.update_reminder_lead, gated=True)
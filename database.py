@@ -1,10 +1,45 @@
-import json
+from bisect import bisect_left, bisect_right
+from itertools import chain
 from os import getenv
-from os.path import exists
-from typing import Dict, Union, List, Optional
+from typing import Dict, Union, List, Optional, Callable, Tuple, Iterable
 
 from discord import Member
 
+from Metrics import metrics
+from ReminderScheduler import MAX_REMINDER_LEAD
+from TimeHelper import TimeHelper
+from search import NameIndex, AutocompleteIndex
+from storage import create_storage, apply_change
+
+KINDS = ['campaigns', 'oneshots']
+LIST_ORDERS = ['id', 'name', 'session']
+
+
+def shares_guild(guild_id: Optional[int], entry_guild_id: Optional[int]) -> bool:
+    """Guilds see their own entries and the ones that do not belong to a guild yet, no guild (None) means all guilds"""
+    return guild_id is None or entry_guild_id is None or guild_id == entry_guild_id
+
+
+def sent_session(sent: Union[int, Dict]) -> int:
+    """The session of a sent reminder. Older versions stored only the due time, which is at most the longest lead before the session."""
+    if isinstance(sent, dict):
+        return sent['session']
+    return sent + MAX_REMINDER_LEAD * 60
+
+
+def sort_key(order: str, entry: Dict) -> tuple:
+    """Position of a campaign or oneshot in a list, ending with the id so that no two entries are equal.
+    Numeric ids are sorted by their value, entries without a session are sorted last."""
+    entry_id = str(entry['id'])
+    if order == 'name':
+        return entry['name'].lower(), entry_id
+    if order == 'session':
+        start = entry.get('session_ts', entry.get('time_ts'))
+        return 1 if start is None else 0, start or 0, entry_id
+    if entry_id.isascii() and entry_id.isdigit():
+        return 0, int(entry_id), entry_id
+    return 1, 0, entry_id
+
 
 class Database:
 
@@ -14,35 +49,253 @@ class Database:
 
     def __init__(self) -> None:
         self.filepath = getenv('DB_FILE', 'db.json')
+        self.storage = create_storage(self.filepath)
         self.data = {}
-
-        if not exists(self.filepath):
-            with open(self.filepath, 'w') as db_file:
-                json.dump(
-                    {
-                        "campaigns": {},
-                        "last_oneshot_id": 0,
-                        "oneshots": {}
-                    }, db_file)
-                db_file.close()
+        # kind -> entry id -> guild id, and kind -> guild id -> entry ids (a dict to keep the order they were added in)
+        self.guild_ids: Dict[str, Dict[str, Optional[int]]] = {}
+        self.partitions: Dict[str, Dict[Optional[int], Dict[str, None]]] = {}
+        # kind -> entry id -> position in the order the entries were added, the order in which searches return them
+        self.positions: Dict[str, Dict[str, int]] = {}
+        self.next_position = 0
+        # Built for a guild on its first search or list after a load, (kind, guild id) and (kind, guild id, order)
+        self.name_indexes: Dict[Tuple[str, Optional[int]], NameIndex] = {}
+        self.autocomplete_indexes: Dict[Tuple[str, Optional[int]], AutocompleteIndex] = {}
+        self.sorted_keys: Dict[Tuple[str, Optional[int], str], List[tuple]] = {}
+        self.listeners: List[Callable[[str, Optional[str], Optional[Dict]], None]] = []
         self.load_data()
 
+    @property
+    def load_count(self) -> int:
+        return self.storage.load_count
+
+    @property
+    def write_count(self) -> int:
+        return self.storage.write_count
+
     def load_data(self) -> None:
-        with open(self.filepath, 'r') as db_file:
-            self.data = json.load(db_file)
+        with metrics.time_store('load'):
+            self.data = self.storage.load()
+        self.add_missing_timestamps()
+        self.name_indexes = {}
+        self.autocomplete_indexes = {}
+        self.sorted_keys = {}
+        for kind in KINDS:
+            self.guild_ids[kind] = {}
+            self.partitions[kind] = {}
+            self.positions[kind] = {}
+            for entry_id, entry in self.data[kind].items():
+                self.add_to_partition(kind, entry_id, entry.get('guild_id'))
+                self.positions[kind][entry_id] = self.next_position
+                self.next_position += 1
+            self.notify(kind, None, None)
+
+    def add_missing_timestamps(self) -> None:
+        """Entries saved by older versions only have the time string, the epoch is derived once here and saved with the next write"""
+        for campaign in self.data['campaigns'].values():
+            if 'session' in campaign and 'session_ts' not in campaign:
+                campaign['session_ts'] = TimeHelper.to_epoch(str(campaign['session']))
+        for oneshot in self.data['oneshots'].values():
+            if 'time_ts' not in oneshot:
+                oneshot['time_ts'] = TimeHelper.to_epoch(str(oneshot['time']))
+
+    def reload_if_changed(self) -> bool:
+        """Reload the data only if the files on disk differ from the ones we last read or wrote"""
+        if not self.storage.changed_on_disk():
+            return False
+        self.load_data()
+        return True
+
+    def save_data(self, change: Dict) -> None:
+        with metrics.time_store('record'):
+            self.storage.record(self.data, change)
+
+    async def flush(self) -> None:
+        """Write pending changes to disk right away, e.g. on shutdown"""
+        await self.storage.flush(self.data)
+
+    def subscribe(self, listener: Callable[[str, Optional[str], Optional[Dict]], None]) -> None:
+        """The listener is called with (kind, entry_id, entry) after a campaign or oneshot changed. The entry is None if it was deleted,
+        the entry_id is None if all entries of that kind may have changed (e.g. after a reload)."""
+        self.listeners.append(listener)
+
+    def notify(self, kind: str, entry_id: Optional[str], entry: Optional[Dict]) -> None:
+        for listener in self.listeners:
+            listener(kind, entry_id, entry)
+
+    def set_value(self, path: List, value) -> None:
+        change = {'op': 'set', 'path': path, 'value': value}
+        apply_change(self.data, change)
+        self.entry_changed(change)
+        self.save_data(change)
+
+    def update_values(self, path: List, values: Dict) -> None:
+        """Set several fields of one entry as a single change"""
+        change = {'op': 'update', 'path': path, 'value': values}
+        apply_change(self.data, change)
+        self.entry_changed(change)
+        self.save_data(change)
+
+    def delete_value(self, path: List) -> None:
+        change = {'op': 'delete', 'path': path}
+        apply_change(self.data, change)
+        self.entry_changed(change)
+        self.save_data(change)
+
+    def update_entry(self, kind: str, entry_id: str, values: Dict, expected_version: Optional[int] = None, guild_id: Optional[int] = None) -> bool:
+        """Change fields of an entry and raise its version. Fails if the entry does not exist (for the guild) or if its version is not the expected one,
+        i.e. it was changed since the caller read it. Nothing is awaited between the check and the change, so no other command can come in between."""
+        if not self.is_visible(kind, entry_id, guild_id):
+            return False
+        version = self.data[kind][entry_id].get('version', 0)
+        if expected_version is not None and version != expected_version:
+            return False
+        self.update_values([kind, entry_id], dict(values, version=version + 1))
+        return True
+
+    def delete_entry(self, kind: str, entry_id: str, expected_version: Optional[int] = None) -> bool:
+        if entry_id not in self.data[kind]:
+            return False
+        if expected_version is not None and self.data[kind][entry_id].get('version', 0) != expected_version:
+            return False
+        self.delete_value([kind, entry_id])
+        return True
+
+    def add_to_partition(self, kind: str, entry_id: str, guild_id: Optional[int]) -> None:
+        self.guild_ids[kind][entry_id] = guild_id
+        self.partitions[kind].setdefault(guild_id, {})[entry_id] = None
 
-    def save_data(self) -> None:
-        with open(self.filepath, 'w+') as db_file:
-            json.dump(self.data, db_file, indent=4)
+    def remove_from_partition(self, kind: str, entry_id: str) -> None:
+        guild_id = self.guild_ids[kind].pop(entry_id)
+        del self.partitions[kind][guild_id][entry_id]
+        if len(self.partitions[kind][guild_id]) == 0:
+            del self.partitions[kind][guild_id]
+
+    def entry_changed(self, change: Dict) -> None:
+        path = change['path']
+        if path[0] not in KINDS or len(path) < 2:
+            return
+
+        kind, entry_id = path[0], path[1]
+        entry = self.data[kind].get(entry_id)
+        affected_guilds = []
+        if entry_id in self.guild_ids[kind]:
+            affected_guilds.append(self.guild_ids[kind][entry_id])
+        if entry is not None:
+            affected_guilds.append(entry.get('guild_id'))
+        # Only a new or moved entry changes its partition, so that the others keep their order
+        if len(affected_guilds) != 2 or affected_guilds[0] != affected_guilds[1]:
+            if entry_id in self.guild_ids[kind]:
+                self.remove_from_partition(kind, entry_id)
+            if entry is not None:
+                self.add_to_partition(kind, entry_id, entry.get('guild_id'))
+        if entry is None:
+            self.positions[kind].pop(entry_id, None)
+        elif entry_id not in self.positions[kind]:
+            self.positions[kind][entry_id] = self.next_position
+            self.next_position += 1
+
+        renamed = (len(path) == 2 and change['op'] == 'set') or path[-1] == 'name' or (change['op'] == 'update' and 'name' in change['value'])
+        for (index_kind, index_guild), index in chain(self.name_indexes.items(), self.autocomplete_indexes.items()):
+            if index_kind != kind:
+                continue
+            if entry is None or not shares_guild(index_guild, entry.get('guild_id')):
+                index.remove(entry_id)
+            elif renamed or entry_id not in index:
+                index.add(entry_id, entry['name'], self.positions[kind][entry_id])
+        for key in [key for key in self.sorted_keys.keys() if key[0] == kind and any(shares_guild(key[1], guild_id) for guild_id in affected_guilds)]:
+            del self.sorted_keys[key]
+        self.notify(kind, entry_id, entry)
+
+    def visible_ids(self, kind: str, guild_id: Optional[int]) -> Iterable[str]:
+        """IDs of the entries of the guild and of those that do not belong to any guild yet, all of them if guild_id is None"""
+        if guild_id is None:
+            return self.data[kind].keys()
+        return chain(self.partitions[kind].get(guild_id, {}).keys(), self.partitions[kind].get(None, {}).keys())
+
+    def is_visible(self, kind: str, entry_id: str, guild_id: Optional[int]) -> bool:
+        return entry_id in self.guild_ids[kind] and shares_guild(guild_id, self.guild_ids[kind][entry_id])
+
+    def get_name_index(self, kind: str, guild_id: Optional[int]) -> NameIndex:
+        if (kind, guild_id) not in self.name_indexes:
+            name_index = NameIndex()
+            name_index.rebuild({entry_id: self.data[kind][entry_id] for entry_id in self.visible_ids(kind, guild_id)}, self.positions[kind])
+            self.name_indexes[(kind, guild_id)] = name_index
+        return self.name_indexes[(kind, guild_id)]
+
+    def get_autocomplete_index(self, kind: str, guild_id: Optional[int]) -> AutocompleteIndex:
+        if (kind, guild_id) not in self.autocomplete_indexes:
+            autocomplete_index = AutocompleteIndex()
+            autocomplete_index.rebuild({entry_id: self.data[kind][entry_id] for entry_id in self.visible_ids(kind, guild_id)}, self.positions[kind])
+            self.autocomplete_indexes[(kind, guild_id)] = autocomplete_index
+        return self.autocomplete_indexes[(kind, guild_id)]
+
+    async def complete(self, kind: str, prefix: str, limit: int = 25, guild_id: Optional[int] = None) -> List[Dict]:
+        """Entries with an ID, a name or a word in the name that starts with the prefix, for autocompletion"""
+        return [dict(self.data[kind][entry_id]) for entry_id in self.get_autocomplete_index(kind, guild_id).complete(prefix, limit)]
+
+    async def suggest(self, kind: str, text: str, limit: int = 3, guild_id: Optional[int] = None) -> List[Dict]:
+        """Entries with an ID, a name or a word in the name that is close to the text, for "did you mean" replies"""
+        return [dict(self.data[kind][entry_id]) for entry_id in self.get_autocomplete_index(kind, guild_id).suggest(text, limit)]
+
+    def get_sorted_keys(self, kind: str, order: str, guild_id: Optional[int]) -> List[tuple]:
+        if (kind, guild_id, order) not in self.sorted_keys:
+            self.sorted_keys[(kind, guild_id, order)] = sorted(sort_key(order, self.data[kind][entry_id]) for entry_id in self.visible_ids(kind, guild_id))
+        return self.sorted_keys[(kind, guild_id, order)]
+
+    async def count_entries(self, kind: str, guild_id: Optional[int] = None) -> int:
+        if guild_id is None:
+            return len(self.data[kind])
+        return len(self.partitions[kind].get(guild_id, {})) + len(self.partitions[kind].get(None, {}))
+
+    async def assign_guilds(self, find_guild_id: Callable[[Dict], Optional[int]]) -> int:
+        """Migration for entries saved before they belonged to a guild, find_guild_id gets an entry and returns the ID of its guild if it can be found"""
+        assigned = 0
+        for kind in KINDS:
+            for entry_id in list(self.partitions[kind].get(None, {}).keys()):
+                guild_id = find_guild_id(self.data[kind][entry_id])
+                if guild_id is not None and self.update_entry(kind, entry_id, {'guild_id': guild_id}):
+                    assigned += 1
+        return assigned
+
+    async def list_page(self, kind: str, order: str, cursor: Optional[tuple] = None, forward: bool = True, limit: int = 10, guild_id: Optional[int] = None) -> Tuple[List[Dict], bool]:
+        """Up to limit entries after the cursor (or before it, if not forward), the cursor being the sort key of an entry.
+        Also returns if there are more entries in that direction."""
+        keys = self.get_sorted_keys(kind, order, guild_id)
+        if forward:
+            start = 0 if cursor is None else bisect_right(keys, cursor)
+            end = min(start + limit, len(keys))
+            has_more = end < len(keys)
+        else:
+            end = len(keys) if cursor is None else bisect_left(keys, cursor)
+            start = max(0, end - limit)
+            has_more = start > 0
+        return [self.data[kind][key[-1]] for key in keys[start:end]], has_more
+
+    # -------------- #
+    # Reminder-Stuff #
+    # -------------- #
+
+    async def list_sent_reminders(self) -> Dict[str, Union[int, Dict]]:
+        return self.data['sent_reminders']
+
+    async def mark_reminder_sent(self, key: str, due: int, session: int) -> None:
+        self.set_value(['sent_reminders', key], {'due': due, 'session': session})
+
+    async def prune_sent_reminders(self, session_before: float) -> None:
+        """Forgets the reminders of sessions that started before the given time"""
+        for key in [key for key, sent in self.data['sent_reminders'].items() if sent_session(sent) < session_before]:
+            self.delete_value(['sent_reminders', key])
 
     # -------------- #
     # Campaign-Stuff #
     # -------------- #
 
-    async def list_campaigns(self) -> Dict:
-        return self.data.get('campaigns', {})
+    async def list_campaigns(self, guild_id: Optional[int] = None) -> Dict:
+        if guild_id is None:
+            return self.data.get('campaigns', {})
+        return {campaign_id: self.data['campaigns'][campaign_id] for campaign_id in sorted(self.visible_ids('campaigns', guild_id), key=self.positions['campaigns'].get)}
 
-    async def add_campaign(self, name: str, creator_id: int, module: str, description: str, campaign_id: str) -> bool:
+    async def add_campaign(self, name: str, creator_id: int, module: str, description: str, campaign_id: str, guild_id: Optional[int] = None) -> bool:
         if campaign_id in self.data['campaigns']:
             return False
 
@@ -53,22 +306,19 @@ class Database:
             'description': description,
             'creator_id': creator_id
         }
-        self.data['campaigns'][campaign_id] = new_campaign
-        self.save_data()
+        if guild_id is not None:
+            new_campaign['guild_id'] = guild_id
+        self.set_value(['campaigns', campaign_id], new_campaign)
         return True
 
-    async def delete_campaign(self, campaign_id: str) -> None:
-        del self.data['campaigns'][campaign_id]
-        self.save_data()
+    async def delete_campaign(self, campaign_id: str, expected_version: Optional[int] = None) -> bool:
+        return self.delete_entry('campaigns', campaign_id, expected_version)
 
-    async def campaign_details(self, identifier: str) -> Union[List[Dict], bool]:
-        campaign_ids = []
-        if identifier in self.data['campaigns']:
+    async def campaign_details(self, identifier: str, guild_id: Optional[int] = None) -> Union[List[Dict], bool]:
+        if self.is_visible('campaigns', identifier, guild_id):
             campaign_ids = [identifier]
         else:
-            for entry in self.data['campaigns'].values():
-                if identifier.lower() in entry['name'].lower():
-                    campaign_ids.append(str(entry['id']))
+            campaign_ids = self.get_name_index('campaigns', guild_id).search(identifier)
         if len(campaign_ids) == 0:
             return False
         else:
@@ -76,63 +326,61 @@ class Database:
             for campaign_id in campaign_ids:
                 campaign = self.data['campaigns'].get(campaign_id, None)
                 if campaign is not None:
-                    campaign_data.append(campaign)
+                    # A copy, so that the version the caller read cannot change under its hands
+                    campaign_data.append(dict(campaign))
             return campaign_data
 
-    async def update_campaign_description(self, campaign_id: str, description: str) -> None:
-        self.data['campaigns'][campaign_id]['description'] = description
-        self.save_data()
+    async def update_campaign_description(self, campaign_id: str, description: str, expected_version: Optional[int] = None) -> bool:
+        return self.update_entry('campaigns', campaign_id, {'description': description}, expected_version)
 
-    async def update_campaign_session_date(self, campaign_id: str, session_string: str) -> bool:
-        self.data['campaigns'][campaign_id]['session'] = session_string
-        self.save_data()
-        return True
+    async def update_campaign_session_date(self, campaign_id: str, session_string: str, expected_version: Optional[int] = None) -> bool:
+        return self.update_entry('campaigns', campaign_id, {'session': session_string, 'session_ts': TimeHelper.to_epoch(session_string)}, expected_version)
+
+    async def update_campaign_role(self, campaign_id: str, role_id: int, expected_version: Optional[int] = None) -> bool:
+        return self.update_entry('campaigns', campaign_id, {'role': role_id}, expected_version)
 
-    async def update_campaign_role(self, campaign_id: str, role_id: int) -> None:
-        self.data['campaigns'][campaign_id]['role'] = role_id
-        self.save_data()
+    async def campaign_change_channel(self, campaign_id: str, channel: int, expected_version: Optional[int] = None) -> bool:
+        return self.update_entry('campaigns', campaign_id, {'channel': channel}, expected_version)
 
-    async def campaign_change_channel(self, campaign_id: str, channel: int) -> None:
-        self.data['campaigns'][campaign_id]['channel'] = channel
-        self.save_data()
+    async def update_extra_campaign_notification(self, campaign_id: str, status: str, expected_version: Optional[int] = None) -> bool:
+        return self.update_entry('campaigns', campaign_id, {'extra-notification': status}, expected_version)
 
-    async def update_extra_campaign_notification(self, campaign_id: str, status: str) -> None:
-        self.data['campaigns'][campaign_id]['extra-notification'] = status
-        self.save_data()
+    async def update_campaign_reminder_lead(self, campaign_id: str, minutes: int, expected_version: Optional[int] = None) -> bool:
+        return self.update_entry('campaigns', campaign_id, {'reminder_lead': minutes}, expected_version)
 
     # ------------- #
     # Oneshot-Stuff #
     # ------------- #
 
-    async def add_oneshot(self, name: str, creator: Member, description: str, time: str, channel: Optional[int], ) -> int:
+    async def add_oneshot(self, name: str, creator: Member, description: str, time: str, channel: Optional[int], guild_id: Optional[int] = None) -> int:
         oneshot = {
             'id': self.data['last_oneshot_id'] + 1,
             'name': name,
             'description': description,
             'creator_id': creator.id,
             'channel': channel,
-            'time': time
+            'time': time,
+            'time_ts': TimeHelper.to_epoch(time)
         }
-        self.data['oneshots'][oneshot['id']] = oneshot
-        self.data['last_oneshot_id'] += 1
-        self.save_data()
+        if guild_id is not None:
+            oneshot['guild_id'] = guild_id
+        self.set_value(['oneshots', str(oneshot['id'])], oneshot)
+        self.set_value(['last_oneshot_id'], oneshot['id'])
         return oneshot['id']
 
-    async def delete_oneshot(self, oneshot_id: str) -> None:
-        del self.data['oneshots'][oneshot_id]
-        self.save_data()
+    async def delete_oneshot(self, oneshot_id: str, expected_version: Optional[int] = None) -> bool:
+        return self.delete_entry('oneshots', oneshot_id, expected_version)
 
-    async def list_oneshots(self) -> Dict:
-        return self.data['oneshots']
+    async def list_oneshots(self, guild_id: Optional[int] = None) -> Dict:
+        if guild_id is None:
+            return self.data['oneshots']
+        return {oneshot_id: self.data['oneshots'][oneshot_id] for oneshot_id in sorted(self.visible_ids('oneshots', guild_id), key=self.positions['oneshots'].get)}
 
-    async def oneshot_details(self, identifier: str) -> Union[List[Dict], bool]:
-        oneshot_ids = []
-        if identifier in self.data['campaigns']:
+    async def oneshot_details(self, identifier: str, guild_id: Optional[int] = None) -> Union[List[Dict], bool]:
+        if self.is_visible('oneshots', identifier, guild_id):
             oneshot_ids = [identifier]
         else:
-            for entry in self.data['oneshots'].values():
-                if identifier.lower() in entry['name'].lower():
-                    oneshot_ids.append(str(entry['id']))
+            oneshot_ids = self.get_name_index('oneshots', guild_id).search(identifier)
         if len(oneshot_ids) == 0:
             return False
         else:
@@ -140,26 +388,26 @@ class Database:
             for oneshot_id in oneshot_ids:
                 oneshot = self.data['oneshots'].get(oneshot_id, None)
                 if oneshot is not None:
-                    oneshot_data.append(oneshot)
+                    # A copy, so that the version the caller read cannot change under its hands
+                    oneshot_data.append(dict(oneshot))
             return oneshot_data
 
-    async def update_oneshot_description(self, oneshot_id: str, description: str) -> bool:
-        if oneshot_id not in self.data['oneshots']:
-            return False
-        self.data['oneshots'][oneshot_id]['description'] = description
-        self.save_data()
-        return True
+    async def update_oneshot_description(self, oneshot_id: str, description: str, guild_id: Optional[int] = None, expected_version: Optional[int] = None) -> bool:
+        return self.update_entry('oneshots', oneshot_id, {'description': description}, expected_version, guild_id)
 
-    async def oneshot_change_time(self, oneshot_id: str, time: str) -> bool:
-        if oneshot_id not in self.data['oneshots']:
-            return False
-        self.data['oneshots'][oneshot_id]['time'] = time
-        self.save_data()
-        return True
+    async def oneshot_change_time(self, oneshot_id: str, time: str, guild_id: Optional[int] = None, expected_version: Optional[int] = None) -> bool:
+        return self.update_entry('oneshots', oneshot_id, {'time': time, 'time_ts': TimeHelper.to_epoch(time)}, expected_version, guild_id)
 
-    async def oneshot_change_channel(self, oneshot_id: str, channel: int) -> bool:
-        if oneshot_id not in self.data['oneshots']:
-            return False
-        self.data['oneshots'][oneshot_id]['channel'] = channel
-        self.save_data()
-        return True
+    async def oneshot_change_channel(self, oneshot_id: str, channel: int, guild_id: Optional[int] = None, expected_version: Optional[int] = None) -> bool:
+        return self.update_entry('oneshots', oneshot_id, {'channel': channel}, expected_version, guild_id)
+
+    async def oneshot_change_reminder_lead(self, oneshot_id: str, minutes: int, guild_id: Optional[int] = None, expected_version: Optional[int] = None) -> bool:
+        return self.update_entry('oneshots', oneshot_id, {'reminder_lead': minutes}, expected_version, guild_id)
+
+
+def create_database():
+    """The database selected with DB_STORAGE: 'json' (default) and 'journal' use Database, 'sqlite' uses SqliteDatabase"""
+    if getenv('DB_STORAGE', 'json') == 'sqlite':
+        from sqlite_database import SqliteDatabase
+        return SqliteDatabase()
+    return Database()
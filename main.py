@@ -1,33 +1,199 @@
+from math import isnan
 from os import getenv
+from typing import Dict, Optional
 
-from discord import Intents, Embed, Color, Game
+from discord import Intents, Embed, Color, Game, Guild, Member, Role
+from discord.abc import GuildChannel
 from discord.ext import commands
 from discord.ext.commands import Context
 from dotenv import load_dotenv
 
-from MessageHelper import MessageHelper
-from MessageTypes import WARN
-from SessionPinger import SessionPinger
-from campaigns import Campaigns
-from database import Database
-from oneshots import Oneshots
-
+# The modules below read their configuration from the environment when they are imported
 load_dotenv()
 
+from AuditLog import audit_log  # noqa: E402
+from MessageHelper import MessageHelper  # noqa: E402
+from MessageQueue import dispatcher  # noqa: E402
+from MessageTypes import WARN  # noqa: E402
+from Metrics import metrics  # noqa: E402
+from NameResolver import name_resolver  # noqa: E402
+from RenderCache import render_cache  # noqa: E402
+from SessionPinger import SessionPinger  # noqa: E402
+from campaigns import Campaigns, router as campaign_router  # noqa: E402
+from database import create_database  # noqa: E402
+from oneshots import Oneshots, router as oneshot_router  # noqa: E402
+from slash_commands import CampaignCommands, OneshotCommands  # noqa: E402
+
 intents: Intents = Intents.default()
 # noinspection PyUnresolvedReferences,PyDunderSlots
 intents.members = True
 prefix = getenv('PREFIX', '$')
-bot = commands.Bot(command_prefix=prefix, intents=intents, activity=Game('Try {}help for more information.'.format(prefix)))
+db = create_database()
+db.subscribe(render_cache.on_database_change)
+metrics.register_collector('dispatcher', dispatcher.metrics)
+metrics.register_collector('render_cache', render_cache.stats)
+metrics.register_collector('campaign_router', campaign_router.stats)
+metrics.register_collector('oneshot_router', oneshot_router.stats)
+metrics.register_collector('name_resolver', name_resolver.stats)
+
+
+def shard_settings() -> Dict:
+    """SHARD_COUNT alone runs all shards in this process, together with SHARD_IDS only the listed ones.
+    Without them Discord's recommended number of shards is used."""
+    settings = {}
+    if getenv('SHARD_COUNT', '') != '':
+        settings['shard_count'] = int(getenv('SHARD_COUNT'))
+        if getenv('SHARD_IDS', '') != '':
+            settings['shard_ids'] = [int(shard_id) for shard_id in getenv('SHARD_IDS').split(',')]
+    return settings
+
+
+class CampaignBot(commands.AutoShardedBot):
+    async def setup_hook(self) -> None:
+        await metrics.start()
+        self.tree.add_command(CampaignCommands(db))
+        self.tree.add_command(OneshotCommands(db))
+        # Syncing is rate limited by Discord, it can be turned off once the commands are registered
+        if getenv('SYNC_COMMANDS', 'true') == 'true':
+            await self.tree.sync()
+
+    async def close(self) -> None:
+        await session_pinger.stop()
+        await metrics.stop()
+        await db.flush()
+        await super().close()
+        audit_log.stop()
+
+
+bot = CampaignBot(command_prefix=prefix, intents=intents, activity=Game('Try {}help for more information.'.format(prefix)), **shard_settings())
 bot.remove_command('help')
 
 
+def runs_all_shards() -> bool:
+    return bot.shard_ids is None or bot.shard_count is None or len(bot.shard_ids) == bot.shard_count
+
+
+def check_storage() -> None:
+    """Processes running only some of the shards share the database, only SQLite keeps them from overwriting each other's changes"""
+    if not runs_all_shards() and getenv('DB_STORAGE', 'json') != 'sqlite':
+        raise SystemExit('SHARD_IDS runs only some of the shards in this process, which requires DB_STORAGE=sqlite')
+
+
+def owns_guild(guild_id: Optional[int]) -> bool:
+    """Whether the guild is on one of the shards of this process, entries without a guild belong to the process running shard 0"""
+    if runs_all_shards():
+        return True
+    if guild_id is None:
+        return 0 in bot.shard_ids
+    # Discord's formula for the shard of a guild
+    return (guild_id >> 22) % bot.shard_count in bot.shard_ids
+
+
+session_pinger = SessionPinger(bot, db, owns_guild)
+metrics.register_collector('reminders', session_pinger.stats)
+# A shard without a heartbeat yet has a latency of NaN, which is left out
+metrics.shard_latency.collect = lambda: {(shard_id,): shard.latency for shard_id, shard in bot.shards.items() if not isnan(shard.latency)}
+
+
+def find_guild_id(entry: Dict) -> Optional[int]:
+    """The guild of an entry saved before entries belonged to a guild, found through its channel or role"""
+    channel = bot.get_channel(int(entry['channel'])) if entry.get('channel') is not None else None
+    if channel is not None:
+        return channel.guild.id
+    if entry.get('role') is not None:
+        for guild in bot.guilds:
+            if guild.get_role(int(entry['role'])) is not None:
+                return guild.id
+    # With other processes running the other shards, the only guild of this process need not be the only guild of the bot
+    if len(bot.guilds) == 1 and runs_all_shards():
+        return bot.guilds[0].id
+    return None
+
+
 @bot.event
 async def on_ready():
-    print('Logged in as {0.user}'.format(bot))
+    print('Logged in as {0.user} with shards {1} of {2}'.format(bot, sorted(bot.shards.keys()), bot.shard_count))
+    metrics.all_shards_ready()
+
+    assigned = await db.assign_guilds(find_guild_id)
+    if assigned > 0:
+        print('Assigned {} campaigns and oneshots to their guilds'.format(assigned))
+    await session_pinger.start()
+
+
+@bot.event
+async def on_shard_connect(shard_id: int):
+    metrics.shard_event(shard_id, 'connect')
+
+
+@bot.event
+async def on_shard_ready(shard_id: int):
+    print('Shard {} is ready'.format(shard_id))
+    metrics.shard_event(shard_id, 'ready')
+
+
+@bot.event
+async def on_shard_disconnect(shard_id: int):
+    metrics.shard_event(shard_id, 'disconnect')
+
+
+@bot.event
+async def on_shard_resumed(shard_id: int):
+    metrics.shard_event(shard_id, 'resumed')
+
 
-    for guild in bot.guilds:
-        await SessionPinger(guild).perform_loop.start()
+@bot.event
+async def on_member_update(before: Member, after: Member):
+    if before.roles != after.roles:
+        for router in (campaign_router, oneshot_router):
+            router.forget_member(after.guild.id, after.id)
+
+
+@bot.event
+async def on_member_remove(member: Member):
+    for router in (campaign_router, oneshot_router):
+        router.forget_member(member.guild.id, member.id)
+
+
+@bot.event
+async def on_guild_role_delete(role: Role):
+    for router in (campaign_router, oneshot_router):
+        router.forget_guild(role.guild.id)
+    name_resolver.role_deleted(role)
+
+
+@bot.event
+async def on_guild_role_create(role: Role):
+    name_resolver.role_changed(role)
+
+
+@bot.event
+async def on_guild_role_update(before: Role, after: Role):
+    if before.name != after.name:
+        name_resolver.role_changed(after)
+
+
+@bot.event
+async def on_guild_channel_create(channel: GuildChannel):
+    name_resolver.channel_changed(channel)
+
+
+@bot.event
+async def on_guild_channel_update(before: GuildChannel, after: GuildChannel):
+    if before.name != after.name or type(before) != type(after):
+        name_resolver.channel_changed(after)
+
+
+@bot.event
+async def on_guild_channel_delete(channel: GuildChannel):
+    name_resolver.channel_deleted(channel)
+
+
+@bot.event
+async def on_guild_remove(guild: Guild):
+    name_resolver.forget_guild(guild.id)
+    for router in (campaign_router, oneshot_router):
+        router.forget_guild(guild.id)
 
 
 @bot.command(name='help')
@@ -37,25 +203,29 @@ async def generic_help(context: Context, *args) -> None:
         embed.add_field(name='campaign', value='Create and manage your campaigns. Restricted to Group Campaign DMs and above.', inline=False)
         embed.add_field(name='oneshot', value='Create and manage your oneshots. Restricted to New DMs and above.', inline=False)
 
-        await context.send(embed=embed)
+        await MessageHelper.send(context, embed=embed)
     else:
         category = args[0].lower()
         if category == 'campaign':
-            await Campaigns(context, Database(), bot.command_prefix).help()
+            await Campaigns(context, db, bot.command_prefix).help()
         elif category == 'oneshot':
-            await Oneshots(context, Database(), bot.command_prefix).help()
+            await Oneshots(context, db, bot.command_prefix).help()
         else:
             await MessageHelper.message(context=context, text='Unknown category.', message_type=WARN)
 
 
 @bot.command(name='campaign')
 async def campaigns(context: Context, *args):
-    await Campaigns(context, Database(), bot.command_prefix).process_commands(context.author, args)
+    db.reload_if_changed()
+    await Campaigns(context, db, bot.command_prefix).process_commands(context.author, args)
 
 
 @bot.command(name='oneshot')
 async def oneshots(context: Context, *args):
-    await Oneshots(context, Database(), bot.command_prefix).process_commands(context.author, args)
+    db.reload_if_changed()
+    await Oneshots(context, db, bot.command_prefix).process_commands(context.author, args)
 
 
-bot.run(getenv('BOT_TOKEN'))
+if __name__ == '__main__':
+    check_storage()
+    bot.run(getenv('BOT_TOKEN'))
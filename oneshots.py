@@ -1,47 +1,47 @@
 import re
-import time
-from datetime import datetime
-from os import getenv
-from typing import Dict, Tuple, Union
+from typing import Dict, Tuple
 
-import pytz
 from discord import Color, Embed, Guild, Member
 from discord.ext.commands import Context
 
 import ActionType
+from CommandRouter import CommandRouter
 from MessageHelper import MessageHelper
 from MessageTypes import INFO, WARN, ERROR
-from database import Database
+from NameResolver import name_resolver
+from Paginator import Paginator
+from ReminderScheduler import MAX_REMINDER_LEAD
+from RenderCache import render_cache
+from TimeHelper import TimeHelper
+from database import Database, LIST_ORDERS
 
 
 class Oneshots:
-    FREE_COMMANDS = ['help', 'list', 'details']
-    GATED_COMMANDS = ['add', 'delete', 'description', 'channel', 'time']
+    PAGE_SIZE = 10
 
     def __init__(self, context: Context, db: Database, prefix: str) -> None:
         self.context = context
         self.db = db
         self.prefix = prefix
-        role_string = getenv('ONESHOT_ROLES')
-        self.GATED_ROLES = list(map(int, role_string.split(','))) if role_string is not None else []
+        self.guild_id = getattr(context.guild, 'id', None)
 
     async def help(self) -> None:
         """Help for Oneshot related commands"""
         help_embed = Embed(colour=Color.dark_gold(), title='Managing Oneshots - Help', description='The following sub-commands are available:')
 
         help_embed.add_field(name='help', value='Displays this help.', inline=False)
-        help_embed.add_field(name='list', value='Lists all oneshots.', inline=False)
+        help_embed.add_field(name='list [id|name|session]', value='Lists all oneshots, up to a maximum of {} per page, sorted by ID (default), name or time. Use the buttons to see more oneshots.'.format(self.PAGE_SIZE), inline=False)
         help_embed.add_field(name='details <oneshot-id|oneshot-name>', value='Display a detailed overview about one oneshot. If multiple are found, all matches will be shown.', inline=False)
         help_embed.add_field(name='add <name> <description> <date> [channel]',
-                             value='Add a new oneshot. Use the format \'YYYY-MM-DD hour:minute[am/pm]\' (e.g. {}) for the date and time. Mention the channel or type down it\'s name.'.format(
-                                 datetime.now(pytz.timezone('Europe/Berlin')).strftime('%Y-%m-%d %I:%M%p')),
+                             value='Add a new oneshot. Use the format \'YYYY-MM-DD hour:minute[am/pm]\' (e.g. {}) for the date and time. Mention the channel or type down it\'s name.'.format(TimeHelper.example_time()),
                              inline=False)
         help_embed.add_field(name='delete <oneshot-name> <oneshot-id>', value='Deletes a oneshot. This cannot be undone!', inline=False)
         help_embed.add_field(name='description <oneshot-id> <description>', value='Update the description of a oneshot.', inline=False)
         help_embed.add_field(name='channel <oneshot-id> <channel>', value='Update the channel of a oneshot.', inline=False)
         help_embed.add_field(name='time <oneshot-id> <time>', value='Update the time of a oneshot.', inline=False)
+        help_embed.add_field(name='lead <oneshot-id> <minutes>', value='Set how many minutes before the oneshot a reminder is sent to its channel (default: 60).', inline=False)
 
-        await self.context.send(embed=help_embed)
+        await MessageHelper.send(self.context, embed=help_embed)
 
     async def add(self, requester: Member, args: Tuple) -> None:
         arg_count = len(args)
@@ -67,15 +67,13 @@ class Oneshots:
             else:
                 guild: Guild = self.context.guild
                 if guild:
-                    for text_channel in guild.text_channels:
-                        if text_channel.name == args[3]:
-                            channel = text_channel.id
-                            break
+                    text_channel = name_resolver.find_channel(guild, args[3])
+                    channel = text_channel.id if text_channel is not None else None
             if channel is None:
                 await MessageHelper.message(context=self.context, text='Invalid Channel ID or name!', message_type=WARN)
                 return
 
-        oneshot_id = await self.db.add_oneshot(name=name, creator=self.context.author, description=description, time=start_time, channel=channel)
+        oneshot_id = await self.db.add_oneshot(name=name, creator=self.context.author, description=description, time=start_time, channel=channel, guild_id=self.guild_id)
         MessageHelper.log(ActionType.ONESHOT_ADD, {'id': oneshot_id, 'name': name, 'user': requester.display_name})
         await MessageHelper.message(context=self.context, text='Successfully added the oneshot "{}" with ID {}.'.format(name, oneshot_id), message_type=INFO)
 
@@ -85,7 +83,7 @@ class Oneshots:
             await MessageHelper.message(context=self.context, text='You need to specify the oneshots name or its ID to delete it!', message_type=WARN)
             return
 
-        oneshots = await self.db.oneshot_details(identifier=args[0])
+        oneshots = await self.db.oneshot_details(args[0], guild_id=self.guild_id)
         if not oneshots or len(oneshots) != 1:
             if not oneshots or len(oneshots) == 0:
                 await MessageHelper.message(context=self.context, text='Could not find the oneshot you specified!', message_type=WARN)
@@ -96,19 +94,22 @@ class Oneshots:
         oneshot: Dict = oneshots[0]
         if oneshot['creator_id'] != requester.id:
             await MessageHelper.message(context=self.context, text='You are not the owner of the oneshot!', message_type=WARN)
+        elif not await self.db.delete_oneshot(str(oneshot['id']), oneshot.get('version', 0)):
+            await MessageHelper.message(context=self.context, text='The oneshot was changed by someone else in the meantime, please try again.', message_type=WARN)
         else:
-            await self.db.delete_oneshot(str(oneshot['id']))
             MessageHelper.log(ActionType.ONESHOT_DELETE, {'id': oneshot['id'], 'name': oneshot['name']})
             await MessageHelper.message(context=self.context, text='Deleted oneshot "{}" successfully.'.format(oneshot['name']), message_type=INFO)
 
-    async def show_list(self) -> None:
-        oneshots = await self.db.list_oneshots()
-        out = Embed(colour=Color.blue(), title='List of oneshots', description='No oneshots found.' if len(oneshots) == 0 else '')
-
-        for oneshot in oneshots.values():
-            out.add_field(name=oneshot.get('name'), value=oneshot.get('description'), inline=False)
+    async def show_list(self, args: Tuple) -> None:
+        """Prints a list of all oneshots, one page at a time"""
+        order = args[0].lower() if len(args) > 0 else 'id'
+        if order not in LIST_ORDERS:
+            await MessageHelper.message(context=self.context, text='Unknown order, please use one of: {}'.format(', '.join(LIST_ORDERS)), message_type=WARN)
+            return
 
-        await self.context.send(embed=out)
+        paginator = Paginator(self.db, 'oneshots', order, title='List of oneshots', empty_text='No oneshots found.', page_size=self.PAGE_SIZE, guild_id=self.guild_id,
+                              render_entry=lambda oneshot: (oneshot['name'], oneshot['description']))
+        await paginator.start(self.context)
 
     async def details(self, args) -> None:
         """Show the details of all oneshots, that match the given identifier"""
@@ -116,25 +117,32 @@ class Oneshots:
             await MessageHelper.message(context=self.context, text='You have to specify a oneshot to show details for!', message_type=WARN)
             return
 
-        details = await self.db.oneshot_details(args[0])
+        details = await self.db.oneshot_details(args[0], guild_id=self.guild_id)
 
         if not details or len(details) == 0:
-            await MessageHelper.message(context=self.context, text='Could not find the oneshot you specified.', message_type=WARN)
+            suggestions = await self.db.suggest('oneshots', args[0], guild_id=self.guild_id)
+            text = 'Could not find the oneshot you specified.'
+            if len(suggestions) > 0:
+                text += ' Did you mean {}?'.format(' or '.join('`{}` ({})'.format(entry['id'], entry['name']) for entry in suggestions))
+            await MessageHelper.message(context=self.context, text=text, message_type=WARN)
             return
 
         for oneshot in details:
-            embed = Embed(title='Oneshot Information - ' + oneshot['name'], colour=Color.blue())
-            embed.add_field(name='ID', value=oneshot['id'])
-            embed.add_field(name='Name', value=oneshot['name'])
-            embed.add_field(name='Description', value=oneshot['description'])
-            embed.add_field(name='Date/Time', value='<t:{0}> (<t:{0}:R>)'.format(int(datetime.strptime(oneshot['time'], '%Y-%m-%d %I:%M%p').replace(tzinfo=pytz.timezone('utc')).timestamp())))
-            if oneshot['channel'] is not None:
-                embed.add_field(name='Channel', value='<#{}>'.format(oneshot['channel']))
-
-            dm = self.context.guild.get_member(oneshot['creator_id'])
-            embed.add_field(name='DM', value='<@{}>'.format(dm.id) if dm else 'Unknown User')
-
-            await self.context.send(embed=embed)
+            embed = render_cache.get_or_render(getattr(self.context.guild, 'id', None), 'oneshots', oneshot, self.render_details)
+            await MessageHelper.send(self.context, embed=embed)
+
+    def render_details(self, oneshot: Dict) -> Embed:
+        embed = Embed(title='Oneshot Information - ' + oneshot['name'], colour=Color.blue())
+        embed.add_field(name='ID', value=oneshot['id'])
+        embed.add_field(name='Name', value=oneshot['name'])
+        embed.add_field(name='Description', value=oneshot['description'])
+        embed.add_field(name='Date/Time', value='<t:{0}> (<t:{0}:R>)'.format(TimeHelper.display_timestamp(oneshot['time_ts'])) if oneshot.get('time_ts') is not None else oneshot['time'])
+        if oneshot['channel'] is not None:
+            embed.add_field(name='Channel', value='<#{}>'.format(oneshot['channel']))
+
+        dm = self.context.guild.get_member(oneshot['creator_id'])
+        embed.add_field(name='DM', value='<@{}>'.format(dm.id) if dm else 'Unknown User')
+        return embed
 
     async def description(self, args) -> None:
         if len(args) < 2:
@@ -148,15 +156,15 @@ class Oneshots:
         oneshot_id = args[0]
         description = args[1]
 
-        success = await self.db.update_oneshot_description(oneshot_id, description)
+        success = await self.db.update_oneshot_description(oneshot_id, description, guild_id=self.guild_id)
         if success:
-            oneshot = await self.db.oneshot_details(oneshot_id)
+            oneshot = await self.db.oneshot_details(oneshot_id, guild_id=self.guild_id)
             MessageHelper.log(ActionType.ONESHOT_DESCRIPTION, {'id': oneshot_id, 'name': oneshot[0]['name'], 'description': description})
             await MessageHelper.message(context=self.context, text='Description updated', message_type=INFO)
         else:
             await MessageHelper.message(context=self.context, text='Failed to update description: Invalid oneshot-ID.', message_type=ERROR)
 
-    async def change_time(self, args) -> None:  # Time format: date = datetime.strptime(date_str, '%Y-%m-%d %I%p'), e.g. 2022-04-08 4:30pm
+    async def change_time(self, args) -> None:  # Time format: see TimeHelper.SESSION_FORMAT, e.g. 2022-04-08 4:30pm
         if len(args) < 2:
             if len(args) == 0:
                 await MessageHelper.message(context=self.context, text='Please specify a valid oneshot-ID.', message_type=WARN)
@@ -168,24 +176,19 @@ class Oneshots:
         oneshot_id = args[0]
         time_string = args[1]
 
-        try:
-            time.strptime(time_string, '%Y-%m-%d %I:%M%p')
-            time_valid = True
-        except ValueError:
-            time_valid = False
-
-        if not time_valid:
+        time_ts = TimeHelper.to_epoch(time_string)
+        if time_ts is None:
             await MessageHelper.message(context=self.context,
-                                        text='The time you specified is incorrectly formatted. Please use the format "YYYY-MM-DD hour:minute[am/pm]" (e.g. {})'.format(datetime.now(pytz.timezone('Europe/Berlin')).strftime('%Y-%m-%d %I:%M%p')),
+                                        text='The time you specified is incorrectly formatted. Please use the format "YYYY-MM-DD hour:minute[am/pm]" (e.g. {})'.format(TimeHelper.example_time()),
                                         message_type=ERROR)
             return
 
-        success = await self.db.oneshot_change_time(oneshot_id, time_string)
+        success = await self.db.oneshot_change_time(oneshot_id, time_string, guild_id=self.guild_id)
         if success:
-            oneshot = await self.db.oneshot_details(oneshot_id)
+            oneshot = await self.db.oneshot_details(oneshot_id, guild_id=self.guild_id)
             MessageHelper.log(ActionType.ONESHOT_TIME, {'id': oneshot_id, 'name': oneshot[0]['name'], 'date': time_string})
             await MessageHelper.message(context=self.context,
-                                        text='Successfully changed the time to <t:{0}>.'.format(int(datetime.strptime(time_string, '%Y-%m-%d %I:%M%p').replace(tzinfo=pytz.timezone('utc')).timestamp())),
+                                        text='Successfully changed the time to <t:{0}>.'.format(TimeHelper.display_timestamp(time_ts)),
                                         message_type=INFO)
         else:
             await MessageHelper.message(context=self.context, text='Failed to update session time: Invalid oneshot-ID.', message_type=ERROR)
@@ -216,58 +219,51 @@ class Oneshots:
                 await MessageHelper.message(context=self.context, text='Invalid Channel ID!', message_type=WARN)
                 return
         else:
-            for text_channel in guild.text_channels:
-                if text_channel.name == channel_string:
-                    channel = text_channel.id
-                    break
+            text_channel = name_resolver.find_channel(guild, channel_string)
+            channel = text_channel.id if text_channel is not None else None
         if channel is None:
             await MessageHelper.message(context=self.context, text='Invalid Channel ID or name!', message_type=WARN)
             return
 
-        await self.db.oneshot_change_channel(oneshot_id, channel)
-        oneshot = await self.db.oneshot_details(oneshot_id)
+        await self.db.oneshot_change_channel(oneshot_id, channel, guild_id=self.guild_id)
+        oneshot = await self.db.oneshot_details(oneshot_id, guild_id=self.guild_id)
         MessageHelper.log(ActionType.ONESHOT_CHANNEL, {'id': oneshot_id, 'name': oneshot[0]['name'], 'channel': channel})
         await MessageHelper.message(context=self.context, text='Successfully changed the channel to {}.', message_type=INFO)
 
-    async def process_commands(self, sender: Member, args: Tuple) -> None:
-        if len(args) == 0:
-            subcommand = 'help'
-        else:
-            subcommand = args[0]
-
-        has_permission = await self.check_permissions_for_command(sender, subcommand)
+    async def change_reminder_lead(self, args) -> None:
+        if len(args) < 2:
+            if len(args) == 0:
+                await MessageHelper.message(context=self.context, text='Please specify a valid oneshot-ID.', message_type=WARN)
+                return
+            if len(args) == 1:
+                await MessageHelper.message(context=self.context, text='Please specify how many minutes before the oneshot the reminder should be sent.', message_type=WARN)
+                return
 
-        if has_permission is None:
-            subcommand = ''
-        elif not has_permission:
-            await MessageHelper.message(context=self.context, text='You do not have the required role to use this command!', message_type=WARN)
+        oneshot_id = args[0]
+        if not args[1].isdigit() or not 0 < int(args[1]) <= MAX_REMINDER_LEAD:
+            await MessageHelper.message(context=self.context, text='Please specify a number of minutes between 1 and {}.'.format(MAX_REMINDER_LEAD), message_type=WARN)
             return
 
-        if subcommand == 'help':
-            await self.help()
-        elif subcommand == 'add':
-            await self.add(sender, args[1:])
-        elif subcommand == 'delete':
-            await self.delete(args[1:], sender)
-        elif subcommand == 'list':
-            await self.show_list()
-        elif subcommand == 'details':
-            await self.details(args[1:])
-        elif subcommand == 'description':
-            await self.description(args[1:])
-        elif subcommand == 'time':
-            await self.change_time(args[1:])
-        elif subcommand == 'channel':
-            await self.change_channel(args[1:])
+        minutes = int(args[1])
+        success = await self.db.oneshot_change_reminder_lead(oneshot_id, minutes, guild_id=self.guild_id)
+        if success:
+            oneshot = await self.db.oneshot_details(oneshot_id, guild_id=self.guild_id)
+            MessageHelper.log(ActionType.ONESHOT_REMINDER_LEAD, {'id': oneshot_id, 'name': oneshot[0]['name'], 'lead': minutes})
+            await MessageHelper.message(context=self.context, text='The reminder will now be sent {} before the oneshot.'.format(TimeHelper.describe_minutes(minutes)), message_type=INFO)
         else:
-            await MessageHelper.message(self.context, text='Unknown subcommand. Try `{}campaign help` for a full list of subcommands'.format(self.prefix), message_type='WARN')
-
-    async def check_permissions_for_command(self, requester: Member, command: str) -> Union[bool, None]:
-        if command in self.FREE_COMMANDS:
-            return True
+            await MessageHelper.message(context=self.context, text='Failed to update the reminder: Invalid oneshot-ID.', message_type=ERROR)
 
-        if command in self.GATED_COMMANDS:
-            role_ids = list(map(lambda role: role.id, requester.roles))
-            return not set(role_ids).isdisjoint(self.GATED_ROLES)
-
-        return None
+    async def process_commands(self, sender: Member, args: Tuple) -> None:
+        await router.dispatch(self, self.context, sender, args)
+
+
+router = CommandRouter('oneshot', 'ONESHOT_ROLES')
+router.register('help', lambda oneshots, sender, args: oneshots.help())
+router.register('list', lambda oneshots, sender, args: oneshots.show_list(args))
+router.register('details', lambda oneshots, sender, args: oneshots.details(args))
+router.register('add', Oneshots.add, gated=True)
+router.register('delete', lambda oneshots, sender, args: oneshots.delete(args, sender), gated=True)
+router.register('description', lambda oneshots, sender, args: oneshots.description(args), gated=True)
+router.register('time', lambda oneshots, sender, args: oneshots.change_time(args), gated=True)
+router.register('channel', lambda oneshots, sender, args: oneshots.change_channel(args), gated=True)
+router.register('lead', lambda oneshots, sender, args: oneshots.change_reminder_lead(args), gated=True)
@@ -0,0 +1,390 @@
+import heapq
+from bisect import bisect_left, insort
+from typing import Dict, Iterator, List, Set, Optional, Tuple
+
+# Keys of the entries whose ID or a word of whose name ends in a trie node, and of those whose whole name ends there.
+# The other keys are single characters.
+END = ''
+NAME_END = None
+
+
+class NameIndex:
+    """Lowercased names of campaigns or oneshots with a trigram index, to find entries by a part of their name"""
+
+    def __init__(self) -> None:
+        self.names: Dict[str, str] = {}
+        self.positions: Dict[str, int] = {}
+        self.trigrams: Dict[str, Set[str]] = {}
+        self.next_position = 0
+
+    def __contains__(self, entry_id: str) -> bool:
+        return entry_id in self.names
+
+    @staticmethod
+    def get_trigrams(text: str) -> Set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    def rebuild(self, entries: Dict, positions: Optional[Dict[str, int]] = None) -> None:
+        self.__init__()
+        for entry_id, entry in entries.items():
+            self.add(entry_id, entry['name'], positions[entry_id] if positions is not None else None)
+
+    def add(self, entry_id: str, name: str, position: Optional[int] = None) -> None:
+        """Add an entry or update its name, a renamed entry keeps its position in the results.
+        Without a position, entries are returned in the order they were added."""
+        if entry_id in self.names:
+            self.remove_trigrams(entry_id)
+        else:
+            self.positions[entry_id] = position if position is not None else self.next_position
+            self.next_position = max(self.next_position, self.positions[entry_id]) + 1
+
+        lower_name = name.lower()
+        self.names[entry_id] = lower_name
+        for trigram in self.get_trigrams(lower_name):
+            self.trigrams.setdefault(trigram, set()).add(entry_id)
+
+    def remove(self, entry_id: str) -> None:
+        if entry_id not in self.names:
+            return
+        self.remove_trigrams(entry_id)
+        del self.names[entry_id]
+        del self.positions[entry_id]
+
+    def remove_trigrams(self, entry_id: str) -> None:
+        for trigram in self.get_trigrams(self.names[entry_id]):
+            entry_ids = self.trigrams[trigram]
+            entry_ids.discard(entry_id)
+            if len(entry_ids) == 0:
+                del self.trigrams[trigram]
+
+    def search(self, text: str) -> List[str]:
+        """IDs of all entries whose name contains the text (case-insensitive), ordered by their positions"""
+        text = text.lower()
+        if len(text) < 3:
+            return sorted((entry_id for entry_id, name in self.names.items() if text in name), key=self.positions.get)
+
+        candidates = None
+        for trigram in sorted(self.get_trigrams(text), key=lambda key: len(self.trigrams.get(key, ()))):
+            entry_ids = self.trigrams.get(trigram)
+            if not entry_ids:
+                return []
+            candidates = set(entry_ids) if candidates is None else candidates & entry_ids
+            if len(candidates) == 0:
+                return []
+
+        # The trigrams only narrow the candidates down, the name still has to contain the whole text
+        return sorted((entry_id for entry_id in candidates if text in self.names[entry_id]), key=self.positions.get)
+
+
+def char_masks(text: str) -> Dict[str, int]:
+    """Bit i of the mask of a character is set where text[i] is that character"""
+    masks: Dict[str, int] = {}
+    for i, char in enumerate(text):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+
+def bit_parallel_distance(masks: Dict[str, int], length: int, other: str) -> int:
+    """Levenshtein distance between the text of the masks and the other string, with a whole column of the table in a few integer operations (Myers)"""
+    if length == 0:
+        return len(other)
+    full = (1 << length) - 1
+    last = 1 << (length - 1)
+    positive, negative, distance = full, 0, length
+    for char in other:
+        equal = masks.get(char, 0)
+        vertical = equal | negative
+        horizontal = (((equal & positive) + positive) ^ positive) | equal
+        horizontal_positive = negative | ~(horizontal | positive)
+        horizontal_negative = positive & horizontal
+        if horizontal_positive & last:
+            distance += 1
+        elif horizontal_negative & last:
+            distance -= 1
+        horizontal_positive = (horizontal_positive << 1) | 1
+        horizontal_negative <<= 1
+        positive = (horizontal_negative | ~(vertical | horizontal_positive)) & full
+        negative = horizontal_positive & vertical & full
+    return distance
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance of the strings, or max_distance + 1 if it is larger than max_distance"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    return min(bit_parallel_distance(char_masks(a), len(a), b), max_distance + 1)
+
+
+class BigramBucket:
+    """IDs and words with the same length, number of bigrams and number of digits. Every bigram has a mask of the terms that contain it, bit i standing for terms[i],
+    so the bigrams a text shares with all of them are counted with a few operations on whole masks instead of term by term."""
+
+    def __init__(self) -> None:
+        self.terms: List[Optional[str]] = []
+        self.free_slots: List[int] = []
+        self.masks: Dict[str, int] = {}
+        self.occupied = 0
+        # Slots added since the masks were last read, setting their bits one by one would copy the whole masks every time
+        self.pending: Dict[str, List[int]] = {}
+        self.pending_slots: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.terms) - len(self.free_slots)
+
+    def add(self, term: str, bigrams: Set[str]) -> int:
+        if len(self.free_slots) > 0:
+            slot = self.free_slots.pop()
+            self.terms[slot] = term
+        else:
+            slot = len(self.terms)
+            self.terms.append(term)
+        self.pending_slots.append(slot)
+        for bigram in bigrams:
+            self.pending.setdefault(bigram, []).append(slot)
+        return slot
+
+    def remove(self, slot: int, bigrams: Set[str]) -> None:
+        self.flush()
+        self.terms[slot] = None
+        self.free_slots.append(slot)
+        bit = 1 << slot
+        self.occupied &= ~bit
+        for bigram in bigrams:
+            mask = self.masks[bigram] & ~bit
+            if mask == 0:
+                del self.masks[bigram]
+            else:
+                self.masks[bigram] = mask
+
+    def to_mask(self, slots: List[int]) -> int:
+        if len(slots) < 8:
+            return sum(1 << slot for slot in slots)
+        mask = bytearray(len(self.terms) // 8 + 1)
+        for slot in slots:
+            mask[slot >> 3] |= 1 << (slot & 7)
+        return int.from_bytes(mask, 'little')
+
+    def flush(self) -> None:
+        """Sets the bits of the pending slots"""
+        if len(self.pending_slots) == 0:
+            return
+        self.occupied |= self.to_mask(self.pending_slots)
+        for bigram, slots in self.pending.items():
+            self.masks[bigram] = self.masks.get(bigram, 0) | self.to_mask(slots)
+        self.pending, self.pending_slots = {}, []
+
+    def count(self, bigrams: Set[str]) -> List[int]:
+        """Per term the number of the bigrams it contains, as binary digits: bit i of the k-th mask is the k-th digit of the count of terms[i]"""
+        self.flush()
+        digits: List[int] = []
+        for bigram in bigrams:
+            carry = self.masks.get(bigram, 0)
+            for k in range(len(digits)):
+                if carry == 0:
+                    break
+                digits[k], carry = digits[k] ^ carry, digits[k] & carry
+            if carry != 0:
+                digits.append(carry)
+        return digits
+
+    def at_least(self, digits: List[int], minimum: int) -> List[str]:
+        """The terms whose count is at least the minimum, compared digit by digit from the highest one"""
+        if minimum > (1 << len(digits)) - 1:
+            return []
+        greater, equal = 0, self.occupied
+        for k in range(max(len(digits), minimum.bit_length()) - 1, -1, -1):
+            digit = digits[k] if k < len(digits) else 0
+            if (minimum >> k) & 1:
+                equal &= digit
+            else:
+                greater |= equal & digit
+                equal &= ~digit
+        # Few terms match, so they are read from the highest bit down instead of going over all the bits
+        matching = greater | equal
+        terms = []
+        while matching != 0:
+            slot = matching.bit_length() - 1
+            terms.append(self.terms[slot])
+            matching ^= 1 << slot
+        return terms
+
+
+class AutocompleteIndex:
+    """IDs, names and the words of the names of campaigns or oneshots in a trie, to complete what was typed so far.
+    Every node keeps the entries whose terms end there sorted by position, so only as many as are returned are read.
+    IDs and words are also indexed by their bigrams, bucketed by their length, number of bigrams and number of digits, to suggest entries for typos without comparing every term."""
+
+    def __init__(self) -> None:
+        self.root: Dict = {}
+        self.terms: Dict[str, List[Tuple[str, str]]] = {}
+        # ID or word -> the sorted entry list of its trie node and its slot in its bucket
+        self.fuzzy_terms: Dict[str, List[Tuple[int, str]]] = {}
+        self.slots: Dict[str, int] = {}
+        self.buckets: Dict[Tuple[int, int, int], BigramBucket] = {}
+        self.positions: Dict[str, int] = {}
+        self.next_position = 0
+
+    def __contains__(self, entry_id: str) -> bool:
+        return entry_id in self.terms
+
+    @staticmethod
+    def get_terms(entry_id: str, name: str) -> List[Tuple[str, str]]:
+        """(term, key of the node's entries) for the ID and the words, which are also matched with typos, and the whole name"""
+        lower_name = name.lower()
+        terms = [(term, END) for term in dict.fromkeys([entry_id.lower()] + lower_name.split())]
+        return terms + [(lower_name, NAME_END)]
+
+    @staticmethod
+    def get_bigrams(term: str) -> Set[str]:
+        # Padded, so that the first and the last character count as well
+        padded = ' {} '.format(term)
+        return {padded[i:i + 2] for i in range(len(padded) - 1)}
+
+    @staticmethod
+    def bucket_key(term: str, bigrams: Set[str]) -> Tuple[int, int, int]:
+        # The digits keep the numeric IDs apart from the words, an edit changes their number by at most one
+        return len(term), len(bigrams), sum(char.isdigit() for char in term)
+
+    @staticmethod
+    def children(node: Dict) -> Iterator[Tuple[str, Dict]]:
+        return ((char, child) for char, child in node.items() if char not in (END, NAME_END))
+
+    def rebuild(self, entries: Dict, positions: Optional[Dict[str, int]] = None) -> None:
+        self.__init__()
+        for entry_id, entry in entries.items():
+            self.add(entry_id, entry['name'], positions[entry_id] if positions is not None else None)
+        for bucket in self.buckets.values():
+            bucket.flush()
+
+    def add(self, entry_id: str, name: str, position: Optional[int] = None) -> None:
+        """Add an entry or update its name, a renamed entry keeps its position in the results.
+        Without a position, entries are returned in the order they were added."""
+        if entry_id in self.terms:
+            self.remove_terms(entry_id)
+        else:
+            self.positions[entry_id] = position if position is not None else self.next_position
+            self.next_position = max(self.next_position, self.positions[entry_id]) + 1
+
+        self.terms[entry_id] = self.get_terms(entry_id, name)
+        for term, end in self.terms[entry_id]:
+            node = self.root
+            for char in term:
+                node = node.setdefault(char, {})
+            if end not in node:
+                node[end] = []
+                if end == END:
+                    self.fuzzy_terms[term] = node[end]
+                    bigrams = self.get_bigrams(term)
+                    self.slots[term] = self.buckets.setdefault(self.bucket_key(term, bigrams), BigramBucket()).add(term, bigrams)
+            insort(node[end], (self.positions[entry_id], entry_id))
+
+    def remove(self, entry_id: str) -> None:
+        if entry_id not in self.terms:
+            return
+        self.remove_terms(entry_id)
+        del self.terms[entry_id]
+        del self.positions[entry_id]
+
+    def remove_terms(self, entry_id: str) -> None:
+        for term, end in self.terms[entry_id]:
+            path = [self.root]
+            for char in term:
+                path.append(path[-1][char])
+            entries = path[-1][end]
+            del entries[bisect_left(entries, (self.positions[entry_id], entry_id))]
+            if len(entries) == 0:
+                del path[-1][end]
+                if end == END:
+                    del self.fuzzy_terms[term]
+                    bigrams = self.get_bigrams(term)
+                    key = self.bucket_key(term, bigrams)
+                    self.buckets[key].remove(self.slots.pop(term), bigrams)
+                    if len(self.buckets[key]) == 0:
+                        del self.buckets[key]
+            # Prune the nodes that lead nowhere anymore, from the end of the term upwards
+            for depth in range(len(term), 0, -1):
+                if len(path[depth]) > 0:
+                    break
+                del path[depth - 1][term[depth - 1]]
+
+    def find_node(self, prefix: str) -> Optional[Dict]:
+        node = self.root
+        for char in prefix:
+            node = node.get(char)
+            if node is None:
+                return None
+        return node
+
+    @staticmethod
+    def take(sorted_entries: List[List[Tuple[int, str]]], found: Dict[str, None], limit: int) -> None:
+        """Adds entries from the lists, which are sorted by position, in the order of their positions until there are limit"""
+        for _, entry_id in heapq.merge(*sorted_entries):
+            if len(found) >= limit:
+                return
+            found.setdefault(entry_id, None)
+
+    def complete(self, prefix: str, limit: int) -> List[str]:
+        """IDs of up to limit entries with an ID, a name or a word in the name that starts with the prefix, shortest completions first"""
+        node = self.find_node(prefix.lower())
+        if node is None:
+            return []
+
+        found: Dict[str, None] = {}
+        # One depth at a time, so that the search stops at the depth at which enough entries were found
+        level = [node]
+        while len(level) > 0:
+            self.take([level_node[end] for level_node in level for end in (END, NAME_END) if end in level_node], found, limit)
+            if len(found) >= limit:
+                break
+            level = [child for level_node in level for _, child in self.children(level_node)]
+        return list(found.keys())
+
+    def suggest(self, text: str, limit: int, max_distance: Optional[int] = None) -> List[str]:
+        """IDs of up to limit entries with an ID or a word in the name that is at most max_distance edits away from the text, closest first"""
+        text = text.lower()
+        if max_distance is None:
+            max_distance = 1 if len(text) <= 4 else 2
+
+        # Most typos are a single edit, so the closer terms are searched first, and often already fill the limit
+        text_masks = char_masks(text)
+        text_bigrams = self.get_bigrams(text)
+        counts: Dict[Tuple[int, int, int], List[int]] = {}
+        distances: Dict[str, int] = {}
+        found: Dict[str, None] = {}
+        for distance_limit in sorted({min(1, max_distance), max_distance}):
+            for term in self.candidates(text, text_bigrams, distance_limit, counts):
+                if term not in distances:
+                    distances[term] = bit_parallel_distance(text_masks, len(text), term)
+
+            # Entry lists of the terms per distance to the text
+            matches: List[List[List[Tuple[int, str]]]] = [[] for _ in range(distance_limit + 1)]
+            for term, distance in distances.items():
+                if distance <= distance_limit:
+                    matches[distance].append(self.fuzzy_terms[term])
+            found = {}
+            for sorted_entries in matches:
+                self.take(sorted_entries, found, limit)
+            if len(found) >= limit:
+                break
+        return list(found.keys())
+
+    def candidates(self, text: str, text_bigrams: Set[str], max_distance: int, counts: Dict[Tuple[int, int, int], List[int]]) -> Iterator[str]:
+        """IDs and words that share enough bigrams with the text to be at most max_distance edits away from it.
+        The counts of the shared bigrams per bucket are kept for the next search with a larger max_distance."""
+        _, text_bigram_count, text_digits = self.bucket_key(text, text_bigrams)
+        for length in range(max(len(text) - max_distance, 0), len(text) + max_distance + 1):
+            # An edit changes at most two of the bigrams of either term, so both have all their others in common
+            for bigram_count in range(max(text_bigram_count - 2 * max_distance, 1), text_bigram_count + 2 * max_distance + 1):
+                for digits in range(max(text_digits - max_distance, 0), min(text_digits + max_distance, length) + 1):
+                    key = (length, bigram_count, digits)
+                    bucket = self.buckets.get(key)
+                    if bucket is None:
+                        continue
+                    min_shared = max(text_bigram_count, bigram_count) - 2 * max_distance
+                    if min_shared > 0:
+                        if key not in counts:
+                            counts[key] = bucket.count(text_bigrams)
+                        yield from bucket.at_least(counts[key], min_shared)
+                    else:
+                        # Too short for the bigrams to rule anything out, e.g. a single character
+                        yield from (term for term in bucket.terms if term is not None)
@@ -0,0 +1,171 @@
+from typing import List, Literal, Optional
+
+from discord import Interaction, Message, Role, TextChannel, app_commands
+from discord.app_commands import Choice, Range
+
+from ReminderScheduler import MAX_REMINDER_LEAD
+from campaigns import Campaigns
+from database import Database
+from oneshots import Oneshots
+
+MAX_CHOICES = 25
+MAX_CHOICE_NAME_LENGTH = 100
+
+
+class InteractionContext:
+    """Stands in for the Context the command classes were written for, so they can answer slash commands as well.
+    The interaction is deferred before the command runs, so everything is sent as a followup."""
+
+    def __init__(self, interaction: Interaction) -> None:
+        self.interaction = interaction
+        self.guild = interaction.guild
+        self.author = interaction.user
+        self.channel = interaction.channel
+
+    async def send(self, **kwargs) -> Message:
+        return await self.interaction.followup.send(wait=True, **kwargs)
+
+
+async def entry_choices(db: Database, kind: str, interaction: Interaction, current: str) -> List[Choice[str]]:
+    """Campaigns or oneshots of the guild whose ID, name or a word of the name starts with what was typed so far,
+    or whose name contains it if nothing starts with it. All of it is served from the database's indexes."""
+    guild_id = getattr(interaction.guild, 'id', None)
+    if current == '':
+        entries, _ = await db.list_page(kind, 'name', limit=MAX_CHOICES, guild_id=guild_id)
+    else:
+        entries = await db.complete(kind, current, MAX_CHOICES, guild_id)
+        if len(entries) == 0 and kind == 'campaigns':
+            entries = await db.campaign_details(current, guild_id=guild_id) or []
+        elif len(entries) == 0:
+            entries = await db.oneshot_details(current, guild_id=guild_id) or []
+    return [Choice(name='{} ({})'.format(entry['name'], entry['id'])[:MAX_CHOICE_NAME_LENGTH], value=str(entry['id'])) for entry in entries[:MAX_CHOICES]]
+
+
+async def run_command(interaction: Interaction, command, *args) -> None:
+    """Runs a subcommand of a Campaigns or Oneshots instance, options that were left out are not passed on"""
+    # Acknowledge right away, the reply may take longer than the three seconds Discord waits for it
+    await interaction.response.defer(thinking=True)
+    command.db.reload_if_changed()
+    await command.process_commands(interaction.user, tuple(str(arg) for arg in args if arg is not None))
+
+
+class CampaignCommands(app_commands.Group):
+
+    def __init__(self, db: Database) -> None:
+        super().__init__(name='campaign', description='Create and manage your campaigns.', guild_only=True)
+        self.db = db
+
+    async def run(self, interaction: Interaction, *args) -> None:
+        await run_command(interaction, Campaigns(InteractionContext(interaction), self.db, '/'), *args)
+
+    async def campaign_autocomplete(self, interaction: Interaction, current: str) -> List[Choice[str]]:
+        return await entry_choices(self.db, 'campaigns', interaction, current)
+
+    @app_commands.command(name='help', description='Show the available campaign commands.')
+    async def help(self, interaction: Interaction) -> None:
+        await self.run(interaction, 'help')
+
+    @app_commands.command(name='list', description='List all campaigns.')
+    async def show_list(self, interaction: Interaction, order: Literal['id', 'name', 'session'] = 'id') -> None:
+        await self.run(interaction, 'list', order)
+
+    @app_commands.command(name='details', description='Show the details of a campaign.')
+    @app_commands.describe(campaign='ID or a part of the name')
+    async def details(self, interaction: Interaction, campaign: str) -> None:
+        await self.run(interaction, 'details', campaign)
+
+    @app_commands.command(name='add', description='Add a new campaign.')
+    @app_commands.describe(module='Use "Homebrew" if not applicable', campaign_id='Usually the group number')
+    async def add(self, interaction: Interaction, name: str, module: str, description: str, campaign_id: str) -> None:
+        await self.run(interaction, 'add', name, module, description, campaign_id)
+
+    @app_commands.command(name='delete', description='Delete a campaign. This cannot be undone!')
+    @app_commands.describe(name='The name of the campaign, to confirm')
+    async def delete(self, interaction: Interaction, campaign: str, name: str) -> None:
+        await self.run(interaction, 'delete', name, campaign)
+
+    @app_commands.command(name='description', description='Update the description of a campaign.')
+    async def update_description(self, interaction: Interaction, campaign: str, description: str) -> None:
+        await self.run(interaction, 'description', campaign, description)
+
+    @app_commands.command(name='session', description='Update the date of the next session.')
+    @app_commands.describe(date='YYYY-MM-DD hour:minute[am/pm]')
+    async def session(self, interaction: Interaction, campaign: str, date: str) -> None:
+        await self.run(interaction, 'session', campaign, date)
+
+    @app_commands.command(name='role', description='Show or update the role to be pinged for sessions.')
+    async def role(self, interaction: Interaction, campaign: str, role: Optional[Role] = None) -> None:
+        await self.run(interaction, 'role', campaign, role.id if role is not None else None)
+
+    @app_commands.command(name='channel', description='Update the channel to receive notifications for sessions.')
+    async def channel(self, interaction: Interaction, campaign: str, channel: TextChannel) -> None:
+        await self.run(interaction, 'channel', campaign, channel.id)
+
+    @app_commands.command(name='notify', description='Set if there is an additional notification in the morning of the session.')
+    async def notify(self, interaction: Interaction, campaign: str, enabled: bool) -> None:
+        await self.run(interaction, 'notify', campaign, 'true' if enabled else 'false')
+
+    @app_commands.command(name='lead', description='Set how many minutes before the session the reminder is sent.')
+    async def lead(self, interaction: Interaction, campaign: str, minutes: Range[int, 1, MAX_REMINDER_LEAD]) -> None:
+        await self.run(interaction, 'lead', campaign, minutes)
+
+    # Every subcommand that takes a campaign completes it the same way
+    for subcommand in [details, delete, update_description, session, role, channel, notify, lead]:
+        subcommand.autocomplete('campaign')(campaign_autocomplete)
+    del subcommand
+
+
+class OneshotCommands(app_commands.Group):
+
+    def __init__(self, db: Database) -> None:
+        super().__init__(name='oneshot', description='Create and manage your oneshots.', guild_only=True)
+        self.db = db
+
+    async def run(self, interaction: Interaction, *args) -> None:
+        await run_command(interaction, Oneshots(InteractionContext(interaction), self.db, '/'), *args)
+
+    async def oneshot_autocomplete(self, interaction: Interaction, current: str) -> List[Choice[str]]:
+        return await entry_choices(self.db, 'oneshots', interaction, current)
+
+    @app_commands.command(name='help', description='Show the available oneshot commands.')
+    async def help(self, interaction: Interaction) -> None:
+        await self.run(interaction, 'help')
+
+    @app_commands.command(name='list', description='List all oneshots.')
+    async def show_list(self, interaction: Interaction, order: Literal['id', 'name', 'session'] = 'id') -> None:
+        await self.run(interaction, 'list', order)
+
+    @app_commands.command(name='details', description='Show the details of a oneshot.')
+    @app_commands.describe(oneshot='ID or a part of the name')
+    async def details(self, interaction: Interaction, oneshot: str) -> None:
+        await self.run(interaction, 'details', oneshot)
+
+    @app_commands.command(name='add', description='Add a new oneshot.')
+    @app_commands.describe(date='YYYY-MM-DD hour:minute[am/pm]')
+    async def add(self, interaction: Interaction, name: str, description: str, date: str, channel: Optional[TextChannel] = None) -> None:
+        await self.run(interaction, 'add', name, description, date, channel.id if channel is not None else None)
+
+    @app_commands.command(name='delete', description='Delete a oneshot. This cannot be undone!')
+    async def delete(self, interaction: Interaction, oneshot: str) -> None:
+        await self.run(interaction, 'delete', oneshot)
+
+    @app_commands.command(name='description', description='Update the description of a oneshot.')
+    async def update_description(self, interaction: Interaction, oneshot: str, description: str) -> None:
+        await self.run(interaction, 'description', oneshot, description)
+
+    @app_commands.command(name='time', description='Update the time of a oneshot.')
+    @app_commands.describe(time='YYYY-MM-DD hour:minute[am/pm]')
+    async def time(self, interaction: Interaction, oneshot: str, time: str) -> None:
+        await self.run(interaction, 'time', oneshot, time)
+
+    @app_commands.command(name='channel', description='Update the channel of a oneshot.')
+    async def channel(self, interaction: Interaction, oneshot: str, channel: TextChannel) -> None:
+        await self.run(interaction, 'channel', oneshot, channel.id)
+
+    @app_commands.command(name='lead', description='Set how many minutes before the oneshot the reminder is sent.')
+    async def lead(self, interaction: Interaction, oneshot: str, minutes: Range[int, 1, MAX_REMINDER_LEAD]) -> None:
+        await self.run(interaction, 'lead', oneshot, minutes)
+
+    for subcommand in [details, delete, update_description, time, channel, lead]:
+        subcommand.autocomplete('oneshot')(oneshot_autocomplete)
+    del subcommand
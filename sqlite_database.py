@@ -0,0 +1,471 @@
+import asyncio
+import json
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv
+from typing import Dict, Union, List, Optional, Callable, Any, Tuple
+
+from discord import Member
+from dotenv import load_dotenv
+
+from Metrics import metrics
+from TimeHelper import TimeHelper
+from ReminderScheduler import MAX_REMINDER_LEAD
+from database import shares_guild, sent_session
+from search import AutocompleteIndex
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS campaigns (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    module TEXT,
+    description TEXT,
+    creator_id INTEGER,
+    session TEXT,
+    session_ts INTEGER,
+    role INTEGER,
+    channel INTEGER,
+    extra_notification TEXT,
+    reminder_lead INTEGER,
+    guild_id INTEGER,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS campaigns_creator_id ON campaigns (creator_id);
+CREATE INDEX IF NOT EXISTS campaigns_session_ts ON campaigns (session_ts);
+CREATE INDEX IF NOT EXISTS campaigns_name_lower ON campaigns (name_lower);
+CREATE INDEX IF NOT EXISTS campaigns_guild_id ON campaigns (guild_id);
+
+CREATE TABLE IF NOT EXISTS oneshots (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    description TEXT,
+    creator_id INTEGER,
+    channel INTEGER,
+    time TEXT,
+    time_ts INTEGER,
+    reminder_lead INTEGER,
+    guild_id INTEGER,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS oneshots_creator_id ON oneshots (creator_id);
+CREATE INDEX IF NOT EXISTS oneshots_time_ts ON oneshots (time_ts);
+CREATE INDEX IF NOT EXISTS oneshots_name_lower ON oneshots (name_lower);
+CREATE INDEX IF NOT EXISTS oneshots_guild_id ON oneshots (guild_id);
+
+CREATE TABLE IF NOT EXISTS sent_reminders (
+    key TEXT PRIMARY KEY,
+    due INTEGER NOT NULL,
+    session INTEGER
+);
+CREATE INDEX IF NOT EXISTS sent_reminders_session ON sent_reminders (session);
+
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('last_oneshot_id', 0);
+'''
+
+CAMPAIGN_COLUMNS = 'id, name, module, description, creator_id, session, session_ts, role, channel, extra_notification, reminder_lead, guild_id, version'
+ONESHOT_COLUMNS = 'id, name, description, creator_id, channel, time, time_ts, reminder_lead, guild_id, version'
+# Columns of the campaign dicts that are named differently in the table
+CAMPAIGN_FIELD_COLUMNS = {'extra-notification': 'extra_notification'}
+
+# SQL expressions that result in the same tuples as database.sort_key, so its keys can be used as cursors
+NUMERIC_ID = 'id NOT GLOB \'*[^0-9]*\' AND id != \'\''
+SORT_EXPRESSIONS = {
+    ('campaigns', 'id'): ['CASE WHEN {0} THEN 0 ELSE 1 END'.format(NUMERIC_ID), 'CASE WHEN {0} THEN CAST(id AS INTEGER) ELSE 0 END'.format(NUMERIC_ID), 'id'],
+    ('campaigns', 'name'): ['name_lower', 'id'],
+    ('campaigns', 'session'): ['session_ts IS NULL', 'COALESCE(session_ts, 0)', 'id'],
+    ('oneshots', 'id'): ['CAST(0 AS INTEGER)', 'id', 'CAST(id AS TEXT)'],
+    ('oneshots', 'name'): ['name_lower', 'CAST(id AS TEXT)'],
+    ('oneshots', 'session'): ['time_ts IS NULL', 'COALESCE(time_ts, 0)', 'CAST(id AS TEXT)']
+}
+
+
+def escape_like(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def guild_filter(guild_id: Optional[int]) -> Tuple[str, tuple]:
+    """WHERE condition for the entries a guild sees, see database.shares_guild"""
+    if guild_id is None:
+        return '1', ()
+    return '(guild_id = ? OR guild_id IS NULL)', (guild_id,)
+
+
+class SqliteDatabase:
+    """Same interface as Database, but backed by SQLite. All queries run on one dedicated worker thread."""
+
+    # ------------- #
+    # General-Stuff #
+    # ------------- #
+
+    def __init__(self, filepath: Optional[str] = None) -> None:
+        # Not DB_FILE, which names the JSON file that is imported when switching to SQLite
+        self.filepath = filepath or getenv('SQLITE_FILE', 'db.sqlite3')
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self.connection: Optional[sqlite3.Connection] = None
+        self.load_count = 0
+        self.write_count = 0
+        self.listeners: List[Callable[[str, Optional[str], Optional[Dict]], None]] = []
+        # (kind, guild id) -> index, built on first use and kept in sync by entry_changed
+        self.autocomplete_indexes: Dict[Tuple[str, Optional[int]], AutocompleteIndex] = {}
+        self.executor.submit(self.connect).result()
+
+    def connect(self) -> None:
+        self.connection = sqlite3.connect(self.filepath, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.add_missing_columns()
+        self.connection.executescript(SCHEMA)
+        self.fill_missing_timestamps()
+        self.connection.commit()
+        self.load_count += 1
+
+    def add_missing_columns(self) -> None:
+        """Tables created by older versions lack the newer columns"""
+        for table, column, definition in [('campaigns', 'session_ts', 'INTEGER'), ('oneshots', 'time_ts', 'INTEGER'), ('campaigns', 'reminder_lead', 'INTEGER'), ('oneshots', 'reminder_lead', 'INTEGER'),
+                                          ('campaigns', 'guild_id', 'INTEGER'), ('oneshots', 'guild_id', 'INTEGER'),
+                                          ('campaigns', 'version', 'INTEGER NOT NULL DEFAULT 0'), ('oneshots', 'version', 'INTEGER NOT NULL DEFAULT 0'), ('sent_reminders', 'session', 'INTEGER')]:
+            columns = [row['name'] for row in self.connection.execute('PRAGMA table_info({})'.format(table))]
+            if len(columns) > 0 and column not in columns:
+                self.connection.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(table, column, definition))
+
+    def fill_missing_timestamps(self) -> None:
+        for row in self.connection.execute('SELECT id, session FROM campaigns WHERE session IS NOT NULL AND session_ts IS NULL').fetchall():
+            self.connection.execute('UPDATE campaigns SET session_ts = ? WHERE id = ?', (TimeHelper.to_epoch(row['session']), row['id']))
+        for row in self.connection.execute('SELECT id, time FROM oneshots WHERE time IS NOT NULL AND time_ts IS NULL').fetchall():
+            self.connection.execute('UPDATE oneshots SET time_ts = ? WHERE id = ?', (TimeHelper.to_epoch(row['time']), row['id']))
+
+    async def run(self, function: Callable, *args) -> Any:
+        with metrics.time_store('query'):
+            return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def query(self, sql: str, parameters: tuple = ()) -> List[sqlite3.Row]:
+        return self.connection.execute(sql, parameters).fetchall()
+
+    def execute(self, sql: str, parameters: tuple = ()) -> int:
+        cursor = self.connection.execute(sql, parameters)
+        self.connection.commit()
+        self.write_count += 1
+        return cursor.rowcount
+
+    def reload_if_changed(self) -> bool:
+        """SQLite is always read directly, there is nothing to reload"""
+        return False
+
+    async def flush(self) -> None:
+        """Every change is committed right away, this only waits for queries that are still queued"""
+        await self.run(lambda: None)
+
+    def subscribe(self, listener: Callable[[str, Optional[str], Optional[Dict]], None]) -> None:
+        """The listener is called with (kind, entry_id, entry) after a campaign or oneshot changed, the entry is None if it was deleted"""
+        self.listeners.append(listener)
+
+    def notify(self, kind: str, entry_id: Optional[str], entry: Optional[Dict]) -> None:
+        for listener in self.listeners:
+            listener(kind, entry_id, entry)
+
+    async def entry_changed(self, kind: str, entry_id: str) -> None:
+        if len(self.listeners) == 0 and len(self.autocomplete_indexes) == 0:
+            return
+        if kind == 'campaigns':
+            rows = await self.run(self.query, 'SELECT rowid, {} FROM campaigns WHERE id = ?'.format(CAMPAIGN_COLUMNS), (entry_id,))
+            entry = self.campaign_from_row(rows[0]) if len(rows) > 0 else None
+        else:
+            rows = await self.run(self.query, 'SELECT rowid, {} FROM oneshots WHERE id = ?'.format(ONESHOT_COLUMNS), (int(entry_id),))
+            entry = self.oneshot_from_row(rows[0]) if len(rows) > 0 else None
+
+        for (index_kind, index_guild), autocomplete_index in self.autocomplete_indexes.items():
+            if index_kind != kind:
+                continue
+            if entry is None or not shares_guild(index_guild, entry.get('guild_id')):
+                autocomplete_index.remove(entry_id)
+            else:
+                # Positioned by rowid, the order in which the entries were added, like in the JSON store
+                autocomplete_index.add(entry_id, entry['name'], rows[0]['rowid'])
+        self.notify(kind, entry_id, entry)
+
+    @staticmethod
+    def entry_key(kind: str, entry_id: str) -> Union[str, int, None]:
+        """The primary key of an entry in its table, None if there cannot be such an entry"""
+        if kind == 'campaigns':
+            return entry_id
+        # isdigit() alone also accepts digits int() does not, e.g. '²'
+        return int(entry_id) if entry_id.isascii() and entry_id.isdigit() else None
+
+    async def update_entry(self, kind: str, entry_id: str, values: Dict, expected_version: Optional[int] = None, guild_id: Optional[int] = None) -> bool:
+        """Change fields of an entry and raise its version. Fails if the entry does not exist (for the guild) or if its version is not the expected one,
+        i.e. it was changed since the caller read it. The check and the change are one UPDATE, so nothing can come in between."""
+        key = self.entry_key(kind, entry_id)
+        if key is None:
+            return False
+        assignments = ', '.join('{} = ?'.format(CAMPAIGN_FIELD_COLUMNS.get(field, field) if kind == 'campaigns' else field) for field in values.keys())
+        condition, parameters = guild_filter(guild_id)
+        if expected_version is not None:
+            condition += ' AND version = ?'
+            parameters += (expected_version,)
+        updated = await self.run(self.execute, 'UPDATE {} SET {}, version = version + 1 WHERE id = ? AND {}'.format(kind, assignments, condition), (*values.values(), key, *parameters))
+        if updated == 1:
+            await self.entry_changed(kind, entry_id)
+        return updated == 1
+
+    async def delete_entry(self, kind: str, entry_id: str, expected_version: Optional[int] = None) -> bool:
+        key = self.entry_key(kind, entry_id)
+        if key is None:
+            return False
+        sql = 'DELETE FROM {} WHERE id = ?'.format(kind)
+        parameters = (key,)
+        if expected_version is not None:
+            sql += ' AND version = ?'
+            parameters += (expected_version,)
+        deleted = await self.run(self.execute, sql, parameters)
+        if deleted == 1:
+            await self.entry_changed(kind, entry_id)
+        return deleted == 1
+
+    @staticmethod
+    def campaign_from_row(row: sqlite3.Row) -> Dict:
+        campaign = {
+            'id': row['id'],
+            'name': row['name'],
+            'module': row['module'],
+            'description': row['description'],
+            'creator_id': row['creator_id'],
+            'version': row['version']
+        }
+        # Optional fields are left out until they are set, like in the JSON file
+        for key, column in [('session', 'session'), ('session_ts', 'session_ts'), ('role', 'role'), ('channel', 'channel'), ('extra-notification', 'extra_notification'), ('reminder_lead', 'reminder_lead'), ('guild_id', 'guild_id')]:
+            if row[column] is not None:
+                campaign[key] = row[column]
+        return campaign
+
+    @staticmethod
+    def oneshot_from_row(row: sqlite3.Row) -> Dict:
+        oneshot = {
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'],
+            'creator_id': row['creator_id'],
+            'channel': row['channel'],
+            'time': row['time'],
+            'time_ts': row['time_ts'],
+            'version': row['version']
+        }
+        for column in ['reminder_lead', 'guild_id']:
+            if row[column] is not None:
+                oneshot[column] = row[column]
+        return oneshot
+
+    async def count_entries(self, kind: str, guild_id: Optional[int] = None) -> int:
+        condition, parameters = guild_filter(guild_id)
+        rows = await self.run(self.query, 'SELECT COUNT(*) FROM {} WHERE {}'.format(kind, condition), parameters)
+        return rows[0][0]
+
+    async def list_page(self, kind: str, order: str, cursor: Optional[tuple] = None, forward: bool = True, limit: int = 10, guild_id: Optional[int] = None) -> Tuple[List[Dict], bool]:
+        """Up to limit entries after the cursor (or before it, if not forward), the cursor being the sort key of an entry.
+        Also returns if there are more entries in that direction."""
+        expressions = SORT_EXPRESSIONS[(kind, order)]
+        condition, parameters = guild_filter(guild_id)
+        sql = 'SELECT {} FROM {} WHERE {}'.format(CAMPAIGN_COLUMNS if kind == 'campaigns' else ONESHOT_COLUMNS, kind, condition)
+        if cursor is not None:
+            sql += ' AND ({}) {} ({})'.format(', '.join(expressions), '>' if forward else '<', ', '.join('?' * len(cursor)))
+            parameters += tuple(cursor)
+        # One row more than requested tells if there are more
+        sql += ' ORDER BY {} LIMIT ?'.format(', '.join(expression + ('' if forward else ' DESC') for expression in expressions))
+        rows = await self.run(self.query, sql, parameters + (limit + 1,))
+
+        has_more = len(rows) > limit
+        rows = rows[:limit] if forward else list(reversed(rows[:limit]))
+        from_row = self.campaign_from_row if kind == 'campaigns' else self.oneshot_from_row
+        return [from_row(row) for row in rows], has_more
+
+    async def get_autocomplete_index(self, kind: str, guild_id: Optional[int]) -> AutocompleteIndex:
+        if (kind, guild_id) not in self.autocomplete_indexes:
+            condition, parameters = guild_filter(guild_id)
+            rows = await self.run(self.query, 'SELECT rowid, id, name FROM {} WHERE {}'.format(kind, condition), parameters)
+            autocomplete_index = AutocompleteIndex()
+            autocomplete_index.rebuild({str(row['id']): {'name': row['name']} for row in rows}, {str(row['id']): row['rowid'] for row in rows})
+            self.autocomplete_indexes[(kind, guild_id)] = autocomplete_index
+        return self.autocomplete_indexes[(kind, guild_id)]
+
+    async def fetch_entries(self, kind: str, entry_ids: List[str]) -> List[Dict]:
+        """The entries with the given IDs, in that order"""
+        if len(entry_ids) == 0:
+            return []
+        keys = [self.entry_key(kind, entry_id) for entry_id in entry_ids]
+        rows = await self.run(self.query, 'SELECT {} FROM {} WHERE id IN ({})'.format(CAMPAIGN_COLUMNS if kind == 'campaigns' else ONESHOT_COLUMNS, kind, ', '.join('?' * len(keys))), tuple(keys))
+        from_row = self.campaign_from_row if kind == 'campaigns' else self.oneshot_from_row
+        entries = {str(row['id']): from_row(row) for row in rows}
+        return [entries[entry_id] for entry_id in entry_ids if entry_id in entries]
+
+    async def complete(self, kind: str, prefix: str, limit: int = 25, guild_id: Optional[int] = None) -> List[Dict]:
+        """Entries with an ID, a name or a word in the name that starts with the prefix, for autocompletion"""
+        return await self.fetch_entries(kind, (await self.get_autocomplete_index(kind, guild_id)).complete(prefix, limit))
+
+    async def suggest(self, kind: str, text: str, limit: int = 3, guild_id: Optional[int] = None) -> List[Dict]:
+        """Entries with an ID, a name or a word in the name that is close to the text, for "did you mean" replies"""
+        return await self.fetch_entries(kind, (await self.get_autocomplete_index(kind, guild_id)).suggest(text, limit))
+
+    async def assign_guilds(self, find_guild_id: Callable[[Dict], Optional[int]]) -> int:
+        """Migration for entries saved before they belonged to a guild, find_guild_id gets an entry and returns the ID of its guild if it can be found"""
+        assigned = 0
+        for kind, columns, from_row in [('campaigns', CAMPAIGN_COLUMNS, self.campaign_from_row), ('oneshots', ONESHOT_COLUMNS, self.oneshot_from_row)]:
+            for row in await self.run(self.query, 'SELECT {} FROM {} WHERE guild_id IS NULL'.format(columns, kind)):
+                guild_id = find_guild_id(from_row(row))
+                if guild_id is not None and await self.update_entry(kind, str(row['id']), {'guild_id': guild_id}):
+                    assigned += 1
+        return assigned
+
+    # -------------- #
+    # Reminder-Stuff #
+    # -------------- #
+
+    async def list_sent_reminders(self) -> Dict[str, Dict]:
+        rows = await self.run(self.query, 'SELECT key, due, session FROM sent_reminders')
+        return {row['key']: {'due': row['due'], 'session': row['session']} for row in rows}
+
+    async def mark_reminder_sent(self, key: str, due: int, session: int) -> None:
+        await self.run(self.execute, 'INSERT OR REPLACE INTO sent_reminders (key, due, session) VALUES (?, ?, ?)', (key, due, session))
+
+    async def prune_sent_reminders(self, session_before: float) -> None:
+        """Forgets the reminders of sessions that started before the given time, rows of older versions have only their due time"""
+        await self.run(self.execute, 'DELETE FROM sent_reminders WHERE COALESCE(session, due + ?) < ?', (MAX_REMINDER_LEAD * 60, session_before))
+
+    # -------------- #
+    # Campaign-Stuff #
+    # -------------- #
+
+    async def list_campaigns(self, guild_id: Optional[int] = None) -> Dict:
+        condition, parameters = guild_filter(guild_id)
+        rows = await self.run(self.query, 'SELECT {} FROM campaigns WHERE {} ORDER BY rowid'.format(CAMPAIGN_COLUMNS, condition), parameters)
+        return {row['id']: self.campaign_from_row(row) for row in rows}
+
+    async def add_campaign(self, name: str, creator_id: int, module: str, description: str, campaign_id: str, guild_id: Optional[int] = None) -> bool:
+        inserted = await self.run(self.execute, 'INSERT OR IGNORE INTO campaigns (id, name, name_lower, module, description, creator_id, guild_id) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                                  (campaign_id, name, name.lower(), module, description, creator_id, guild_id))
+        if inserted == 1:
+            await self.entry_changed('campaigns', campaign_id)
+        return inserted == 1
+
+    async def delete_campaign(self, campaign_id: str, expected_version: Optional[int] = None) -> bool:
+        return await self.delete_entry('campaigns', campaign_id, expected_version)
+
+    async def campaign_details(self, identifier: str, guild_id: Optional[int] = None) -> Union[List[Dict], bool]:
+        condition, parameters = guild_filter(guild_id)
+        rows = await self.run(self.query, 'SELECT {} FROM campaigns WHERE id = ? AND {}'.format(CAMPAIGN_COLUMNS, condition), (identifier, *parameters))
+        if len(rows) == 0:
+            rows = await self.run(self.query, 'SELECT {} FROM campaigns WHERE name_lower LIKE ? ESCAPE \'\\\' AND {} ORDER BY rowid'.format(CAMPAIGN_COLUMNS, condition),
+                                  ('%' + escape_like(identifier.lower()) + '%', *parameters))
+        if len(rows) == 0:
+            return False
+        return [self.campaign_from_row(row) for row in rows]
+
+    async def update_campaign_description(self, campaign_id: str, description: str, expected_version: Optional[int] = None) -> bool:
+        return await self.update_entry('campaigns', campaign_id, {'description': description}, expected_version)
+
+    async def update_campaign_session_date(self, campaign_id: str, session_string: str, expected_version: Optional[int] = None) -> bool:
+        return await self.update_entry('campaigns', campaign_id, {'session': session_string, 'session_ts': TimeHelper.to_epoch(session_string)}, expected_version)
+
+    async def update_campaign_role(self, campaign_id: str, role_id: int, expected_version: Optional[int] = None) -> bool:
+        return await self.update_entry('campaigns', campaign_id, {'role': role_id}, expected_version)
+
+    async def campaign_change_channel(self, campaign_id: str, channel: int, expected_version: Optional[int] = None) -> bool:
+        return await self.update_entry('campaigns', campaign_id, {'channel': channel}, expected_version)
+
+    async def update_extra_campaign_notification(self, campaign_id: str, status: str, expected_version: Optional[int] = None) -> bool:
+        return await self.update_entry('campaigns', campaign_id, {'extra-notification': status}, expected_version)
+
+    async def update_campaign_reminder_lead(self, campaign_id: str, minutes: int, expected_version: Optional[int] = None) -> bool:
+        return await self.update_entry('campaigns', campaign_id, {'reminder_lead': minutes}, expected_version)
+
+    # ------------- #
+    # Oneshot-Stuff #
+    # ------------- #
+
+    def insert_oneshot(self, name: str, creator_id: int, description: str, time: str, channel: Optional[int], guild_id: Optional[int]) -> int:
+        with self.connection:
+            # Incrementing first takes the write lock, so another process can not read the same ID in between
+            self.connection.execute('UPDATE meta SET value = value + 1 WHERE key = \'last_oneshot_id\'')
+            oneshot_id = self.connection.execute('SELECT value FROM meta WHERE key = \'last_oneshot_id\'').fetchone()[0]
+            self.connection.execute('INSERT INTO oneshots (id, name, name_lower, description, creator_id, channel, time, time_ts, guild_id) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                                    (oneshot_id, name, name.lower(), description, creator_id, channel, time, TimeHelper.to_epoch(time), guild_id))
+        self.write_count += 1
+        return oneshot_id
+
+    async def add_oneshot(self, name: str, creator: Member, description: str, time: str, channel: Optional[int], guild_id: Optional[int] = None) -> int:
+        oneshot_id = await self.run(self.insert_oneshot, name, creator.id, description, time, channel, guild_id)
+        await self.entry_changed('oneshots', str(oneshot_id))
+        return oneshot_id
+
+    async def delete_oneshot(self, oneshot_id: str, expected_version: Optional[int] = None) -> bool:
+        return await self.delete_entry('oneshots', oneshot_id, expected_version)
+
+    async def list_oneshots(self, guild_id: Optional[int] = None) -> Dict:
+        condition, parameters = guild_filter(guild_id)
+        rows = await self.run(self.query, 'SELECT {} FROM oneshots WHERE {} ORDER BY id'.format(ONESHOT_COLUMNS, condition), parameters)
+        return {str(row['id']): self.oneshot_from_row(row) for row in rows}
+
+    async def oneshot_details(self, identifier: str, guild_id: Optional[int] = None) -> Union[List[Dict], bool]:
+        condition, parameters = guild_filter(guild_id)
+        rows = []
+        key = self.entry_key('oneshots', identifier)
+        if key is not None:
+            rows = await self.run(self.query, 'SELECT {} FROM oneshots WHERE id = ? AND {}'.format(ONESHOT_COLUMNS, condition), (key, *parameters))
+        if len(rows) == 0:
+            rows = await self.run(self.query, 'SELECT {} FROM oneshots WHERE name_lower LIKE ? ESCAPE \'\\\' AND {} ORDER BY id'.format(ONESHOT_COLUMNS, condition),
+                                  ('%' + escape_like(identifier.lower()) + '%', *parameters))
+        if len(rows) == 0:
+            return False
+        return [self.oneshot_from_row(row) for row in rows]
+
+    async def update_oneshot_description(self, oneshot_id: str, description: str, guild_id: Optional[int] = None, expected_version: Optional[int] = None) -> bool:
+        return await self.update_entry('oneshots', oneshot_id, {'description': description}, expected_version, guild_id)
+
+    async def oneshot_change_time(self, oneshot_id: str, time: str, guild_id: Optional[int] = None, expected_version: Optional[int] = None) -> bool:
+        return await self.update_entry('oneshots', oneshot_id, {'time': time, 'time_ts': TimeHelper.to_epoch(time)}, expected_version, guild_id)
+
+    async def oneshot_change_channel(self, oneshot_id: str, channel: int, guild_id: Optional[int] = None, expected_version: Optional[int] = None) -> bool:
+        return await self.update_entry('oneshots', oneshot_id, {'channel': channel}, expected_version, guild_id)
+
+    async def oneshot_change_reminder_lead(self, oneshot_id: str, minutes: int, guild_id: Optional[int] = None, expected_version: Optional[int] = None) -> bool:
+        return await self.update_entry('oneshots', oneshot_id, {'reminder_lead': minutes}, expected_version, guild_id)
+
+    # ------------ #
+    # Import-Stuff #
+    # ------------ #
+
+    def import_data(self, data: Dict) -> None:
+        with self.connection:
+            for campaign in data.get('campaigns', {}).values():
+                self.connection.execute('INSERT OR REPLACE INTO campaigns ({}, name_lower) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'.format(CAMPAIGN_COLUMNS), (
+                    str(campaign['id']), campaign['name'], campaign.get('module'), campaign.get('description'), campaign.get('creator_id'), campaign.get('session'),
+                    TimeHelper.to_epoch(str(campaign['session'])) if 'session' in campaign else None, campaign.get('role'), campaign.get('channel'),
+                    campaign.get('extra-notification'), campaign.get('reminder_lead'), campaign.get('guild_id'), campaign.get('version', 0),
+                    campaign['name'].lower()))
+            for oneshot in data.get('oneshots', {}).values():
+                self.connection.execute('INSERT OR REPLACE INTO oneshots ({}, name_lower) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'.format(ONESHOT_COLUMNS), (
+                    int(oneshot['id']), oneshot['name'], oneshot.get('description'), oneshot.get('creator_id'), oneshot.get('channel'), oneshot.get('time'), TimeHelper.to_epoch(str(oneshot.get('time'))), oneshot.get('reminder_lead'), oneshot.get('guild_id'),
+                    oneshot.get('version', 0), oneshot['name'].lower()))
+            for key, sent in data.get('sent_reminders', {}).items():
+                self.connection.execute('INSERT OR REPLACE INTO sent_reminders (key, due, session) VALUES (?, ?, ?)', (key, sent['due'] if isinstance(sent, dict) else sent, sent_session(sent)))
+            self.connection.execute('UPDATE meta SET value = MAX(value, ?) WHERE key = \'last_oneshot_id\'', (data.get('last_oneshot_id', 0),))
+        self.write_count += 1
+
+    def import_json(self, json_path: str) -> None:
+        """One-time import of an existing db.json, entries that already exist are overwritten"""
+        with open(json_path, 'r') as json_file:
+            data = json.load(json_file)
+        self.executor.submit(self.import_data, data).result()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Usage: python sqlite_database.py <path-to-db.json> <path-to-db.sqlite3>')
+        sys.exit(1)
+    load_dotenv()
+    SqliteDatabase(sys.argv[2]).import_json(sys.argv[1])
@@ -0,0 +1,229 @@
+import asyncio
+import json
+from copy import deepcopy
+from os import getenv, stat, replace, fsync
+from os.path import exists
+from typing import Dict, List, Optional, Tuple
+
+import ActionType
+from AuditLog import audit_log
+from Metrics import metrics
+
+EMPTY_DATABASE = {
+    "campaigns": {},
+    "last_oneshot_id": 0,
+    "oneshots": {},
+    "sent_reminders": {}
+}
+# Key of the snapshot that holds the sequence number of the last journaled change it contains
+JOURNAL_SEQUENCE_KEY = 'journal_sequence'
+
+
+def apply_change(data: Dict, change: Dict) -> None:
+    """Apply a single recorded change ({'op': 'set'|'update'|'delete', 'path': [...], 'value': ...}) to the data.
+    Changes to entries that do not exist are skipped instead of failing the whole load."""
+    target = data
+    for key in change['path'][:-1]:
+        target = target.get(key)
+        if target is None:
+            return
+
+    if change['op'] == 'set':
+        target[change['path'][-1]] = change['value']
+    elif change['op'] == 'update':
+        if change['path'][-1] in target:
+            target[change['path'][-1]].update(change['value'])
+    elif change['op'] == 'delete':
+        target.pop(change['path'][-1], None)
+
+
+class JsonStorage:
+    """Keeps the whole database in a single JSON file, which is rewritten in the background after changes"""
+
+    def __init__(self, filepath: str) -> None:
+        self.filepath = filepath
+        self.flush_delay = float(getenv('DB_FLUSH_DELAY', '2'))
+        self.file_signature: Optional[Tuple] = None
+        self.load_count = 0
+        self.write_count = 0
+        self.dirty = False
+        self.flush_task: Optional[asyncio.Task] = None
+        self.flush_lock = asyncio.Lock()
+
+    def get_file_signature(self) -> Optional[Tuple]:
+        """Modification time and size of the database file, used to detect changes made outside the bot"""
+        try:
+            file_stat = stat(self.filepath)
+        except FileNotFoundError:
+            return None
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+    def load(self) -> Dict:
+        if not exists(self.filepath):
+            self.write_snapshot(EMPTY_DATABASE)
+
+        with open(self.filepath, 'r') as db_file:
+            data = json.load(db_file)
+        # Files written by older versions lack the newer top level keys
+        for key, value in EMPTY_DATABASE.items():
+            data.setdefault(key, deepcopy(value))
+        self.file_signature = self.get_file_signature()
+        self.load_count += 1
+        return data
+
+    def changed_on_disk(self) -> bool:
+        if self.dirty or self.flush_lock.locked():
+            # Unsaved changes in memory are newer than anything on disk
+            return False
+        return self.get_file_signature() != self.file_signature
+
+    def record(self, data: Dict, change: Dict) -> None:
+        """Mark the data as changed, it gets written to disk in the background after DB_FLUSH_DELAY seconds"""
+        self.dirty = True
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self.flush_later(data))
+
+    async def flush_later(self, data: Dict) -> None:
+        while self.dirty:
+            await asyncio.sleep(self.flush_delay)
+            try:
+                await self.flush(data)
+            except Exception:
+                # Logged by flush, the changes are still marked as dirty and the next round retries them
+                pass
+
+    async def flush(self, data: Dict) -> None:
+        """Write pending changes to disk right away, e.g. on shutdown"""
+        async with self.flush_lock:
+            if not self.dirty:
+                return
+            self.dirty = False
+            try:
+                with metrics.time_store('write'):
+                    await self.write_pending(data)
+            except Exception as error:
+                # E.g. a full disk, nothing was written, so everything is still to be written
+                self.dirty = True
+                audit_log.log(ActionType.STORE_WRITE_FAILED, {'file': self.filepath, 'error': error})
+                raise
+
+    async def write_pending(self, data: Dict) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self.write_snapshot, self.snapshot(data))
+
+    @staticmethod
+    def snapshot(data: Dict) -> Dict:
+        """Copy of the data that can be serialized in another thread while the event loop keeps changing the original"""
+        return {key: {entry_id: dict(entry) if isinstance(entry, dict) else entry for entry_id, entry in value.items()} if isinstance(value, dict) else value for key, value in data.items()}
+
+    def write_snapshot(self, data: Dict) -> None:
+        temp_path = self.filepath + '.tmp'
+        with open(temp_path, 'w') as db_file:
+            json.dump(data, db_file, indent=4)
+            db_file.flush()
+            fsync(db_file.fileno())
+        replace(temp_path, self.filepath)
+        self.file_signature = self.get_file_signature()
+        self.write_count += 1
+
+
+class JournalStorage(JsonStorage):
+    """Appends every change as a JSON line to a journal next to the JSON file, which serves as the snapshot.
+    Once the journal grows past DB_JOURNAL_MAX_SIZE bytes it is folded into the snapshot.
+    Changes are numbered and the snapshot stores the number of the last one it contains, so that a journal that was not truncated
+    after the snapshot was written, e.g. because of a crash in between, is not replayed on top of it."""
+
+    def __init__(self, filepath: str) -> None:
+        super().__init__(filepath)
+        self.journal_path = filepath + '.journal'
+        self.max_journal_size = int(getenv('DB_JOURNAL_MAX_SIZE', str(1024 * 1024)))
+        self.pending: List[Dict] = []
+        self.sequence = 0
+        self.compaction_count = 0
+
+    def get_file_signature(self) -> Optional[Tuple]:
+        snapshot_signature = super().get_file_signature()
+        try:
+            journal_stat = stat(self.journal_path)
+        except FileNotFoundError:
+            return snapshot_signature
+        return snapshot_signature, journal_stat.st_mtime_ns, journal_stat.st_size
+
+    def get_journal_size(self) -> int:
+        try:
+            return stat(self.journal_path).st_size
+        except FileNotFoundError:
+            return 0
+
+    def load(self) -> Dict:
+        data = super().load()
+        snapshot_sequence = data.pop(JOURNAL_SEQUENCE_KEY, 0)
+        self.sequence = max(self.sequence, snapshot_sequence)
+        if not exists(self.journal_path):
+            return data
+
+        with open(self.journal_path, 'r') as journal_file:
+            for line in journal_file:
+                try:
+                    change = json.loads(line)
+                except ValueError:
+                    # A partially written last line, e.g. after a crash
+                    break
+                # Changes journaled by older versions have no number
+                if 'seq' in change:
+                    if change['seq'] <= snapshot_sequence:
+                        continue
+                    self.sequence = max(self.sequence, change['seq'])
+                apply_change(data, change)
+        return data
+
+    def record(self, data: Dict, change: Dict) -> None:
+        self.sequence += 1
+        self.pending.append(dict(change, seq=self.sequence))
+        super().record(data, change)
+
+    async def write_pending(self, data: Dict) -> None:
+        changes = self.pending
+        self.pending = []
+        loop = asyncio.get_running_loop()
+        if len(changes) > 0:
+            try:
+                await loop.run_in_executor(None, self.append_to_journal, changes)
+            except Exception:
+                # Changes recorded during the append come after these, the journal has to keep that order
+                self.pending = changes + self.pending
+                raise
+
+        if self.get_journal_size() >= self.max_journal_size:
+            # The snapshot already contains the changes recorded during the append, so they must not be appended to the new journal.
+            # Nothing is awaited between taking the snapshot and dropping them.
+            snapshot, folded = self.snapshot(data), self.pending
+            snapshot[JOURNAL_SEQUENCE_KEY] = self.sequence
+            self.pending = []
+            try:
+                await loop.run_in_executor(None, self.compact, snapshot)
+            except Exception:
+                self.pending = folded + self.pending
+                raise
+
+    def append_to_journal(self, changes: List[Dict]) -> None:
+        with open(self.journal_path, 'a') as journal_file:
+            journal_file.write(''.join(json.dumps(change) + '\n' for change in changes))
+            journal_file.flush()
+            fsync(journal_file.fileno())
+        self.file_signature = self.get_file_signature()
+        self.write_count += 1
+
+    def compact(self, data: Dict) -> None:
+        """Write the current state as the new snapshot and start with an empty journal"""
+        self.write_snapshot(data)
+        with open(self.journal_path, 'w'):
+            pass
+        self.file_signature = self.get_file_signature()
+        self.compaction_count += 1
+
+
+def create_storage(filepath: str) -> JsonStorage:
+    storage_type = getenv('DB_STORAGE', 'json')
+    if storage_type == 'journal':
+        return JournalStorage(filepath)
+    return JsonStorage(filepath)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+# The bot's modules live at the top of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Keep the audit log of the tests out of the working directory and the test output
+os.environ['AUDIT_LOG_FILE'] = ''
+os.environ['AUDIT_LOG_CONSOLE'] = 'false'
+
+
+@pytest.fixture
+def db_env(tmp_path, monkeypatch):
+    """Points DB_FILE and SQLITE_FILE into a fresh directory, returns a function that sets the storage and returns the path of its file"""
+    def configure(storage: str = 'json', flush_delay: float = 3600) -> str:
+        monkeypatch.setenv('DB_STORAGE', storage)
+        monkeypatch.setenv('DB_FILE', str(tmp_path / 'db.json'))
+        monkeypatch.setenv('SQLITE_FILE', str(tmp_path / 'db.sqlite3'))
+        file_path = str(tmp_path / ('db.sqlite3' if storage == 'sqlite' else 'db.json'))
+        monkeypatch.setenv('DB_FLUSH_DELAY', str(flush_delay))
+        return file_path
+    return configure
@@ -0,0 +1,114 @@
+"""Stand-ins for the discord.py objects the bot talks to, so its code paths can run without a connection to Discord."""
+import asyncio
+from itertools import count
+from typing import Dict, List, Optional
+
+message_ids = count(1)
+
+
+class FakeMessage:
+    def __init__(self, channel: 'FakeTextChannel', kwargs: Dict) -> None:
+        self.id = next(message_ids)
+        self.channel = channel
+        self.content = kwargs.get('content')
+        self.embed = kwargs.get('embed')
+
+    async def edit(self, **kwargs) -> None:
+        pass
+
+
+class FakeRole:
+    def __init__(self, guild: 'FakeGuild', role_id: int, name: str, position: int = 0) -> None:
+        self.guild = guild
+        self.id = role_id
+        self.name = name
+        self.position = position
+
+
+class FakeTextChannel:
+    """Counts what is sent to it, each send takes the latency in seconds like a round trip to Discord would"""
+
+    def __init__(self, guild: 'FakeGuild', channel_id: int, name: str, latency: float = 0, position: int = 0) -> None:
+        self.guild = guild
+        self.id = channel_id
+        self.name = name
+        self.latency = latency
+        self.position = position
+        self.sent = 0
+
+    async def send(self, **kwargs) -> FakeMessage:
+        if self.latency > 0:
+            await asyncio.sleep(self.latency)
+        self.sent += 1
+        return FakeMessage(self, kwargs)
+
+
+class FakeUser:
+    """The creator of an entry, the stores only need its ID"""
+
+    def __init__(self, user_id: int) -> None:
+        self.id = user_id
+
+
+class FakeMember:
+    def __init__(self, guild: 'FakeGuild', member_id: int, roles: List[FakeRole]) -> None:
+        self.guild = guild
+        self.id = member_id
+        self.display_name = 'member-{}'.format(member_id)
+        self.roles = roles
+
+
+class FakeContext:
+    """A command invoked by the member in the channel, replies go to the channel"""
+
+    def __init__(self, author: FakeMember, channel: FakeTextChannel) -> None:
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+
+    async def send(self, **kwargs) -> FakeMessage:
+        return await self.channel.send(**kwargs)
+
+
+class FakeGuild:
+    def __init__(self, guild_id: int, role_count: int = 10, channel_count: int = 10, member_count: int = 0, send_latency: float = 0) -> None:
+        self.id = guild_id
+        # IDs are unique across guilds, like Discord's snowflakes
+        self.roles: List[FakeRole] = [FakeRole(self, guild_id * 100_000 + i, 'role-{}'.format(i), i) for i in range(role_count)]
+        self.text_channels: List[FakeTextChannel] = [FakeTextChannel(self, guild_id * 100_000 + 50_000 + i, 'channel-{}'.format(i), send_latency, i) for i in range(channel_count)]
+        # Every member has the first role, which can be used as the role that unlocks the gated subcommands
+        self.members: Dict[int, FakeMember] = {guild_id * 100_000 + 80_000 + i: FakeMember(self, guild_id * 100_000 + 80_000 + i, self.roles[:1]) for i in range(member_count)}
+        self.roles_by_id = {role.id: role for role in self.roles}
+        self.channels_by_id = {channel.id: channel for channel in self.text_channels}
+
+    def get_role(self, role_id: int) -> Optional[FakeRole]:
+        return self.roles_by_id.get(role_id)
+
+    def get_channel(self, channel_id: int) -> Optional[FakeTextChannel]:
+        return self.channels_by_id.get(channel_id)
+
+    def get_member(self, member_id: int) -> Optional[FakeMember]:
+        return self.members.get(member_id)
+
+
+class FakeClient:
+    def __init__(self, guilds: List[FakeGuild]) -> None:
+        self.guilds = guilds
+        self.guilds_by_id = {guild.id: guild for guild in guilds}
+        self.channels_by_id = {channel.id: channel for guild in guilds for channel in guild.text_channels}
+
+    def get_guild(self, guild_id: int) -> Optional[FakeGuild]:
+        return self.guilds_by_id.get(guild_id)
+
+    def get_channel(self, channel_id: int) -> Optional[FakeTextChannel]:
+        return self.channels_by_id.get(channel_id)
+
+
+class FakeClock:
+    """A clock for the reminder scheduler that only moves when the test sets it"""
+
+    def __init__(self, now: float) -> None:
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
@@ -0,0 +1,34 @@
+import json
+import os
+import subprocess
+import sys
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Stands in for load_dotenv, as if the .env file held these settings, and prints what the modules of main.py were configured with
+IMPORT_MAIN = '''
+import json
+import os
+import dotenv
+
+dotenv.load_dotenv = lambda *args, **kwargs: os.environ.update(SEND_CONCURRENCY='2', SEND_MAX_RETRIES='7', CAMPAIGN_ROLES='11,12', ONESHOT_ROLES='13',
+                                                               AUDIT_LOG_MAX_BYTES='1234', AUDIT_LOG_BACKUPS='3', RENDER_CACHE_SIZE='5', RENDER_CACHE_MAX_BYTES='4321')
+import main
+print(json.dumps({
+    'concurrency': main.dispatcher.semaphore._value,
+    'retries': main.dispatcher.max_retries,
+    'campaign_roles': sorted(main.campaign_router.gated_roles),
+    'oneshot_roles': sorted(main.oneshot_router.gated_roles),
+    'audit_log': [main.audit_log.max_bytes, main.audit_log.backups],
+    'render_cache': [main.render_cache.max_entries, main.render_cache.max_bytes]
+}))
+'''
+
+
+def test_settings_from_the_env_file_reach_the_modules_of_main(tmp_path):
+    environment = dict(os.environ, DB_STORAGE='json', DB_FILE=str(tmp_path / 'db.json'), METRICS_PORT='')
+    for variable in ['SEND_CONCURRENCY', 'SEND_MAX_RETRIES', 'CAMPAIGN_ROLES', 'ONESHOT_ROLES', 'AUDIT_LOG_MAX_BYTES', 'AUDIT_LOG_BACKUPS', 'RENDER_CACHE_SIZE', 'RENDER_CACHE_MAX_BYTES']:
+        environment.pop(variable, None)
+    output = subprocess.run([sys.executable, '-c', IMPORT_MAIN], cwd=REPOSITORY, env=environment, capture_output=True, text=True, check=True).stdout
+
+    assert json.loads(output.splitlines()[-1]) == {'concurrency': 2, 'retries': 7, 'campaign_roles': [11, 12], 'oneshot_roles': [13], 'audit_log': [1234, 3], 'render_cache': [5, 4321]}
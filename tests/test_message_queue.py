@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+from discord import HTTPException
+
+from MessageQueue import MessageDispatcher
+from tests.fakes import FakeGuild, FakeTextChannel
+
+
+class FakeResponse:
+    def __init__(self, status: int) -> None:
+        self.status = status
+        self.reason = 'Server Error'
+        self.headers = {}
+
+
+class TrackingTextChannel(FakeTextChannel):
+    """Remembers how many sends were in progress at once, and fails the given number of sends with a server error"""
+
+    in_flight = 0
+    max_in_flight = 0
+
+    def __init__(self, guild: FakeGuild, channel_id: int, failures: int = 0) -> None:
+        super().__init__(guild, channel_id, 'tracking', latency=0.01)
+        self.failures = failures
+
+    async def send(self, **kwargs):
+        TrackingTextChannel.in_flight += 1
+        TrackingTextChannel.max_in_flight = max(TrackingTextChannel.max_in_flight, TrackingTextChannel.in_flight)
+        try:
+            if self.failures > 0:
+                self.failures -= 1
+                raise HTTPException(FakeResponse(500), 'Internal Server Error')
+            return await super().send(**kwargs)
+        finally:
+            TrackingTextChannel.in_flight -= 1
+
+
+def test_concurrency_and_retries_follow_the_configuration(monkeypatch):
+    monkeypatch.setenv('SEND_CONCURRENCY', '2')
+    monkeypatch.setenv('SEND_MAX_RETRIES', '1')
+    dispatcher = MessageDispatcher()
+    dispatcher.base_delay = 0
+    monkeypatch.setattr(TrackingTextChannel, 'max_in_flight', 0)
+    guild = FakeGuild(1)
+    channels = [TrackingTextChannel(guild, i) for i in range(6)]
+    failing = TrackingTextChannel(guild, 10, failures=2)
+    recovering = TrackingTextChannel(guild, 11, failures=1)
+
+    async def scenario() -> None:
+        await asyncio.gather(*[dispatcher.send(channel, content='Hello') for channel in channels])
+        assert TrackingTextChannel.max_in_flight == 2
+
+        await dispatcher.send(recovering, content='Hello')
+        with pytest.raises(HTTPException):
+            await dispatcher.send(failing, content='Hello')
+        assert (recovering.sent, failing.sent, dispatcher.retry_count, dispatcher.failed_count) == (1, 0, 2, 1)
+
+    asyncio.run(scenario())
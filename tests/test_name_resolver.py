@@ -0,0 +1,99 @@
+import random
+
+import NameResolver as NameResolverModule
+from NameResolver import NameResolver
+from tests.fakes import FakeGuild, FakeRole, FakeTextChannel
+
+
+def scan_roles(guild: FakeGuild, name: str):
+    """The lookup the commands did before the resolver, guild.roles is sorted by position and ID"""
+    for role in sorted(guild.roles, key=lambda role: (role.position, role.id)):
+        if role.name.lower() == name.lower():
+            return role
+    return None
+
+
+def scan_channels(guild: FakeGuild, name: str):
+    for channel in sorted(guild.text_channels, key=lambda channel: (channel.position, channel.id)):
+        if channel.name == name:
+            return channel
+    return None
+
+
+def create_role(guild: FakeGuild, role_id: int, name: str, position: int) -> FakeRole:
+    role = FakeRole(guild, role_id, name, position)
+    guild.roles.append(role)
+    guild.roles_by_id[role_id] = role
+    return role
+
+
+def delete_role(guild: FakeGuild, role: FakeRole) -> None:
+    guild.roles.remove(role)
+    del guild.roles_by_id[role.id]
+
+
+def test_roles_resolve_like_a_scan_of_the_guild():
+    rng = random.Random(3)
+    guild = FakeGuild(1, role_count=5000)
+    # Some names that several roles share, in different cases
+    for role in rng.sample(guild.roles, 500):
+        role.name = rng.choice(['Players', 'players', 'GM', 'Strahd'])
+    resolver = NameResolver()
+    names = ['role-0', 'ROLE-4999', 'role-2500', 'players', 'gm', 'strahd', 'nobody', 'Renamed', 'role-5001']
+
+    for name in names:
+        assert resolver.find_role(guild, name) is scan_roles(guild, name), name
+    assert resolver.stats() == {'guilds': 1, 'roles': 5000, 'channels': 0}
+
+    for step in range(100):
+        action = rng.random()
+        if action < 0.4:
+            role = rng.choice(guild.roles)
+            role.name = rng.choice(['Players', 'GM', 'Renamed', 'role-{}'.format(rng.randint(0, 5000))])
+            resolver.role_changed(role)
+        elif action < 0.7:
+            role = rng.choice(guild.roles)
+            delete_role(guild, role)
+            resolver.role_deleted(role)
+        else:
+            # Created roles come first or in between as often as last, e.g. when moved above the others
+            role = create_role(guild, 1_000_000 + step, rng.choice(['players', 'Strahd', 'role-5001']), rng.randint(0, 5000))
+            resolver.role_changed(role)
+        for name in names:
+            assert resolver.find_role(guild, name) is scan_roles(guild, name), (step, name)
+
+    # Roles that vanished without an event are skipped
+    role = scan_roles(guild, 'players')
+    del guild.roles_by_id[role.id]
+    guild.roles.remove(role)
+    assert resolver.find_role(guild, 'players') is scan_roles(guild, 'players')
+
+
+def test_channels_resolve_like_a_scan_of_the_guild(monkeypatch):
+    # Only text channels are indexed, the fake ones count as such here
+    monkeypatch.setattr(NameResolverModule, 'TextChannel', FakeTextChannel)
+    guild = FakeGuild(1, channel_count=2000)
+    resolver = NameResolver()
+
+    assert resolver.find_channel(guild, 'channel-1999') is guild.text_channels[1999]
+    # Channel names match exactly
+    assert resolver.find_channel(guild, 'Channel-1') is None
+
+    duplicate = FakeTextChannel(guild, 9_999_999, 'channel-5', position=0)
+    guild.text_channels.append(duplicate)
+    guild.channels_by_id[duplicate.id] = duplicate
+    resolver.channel_changed(duplicate)
+    # Listed before the older channel of that name, because of its position
+    assert scan_channels(guild, 'channel-5') is duplicate
+    assert resolver.find_channel(guild, 'channel-5') is duplicate
+
+    guild.text_channels[5].name = 'sessions'
+    resolver.channel_changed(guild.text_channels[5])
+    assert resolver.find_channel(guild, 'sessions') is guild.text_channels[5]
+    assert resolver.find_channel(guild, 'channel-5') is duplicate
+
+    resolver.channel_deleted(duplicate)
+    assert resolver.find_channel(guild, 'channel-5') is None
+
+    resolver.forget_guild(guild.id)
+    assert resolver.stats() == {'guilds': 0, 'roles': 0, 'channels': 0}
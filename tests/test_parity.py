@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+from typing import Callable, Dict, List
+
+from database import create_database, sort_key
+from sqlite_database import SqliteDatabase
+from tests.fakes import FakeUser
+
+STORAGES = ['json', 'journal', 'sqlite']
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def normalize(result):
+    """Entries as all stores return them, entries of the JSON store only have a version after their first change"""
+    if isinstance(result, dict) and 'id' in result and 'name' in result:
+        return dict(result, version=result.get('version', 0))
+    if isinstance(result, dict):
+        # Lists of entries by their ID, compared in their order as well
+        return [(key, normalize(value)) for key, value in result.items()]
+    if isinstance(result, (list, tuple)):
+        return [normalize(item) for item in result]
+    return result
+
+
+def run_scenario(storage: str, directory, monkeypatch, scenario: Callable) -> List:
+    """Runs the scenario against a fresh store and returns everything it recorded"""
+    directory.mkdir()
+    monkeypatch.setenv('DB_STORAGE', storage)
+    monkeypatch.setenv('DB_FILE', str(directory / 'db.json'))
+    monkeypatch.setenv('SQLITE_FILE', str(directory / 'db.sqlite3'))
+    monkeypatch.setenv('DB_FLUSH_DELAY', '3600')
+
+    async def run() -> List:
+        db = create_database()
+        results = []
+
+        try:
+            await scenario(db, lambda result: results.append(normalize(result)))
+            await db.flush()
+        finally:
+            if storage == 'sqlite':
+                db.executor.submit(db.connection.close).result()
+        return results
+    return asyncio.run(run())
+
+
+def assert_same_results(tmp_path, monkeypatch, scenario: Callable) -> None:
+    results: Dict[str, List] = {storage: run_scenario(storage, tmp_path / storage, monkeypatch, scenario) for storage in STORAGES}
+    for storage in STORAGES[1:]:
+        assert results[storage] == results['json'], storage
+
+
+async def add_mixed_campaigns(db) -> None:
+    """Campaigns of two guilds and some from before entries belonged to a guild, added interleaved"""
+    for i, guild_id in enumerate([10, None, 20, 10, None, 20, 10]):
+        await db.add_campaign('Alpha {}'.format(i), 1, 'Homebrew', 'Campaign {}'.format(i), 'c{}'.format(i), guild_id=guild_id)
+
+
+def test_campaign_details(tmp_path, monkeypatch):
+    async def scenario(db, record) -> None:
+        await add_mixed_campaigns(db)
+        for guild_id in [None, 10, 20, 30]:
+            record(await db.campaign_details('alpha', guild_id=guild_id))
+            record(await db.campaign_details('c3', guild_id=guild_id))
+        record(await db.campaign_details('c2', guild_id=10))
+        record(await db.campaign_details('nothing', guild_id=10))
+        record(await db.campaign_details('al', guild_id=20))
+
+    assert_same_results(tmp_path, monkeypatch, scenario)
+
+
+def test_details_after_moving_entries(tmp_path, monkeypatch):
+    async def scenario(db, record) -> None:
+        await add_mixed_campaigns(db)
+        # Searched once before the migration, so that the guild's indexes exist when the entries move
+        record(await db.campaign_details('alpha', guild_id=20))
+        record(await db.complete('campaigns', 'alpha', 25, guild_id=20))
+        record(await db.assign_guilds(lambda entry: 20 if entry['id'] == 'c1' else None))
+        await db.add_campaign('Alpha 7', 1, 'Homebrew', 'Campaign 7', 'c7', guild_id=20)
+        record(await db.campaign_details('alpha', guild_id=20))
+        record(await db.complete('campaigns', 'alpha', 25, guild_id=20))
+        record(await db.campaign_details('alpha', guild_id=10))
+        record(await db.list_campaigns(20))
+
+    assert_same_results(tmp_path, monkeypatch, scenario)
+
+
+def test_oneshots(tmp_path, monkeypatch):
+    async def scenario(db, record) -> None:
+        for i, guild_id in enumerate([10, None, 20, 10]):
+            record(await db.add_oneshot('Shot {}'.format(i), FakeUser(i), 'Oneshot {}'.format(i), '2030-01-0{} 5:00pm'.format(i + 1), 100 + i, guild_id=guild_id))
+        record(await db.oneshot_details('shot', guild_id=10))
+        record(await db.oneshot_details('3', guild_id=10))
+        record(await db.oneshot_details('3', guild_id=20))
+        # Digits that are not ASCII are searched as names, int() does not even accept some of them
+        for identifier in ['²', '١', '٣']:
+            record(await db.oneshot_details(identifier, guild_id=10))
+            record(await db.oneshot_change_channel(identifier, 8, guild_id=10))
+        record(await db.oneshot_change_channel('3', 7, guild_id=10))
+        record(await db.oneshot_change_channel('3', 7, guild_id=20))
+        record(await db.delete_oneshot('2'))
+        record(await db.add_oneshot('Shot 4', FakeUser(4), 'Oneshot 4', '2030-01-05 5:00pm', 104, guild_id=10))
+        record(await db.list_oneshots(10))
+        record(await db.list_oneshots())
+        record(await db.count_entries('oneshots', 10))
+
+    assert_same_results(tmp_path, monkeypatch, scenario)
+
+
+def test_list_pages(tmp_path, monkeypatch):
+    async def scenario(db, record) -> None:
+        await add_mixed_campaigns(db)
+        await db.update_campaign_session_date('c4', '2030-01-02 5:00pm')
+        await db.update_campaign_session_date('c0', '2030-01-01 5:00pm')
+        for guild_id in [None, 10]:
+            record(await db.count_entries('campaigns', guild_id))
+            for order in ['id', 'name', 'session']:
+                page, has_more = await db.list_page('campaigns', order, limit=2, guild_id=guild_id)
+                record((page, has_more))
+                record(await db.list_page('campaigns', order, cursor=sort_key(order, page[-1]), limit=2, guild_id=guild_id))
+                record(await db.list_page('campaigns', order, cursor=sort_key(order, page[-1]), forward=False, limit=2, guild_id=guild_id))
+
+    assert_same_results(tmp_path, monkeypatch, scenario)
+
+
+def test_versions(tmp_path, monkeypatch):
+    async def scenario(db, record) -> None:
+        await add_mixed_campaigns(db)
+        record(await db.update_campaign_description('c0', 'First', expected_version=0))
+        record(await db.update_campaign_description('c0', 'Stale', expected_version=0))
+        record(await db.update_campaign_reminder_lead('c0', 30))
+        record(await db.campaign_details('c0'))
+        record(await db.delete_campaign('c0', expected_version=1))
+        record(await db.delete_campaign('c0', expected_version=2))
+        record(await db.update_campaign_description('c0', 'Gone'))
+        record(await db.campaign_details('c0'))
+
+    assert_same_results(tmp_path, monkeypatch, scenario)
+
+
+def test_autocomplete(tmp_path, monkeypatch):
+    async def scenario(db, record) -> None:
+        for i, name in enumerate(['Curse of Strahd', 'Lost Mine', 'Storm King', 'Curse of the Crown', 'Strahd Returns']):
+            await db.add_campaign(name, 1, 'Homebrew', '', 'k{}'.format(i), guild_id=10 if i % 2 == 0 else None)
+        for prefix in ['c', 'cur', 'str', 'k', 'x']:
+            record(await db.complete('campaigns', prefix, 3, guild_id=10))
+            record(await db.complete('campaigns', prefix, 25))
+        for text in ['strahf', 'curce', 'kign', 'zzzz']:
+            record(await db.suggest('campaigns', text, 3, guild_id=10))
+        await db.delete_campaign('k0')
+        record(await db.complete('campaigns', 'cur', 25, guild_id=10))
+
+    assert_same_results(tmp_path, monkeypatch, scenario)
+
+
+
+def test_json_file_is_imported_into_its_own_sqlite_file(db_env):
+    # Configured the way the bot ran before switching, DB_FILE still names the JSON file
+    json_path = db_env('json')
+    sqlite_path = str(json_path).replace('db.json', 'migrated.sqlite3')
+
+    async def fill() -> Dict:
+        db = create_database()
+        await db.add_campaign('Campaign', 1, 'Homebrew', 'Description', 'c1', guild_id=10)
+        await db.add_oneshot('Shot', FakeUser(1), 'Oneshot', '2030-01-01 5:00pm', 100, guild_id=10)
+        await db.flush()
+        return db.data
+
+    data = asyncio.run(fill())
+    subprocess.run([sys.executable, 'sqlite_database.py', json_path, sqlite_path], check=True, cwd=REPOSITORY)
+    with open(json_path, 'r') as json_file:
+        assert json.load(json_file) == data
+
+    async def read() -> List:
+        db = SqliteDatabase(sqlite_path)
+        try:
+            return [await db.campaign_details('c1'), await db.oneshot_details('1')]
+        finally:
+            db.executor.submit(db.connection.close).result()
+
+    campaign, oneshot = asyncio.run(read())
+    assert (campaign[0]['name'], oneshot[0]['name']) == ('Campaign', 'Shot')
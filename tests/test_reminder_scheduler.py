@@ -0,0 +1,107 @@
+import asyncio
+
+from ReminderScheduler import DEFAULT_REMINDER_LEAD, GAME_DAY_HOUR, ReminderScheduler
+from SessionPinger import SessionPinger
+from TimeHelper import TimeHelper
+from database import Database
+from tests.fakes import FakeClient, FakeClock, FakeGuild
+
+SESSION = '2030-01-10 07:00pm'
+MOVED_SESSION = '2030-01-12 08:00pm'
+
+
+def campaign(session: str, **values) -> dict:
+    entry = {'name': 'Campaign', 'session_ts': TimeHelper.to_epoch(session), 'role': 1, 'channel': 2}
+    entry.update(values)
+    return entry
+
+
+def test_pop_due_returns_reminders_in_due_order():
+    clock = FakeClock(0)
+    scheduler = ReminderScheduler(clock=clock)
+    for entry_id, start in [('c', 3000), ('a', 1000), ('b', 2000)]:
+        scheduler.update_entry('oneshots', entry_id, {'name': entry_id, 'time_ts': start, 'channel': 2, 'reminder_lead': 10})
+
+    assert scheduler.pop_due() == []
+    assert scheduler.next_due() == 1000 - 600
+
+    clock.now = 2000
+    assert [reminder['id'] for reminder in scheduler.pop_due()] == ['a', 'b']
+    clock.now = 10_000
+    assert [reminder['id'] for reminder in scheduler.pop_due()] == ['c']
+    assert scheduler.next_due() is None
+
+
+def test_stale_generations_are_skipped():
+    clock = FakeClock(0)
+    scheduler = ReminderScheduler(clock=clock)
+    scheduler.update_entry('oneshots', '1', {'name': 'Shot', 'time_ts': 1000, 'channel': 2, 'reminder_lead': 0})
+    scheduler.update_entry('oneshots', '1', {'name': 'Shot', 'time_ts': 5000, 'channel': 2, 'reminder_lead': 0})
+    scheduler.update_entry('oneshots', '2', {'name': 'Gone', 'time_ts': 2000, 'channel': 2, 'reminder_lead': 0})
+    scheduler.update_entry('oneshots', '2', None)
+
+    # The outdated heap entries are still there, but never returned
+    assert len(scheduler.heap) == 3
+    assert scheduler.next_due() == 5000
+    clock.now = 6000
+    assert [(reminder['id'], reminder['due']) for reminder in scheduler.pop_due()] == [('1', 5000)]
+    assert len(scheduler.heap) == 0
+
+
+def test_reminders_older_than_the_lateness_are_not_scheduled():
+    clock = FakeClock(10_000)
+    scheduler = ReminderScheduler(clock=clock, max_lateness=600)
+    scheduler.update_entry('oneshots', 'late', {'name': 'Late', 'time_ts': 9500, 'channel': 2, 'reminder_lead': 0})
+    scheduler.update_entry('oneshots', 'missed', {'name': 'Missed', 'time_ts': 9000, 'channel': 2, 'reminder_lead': 0})
+
+    assert [reminder['id'] for reminder in scheduler.pop_due()] == ['late']
+
+
+def test_campaigns_need_a_session_role_and_channel():
+    assert [reminder['kind'] for reminder in ReminderScheduler.reminders_for('campaigns', 'c', campaign(SESSION))] == ['lead']
+    assert ReminderScheduler.reminders_for('campaigns', 'c', {'name': 'Campaign', 'session_ts': 1000, 'channel': 2}) == []
+    assert ReminderScheduler.reminders_for('campaigns', 'c', {'name': 'Campaign', 'role': 1, 'channel': 2}) == []
+    assert ReminderScheduler.reminders_for('campaigns', 'c', {'name': 'Campaign', 'session_ts': 1000, 'role': 1}) == []
+
+
+def test_database_changes_reschedule_the_reminders(db_env):
+    db_env('json')
+
+    async def scenario() -> None:
+        db = Database()
+        pinger = SessionPinger(FakeClient([FakeGuild(1)]), db)
+        clock = FakeClock(TimeHelper.to_epoch('2030-01-01 12:00pm'))
+        pinger.scheduler.clock = clock
+
+        await db.add_campaign('Campaign', 1, 'Homebrew', '', 'c1', guild_id=1)
+        await db.update_campaign_role('c1', 100_000)
+        await db.campaign_change_channel('c1', 150_000)
+        assert pinger.scheduler.next_due() is None
+
+        await db.update_campaign_session_date('c1', SESSION)
+        start = TimeHelper.to_epoch(SESSION)
+        assert pinger.scheduler.next_due() == start - DEFAULT_REMINDER_LEAD * 60
+
+        await db.update_extra_campaign_notification('c1', 'true')
+        game_day = int(TimeHelper.morning_of(TimeHelper.from_epoch(start), GAME_DAY_HOUR).timestamp())
+        assert pinger.scheduler.next_due() == game_day
+
+        # The old session's reminders are outdated, only the moved session's remain
+        await db.update_campaign_session_date('c1', MOVED_SESSION)
+        moved_start = TimeHelper.to_epoch(MOVED_SESSION)
+        clock.now = moved_start
+        assert [(reminder['kind'], reminder['due']) for reminder in pinger.scheduler.pop_due()] == [
+            ('game-day', int(TimeHelper.morning_of(TimeHelper.from_epoch(moved_start), GAME_DAY_HOUR).timestamp())),
+            ('lead', moved_start - DEFAULT_REMINDER_LEAD * 60)
+        ]
+
+        clock.now = TimeHelper.to_epoch('2030-01-01 12:00pm')
+        await db.update_extra_campaign_notification('c1', 'false')
+        await db.update_campaign_session_date('c1', SESSION)
+        clock.now = start
+        assert [reminder['kind'] for reminder in pinger.scheduler.pop_due()] == ['lead']
+
+        await db.delete_campaign('c1')
+        assert pinger.scheduler.next_due() is None
+
+    asyncio.run(scenario())
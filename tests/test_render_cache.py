@@ -0,0 +1,50 @@
+from discord import Embed
+
+from RenderCache import RenderCache
+
+
+def render(entry: dict) -> Embed:
+    return Embed(title=entry['name'], description=entry.get('description', ''))
+
+
+def test_least_recently_used_embeds_are_evicted_by_count(monkeypatch):
+    monkeypatch.setenv('RENDER_CACHE_SIZE', '2')
+    monkeypatch.setenv('RENDER_CACHE_MAX_BYTES', '100000')
+    cache = RenderCache()
+
+    for entry_id in ['1', '2', '3']:
+        cache.get_or_render(1, 'campaigns', {'id': entry_id, 'name': 'Campaign ' + entry_id}, render)
+    assert (len(cache.payloads), cache.evictions) == (2, 1)
+
+
+def test_least_recently_used_embeds_are_evicted_by_size(monkeypatch):
+    monkeypatch.setenv('RENDER_CACHE_SIZE', '100')
+    monkeypatch.setenv('RENDER_CACHE_MAX_BYTES', '300')
+    cache = RenderCache()
+    entries = [{'id': str(i), 'name': 'Campaign', 'description': 'x' * 80} for i in range(3)]
+
+    for entry in entries:
+        cache.get_or_render(1, 'campaigns', entry, render)
+    assert cache.size <= 300
+    # The first one was evicted, the second one is used and so is kept when the first one comes back
+    cache.get_or_render(1, 'campaigns', entries[1], render)
+    cache.get_or_render(1, 'campaigns', entries[0], render)
+    assert [key[2] for key in cache.payloads.keys()] == ['1', '0']
+    assert (cache.hits, cache.misses) == (1, 4)
+
+    # Too big to be cached at all, but still rendered
+    assert cache.get_or_render(1, 'campaigns', {'id': '4', 'name': 'Campaign', 'description': 'x' * 400}, render).description == 'x' * 400
+    assert '4' not in [key[2] for key in cache.payloads.keys()]
+
+
+def test_changes_invalidate_the_entry():
+    cache = RenderCache()
+    entry = {'id': '1', 'name': 'Campaign'}
+    cache.get_or_render(1, 'campaigns', entry, render)
+    cache.get_or_render(2, 'campaigns', entry, render)
+
+    cache.on_database_change('campaigns', '1', dict(entry, name='Renamed'))
+    assert len(cache.payloads) == 0
+    assert cache.get_or_render(1, 'campaigns', dict(entry, name='Renamed'), render).title == 'Renamed'
+    assert cache.get_or_render(1, 'campaigns', dict(entry, name='Renamed'), render).title == 'Renamed'
+    assert (cache.hits, cache.misses) == (1, 3)
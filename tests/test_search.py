@@ -0,0 +1,113 @@
+import random
+from typing import Dict, List
+
+from search import AutocompleteIndex, NameIndex, edit_distance
+
+
+def levenshtein(a: str, b: str) -> int:
+    row = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        previous_row, row = row, [i]
+        for column in range(1, len(b) + 1):
+            row.append(min(row[column - 1] + 1, previous_row[column] + 1, previous_row[column - 1] + (b[column - 1] != char)))
+    return row[-1]
+
+
+def expected_completions(entries: Dict[str, str], positions: Dict[str, int], prefix: str, limit: int) -> List[str]:
+    depths = {}
+    for entry_id, name in entries.items():
+        terms = [entry_id.lower(), name.lower()] + name.lower().split()
+        matching = [len(term) - len(prefix) for term in terms if term.startswith(prefix)]
+        if len(matching) > 0:
+            depths[entry_id] = min(matching)
+    return sorted(depths.keys(), key=lambda entry_id: (depths[entry_id], positions[entry_id]))[:limit]
+
+
+def expected_suggestions(entries: Dict[str, str], positions: Dict[str, int], text: str, limit: int) -> List[str]:
+    max_distance = 1 if len(text) <= 4 else 2
+    distances = {}
+    for entry_id, name in entries.items():
+        distance = min(levenshtein(text, term) for term in [entry_id.lower()] + name.lower().split())
+        if distance <= max_distance:
+            distances[entry_id] = distance
+    return sorted(distances.keys(), key=lambda entry_id: (distances[entry_id], positions[entry_id]))[:limit]
+
+
+def random_word(rng: random.Random) -> str:
+    # A small alphabet, so that many words share prefixes and are a few edits apart
+    return ''.join(rng.choices('abcde', k=rng.randint(1, 6)))
+
+
+def test_edit_distance():
+    assert edit_distance('strahd', 'strahd', 2) == 0
+    assert edit_distance('strahd', 'starhd', 2) == 2
+    assert edit_distance('kign', 'king', 1) == 2
+    assert edit_distance('tomb', 'tombs', 1) == 1
+    assert edit_distance('a', 'abcd', 2) == 3
+    assert edit_distance('', 'ab', 2) == 2
+
+    rng = random.Random(7)
+    for _ in range(2000):
+        a, b = rng.choice(['', random_word(rng)]), random_word(rng) + random_word(rng)
+        for max_distance in range(4):
+            assert edit_distance(a, b, max_distance) == min(levenshtein(a, b), max_distance + 1)
+
+
+def test_name_search_returns_entries_by_position():
+    name_index = NameIndex()
+    name_index.add('b', 'Curse of Strahd', 2)
+    name_index.add('a', 'Curse of the Crown', 1)
+    name_index.add('c', 'Lost Mine', 0)
+    assert name_index.search('curse') == ['a', 'b']
+    assert name_index.search('s') == ['c', 'a', 'b']
+    assert name_index.search('of') == ['a', 'b']
+
+    name_index.add('b', 'Lost Strahd')
+    assert name_index.search('lost') == ['c', 'b']
+    name_index.remove('c')
+    assert name_index.search('lost') == ['b']
+
+
+def test_completions_and_suggestions_match_a_full_scan():
+    rng = random.Random(7)
+    autocomplete_index = AutocompleteIndex()
+    entries: Dict[str, str] = {}
+    positions: Dict[str, int] = {}
+    for i in range(600):
+        entry_id = str(rng.randint(1, 2000)) if i % 2 == 0 else random_word(rng)
+        name = ' '.join(random_word(rng) for _ in range(rng.randint(1, 3)))
+        autocomplete_index.add(entry_id, name)
+        entries[entry_id] = name
+        positions.setdefault(entry_id, i)
+    # Renamed and removed entries leave nothing behind in the trie or the bigram buckets
+    for entry_id in rng.sample(sorted(entries.keys()), 100):
+        if rng.random() < 0.5:
+            autocomplete_index.remove(entry_id)
+            del entries[entry_id]
+            del positions[entry_id]
+        else:
+            entries[entry_id] = ' '.join(random_word(rng) for _ in range(2))
+            autocomplete_index.add(entry_id, entries[entry_id])
+
+    queries = ['', 'a', 'ab', 'abc', 'abcd', 'e', 'ea', '1', '12', '1999', 'abcde', 'eeeee', 'aaaaaa', 'zz', 'ab c', '1a', 'a12b', '19e9'] + [random_word(rng) for _ in range(100)]
+    for query in queries:
+        completions, suggestions = expected_completions(entries, positions, query, 25), expected_suggestions(entries, positions, query, 25)
+        for limit in [1, 3, 25]:
+            assert autocomplete_index.complete(query, limit) == completions[:limit], query
+            assert autocomplete_index.suggest(query, limit) == suggestions[:limit], query
+
+
+def test_whole_names_are_completed_but_not_suggested():
+    autocomplete_index = AutocompleteIndex()
+    autocomplete_index.add('c1', 'Storm King')
+    autocomplete_index.add('c2', 'Stormking')
+
+    assert autocomplete_index.complete('storm k', 25) == ['c1']
+    assert autocomplete_index.complete('STORM', 25) == ['c1', 'c2']
+    # "stormkin" is two edits away from the name of c1, but names are only matched by their words
+    assert autocomplete_index.suggest('stormkin', 25) == ['c2']
+
+    autocomplete_index.remove('c2')
+    assert (autocomplete_index.fuzzy_terms.keys(), autocomplete_index.suggest('stormkin', 25)) == ({'c1', 'storm', 'king'}, [])
+    autocomplete_index.remove('c1')
+    assert (autocomplete_index.root, autocomplete_index.buckets, autocomplete_index.slots) == ({}, {}, {})
@@ -0,0 +1,208 @@
+import asyncio
+
+import pytest
+
+import ActionType
+from MessageHelper import MessageHelper
+from ReminderScheduler import ReminderScheduler
+from SessionPinger import MAX_EMBED_FIELDS, MAX_EMBED_LENGTH, SessionPinger
+from TimeHelper import TimeHelper
+from database import create_database
+from tests.fakes import FakeClient, FakeClock, FakeGuild, FakeTextChannel, FakeUser
+
+START = 2_000_000_000
+
+
+class FailingTextChannel(FakeTextChannel):
+    """Fails the given number of sends before it works again"""
+
+    def __init__(self, guild: FakeGuild, failures: int) -> None:
+        super().__init__(guild, guild.text_channels[0].id, 'failing')
+        self.failures = failures
+        # Takes the place of the guild's first channel
+        guild.text_channels[0] = guild.channels_by_id[self.id] = self
+
+    async def send(self, **kwargs):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError('Discord is unreachable')
+        return await super().send(**kwargs)
+
+
+def create_pinger(db_env, monkeypatch, guild: FakeGuild, now: float, storage: str = 'json'):
+    """A pinger on an empty store, and the list the audit log messages are collected in"""
+    db_env(storage)
+    logged = []
+    monkeypatch.setattr(MessageHelper, 'log', staticmethod(lambda action_type, data: logged.append((action_type, data.get('id', data.get('error'))))))
+    pinger = SessionPinger(FakeClient([guild]), create_database())
+    pinger.scheduler.clock = FakeClock(now)
+    pinger.scheduler.max_lateness = 30 * 60
+    pinger.sent_reminders_loaded = True
+    return pinger, logged
+
+
+def oneshot(start: int, channel: int, lead: int = 60) -> dict:
+    return {'name': 'Shot', 'time_ts': start, 'channel': channel, 'reminder_lead': lead, 'guild_id': 1}
+
+
+def test_failed_reminders_are_retried(db_env, monkeypatch):
+    guild = FakeGuild(1)
+    channel = FailingTextChannel(guild, failures=2)
+    pinger, logged = create_pinger(db_env, monkeypatch, guild, START - 3600)
+
+    async def scenario() -> None:
+        pinger.schedule('oneshots', '1', oneshot(START, channel.id))
+        await pinger.tick()
+        assert logged == [(ActionType.REMINDER_FAILED, '1')]
+        assert pinger.scheduler.next_due() == START - 3600 + pinger.retry_delay
+
+        pinger.scheduler.clock.now += pinger.retry_delay
+        await pinger.tick()
+        assert channel.sent == 0
+        pinger.scheduler.clock.now += pinger.retry_delay
+        await pinger.tick()
+        assert channel.sent == 1
+        assert logged == [(ActionType.REMINDER_FAILED, '1')] * 2
+        assert pinger.sent_reminders == {'oneshots:1:lead:{}'.format(START - 3600)}
+
+    asyncio.run(scenario())
+
+
+def test_retries_end_with_the_lateness(db_env, monkeypatch):
+    guild = FakeGuild(1)
+    channel = FailingTextChannel(guild, failures=1000)
+    pinger, logged = create_pinger(db_env, monkeypatch, guild, START - 3600)
+
+    async def scenario() -> None:
+        pinger.schedule('oneshots', '1', oneshot(START, channel.id))
+        while pinger.scheduler.next_due() is not None:
+            pinger.scheduler.clock.now = pinger.scheduler.next_due()
+            await pinger.tick()
+
+        failures = (30 * 60) // pinger.retry_delay + 1
+        assert logged == [(ActionType.REMINDER_FAILED, '1')] * failures + [(ActionType.REMINDER_DROPPED, '1')]
+        assert channel.sent == 0
+
+    asyncio.run(scenario())
+
+
+def test_the_loop_keeps_running_after_errors(db_env, monkeypatch):
+    guild = FakeGuild(1)
+    channel = guild.text_channels[0]
+    pinger, logged = create_pinger(db_env, monkeypatch, guild, START - 3600)
+    pinger.retry_delay = 0
+    error = ValueError('Half-written file')
+    failures = [error]
+
+    def reload_if_changed() -> None:
+        if len(failures) > 0:
+            raise failures.pop()
+    monkeypatch.setattr(pinger.db, 'reload_if_changed', reload_if_changed)
+
+    async def reschedule_all() -> None:
+        reload_if_changed()
+
+    async def scenario() -> None:
+        pinger.schedule('oneshots', '1', oneshot(START, channel.id))
+        pinger.task = asyncio.create_task(pinger.perform_loop())
+        while channel.sent == 0 and not pinger.task.done():
+            await asyncio.sleep(0.01)
+        assert (channel.sent, logged) == (1, [(ActionType.REMINDER_LOOP_FAILED, error)])
+
+        # A failed reschedule after a reload is logged, the task is kept until it is done
+        failures.append(error)
+        monkeypatch.setattr(pinger, 'reschedule_all', reschedule_all)
+        pinger.on_database_change('oneshots', None, None)
+        assert len(pinger.reschedule_tasks) == 1
+        await asyncio.wait(list(pinger.reschedule_tasks))
+        assert (pinger.reschedule_tasks, logged[1:]) == (set(), [(ActionType.REMINDER_LOOP_FAILED, error)])
+        await pinger.stop()
+
+    asyncio.run(scenario())
+
+
+def test_reminders_missed_before_scheduling_are_logged_as_dropped(db_env, monkeypatch):
+    guild = FakeGuild(1)
+    channel_id = guild.text_channels[0].id
+    # The lead reminder of a oneshot starting in 20 minutes was due 40 minutes ago
+    pinger, logged = create_pinger(db_env, monkeypatch, guild, START - 20 * 60)
+
+    pinger.schedule('oneshots', '1', oneshot(START, channel_id))
+    assert logged == [(ActionType.REMINDER_DROPPED, '1')]
+    assert pinger.scheduler.next_due() is None
+
+    # Changing the oneshot again does not log it twice, and sessions that are over are not logged at all
+    pinger.schedule('oneshots', '1', dict(oneshot(START, channel_id), description='Changed'))
+    pinger.schedule('oneshots', '2', oneshot(START - 3600, channel_id))
+    assert logged == [(ActionType.REMINDER_DROPPED, '1')]
+
+
+@pytest.mark.parametrize('storage', ['json', 'sqlite'])
+def test_sent_reminders_of_upcoming_sessions_survive_restarts(db_env, monkeypatch, storage):
+    guild = FakeGuild(1)
+    channel = guild.text_channels[0]
+    session = TimeHelper.to_epoch('2030-01-01 5:00pm')
+    pinger, logged = create_pinger(db_env, monkeypatch, guild, session - 24 * 3600, storage)
+
+    async def restart(db, now: float) -> SessionPinger:
+        restarted = SessionPinger(FakeClient([guild]), db)
+        restarted.scheduler.clock = FakeClock(now)
+        await restarted.start()
+        await restarted.stop()
+        return restarted
+
+    async def scenario() -> None:
+        oneshot_id = str(await pinger.db.add_oneshot('Shot', FakeUser(1), '', '2030-01-01 5:00pm', channel.id, 1))
+        await pinger.db.oneshot_change_reminder_lead(oneshot_id, 24 * 60)
+        await pinger.tick()
+        assert (channel.sent, logged) == (1, [])
+        key = 'oneshots:{}:lead:{}'.format(oneshot_id, session - 24 * 3600)
+        await pinger.db.flush()
+
+        # Long past the lateness of the reminder, but before the session: it was sent, not missed
+        restarted = await restart(create_database(), session - 22 * 3600)
+        assert (restarted.sent_reminders, logged) == ({key}, [])
+        # Once the session started the reminder is forgotten
+        restarted = await restart(restarted.db, session + 60)
+        assert (restarted.sent_reminders, list(await restarted.db.list_sent_reminders())) == (set(), [])
+        assert (channel.sent, logged) == (1, [])
+        if storage == 'sqlite':
+            for db in [pinger.db, restarted.db]:
+                db.executor.submit(db.connection.close).result()
+
+    asyncio.run(scenario())
+
+
+def test_reminders_of_one_channel_are_batched(db_env, monkeypatch):
+    guild = FakeGuild(1)
+    channel = guild.text_channels[0]
+    pinger, logged = create_pinger(db_env, monkeypatch, guild, START - 3600)
+
+    async def scenario() -> None:
+        for i in range(30):
+            pinger.schedule('oneshots', str(i), oneshot(START, channel.id))
+        # A single reminder in another channel gets its own message
+        pinger.schedule('oneshots', 'other', oneshot(START, guild.text_channels[1].id))
+        await pinger.tick()
+
+    asyncio.run(scenario())
+    # 25 fields is the most one embed can have
+    assert (channel.sent, guild.text_channels[1].sent) == (2, 1)
+    assert len(pinger.sent_reminders) == 31
+
+
+def test_batches_stay_within_the_embed_limits():
+    def reminders(count: int, name_length: int):
+        return [ReminderScheduler.reminders_for('oneshots', str(i), {'name': 'Shot {} '.format(i).ljust(name_length, 'x'), 'time_ts': START, 'channel': 1})[0] for i in range(count)]
+
+    assert [len(batch) for batch, _ in SessionPinger.build_messages(reminders(1, 10))] == [1]
+    assert [len(batch) for batch, _ in SessionPinger.build_messages(reminders(30, 10))] == [25, 5]
+
+    # The name is in the field's name, cut to 256 characters, and in its value, about 630 characters per field
+    long_reminders = reminders(40, 300)
+    messages = SessionPinger.build_messages(long_reminders)
+    assert [len(batch) for batch, _ in messages] == [9, 9, 9, 9, 4]
+    assert [reminder for batch, _ in messages for reminder in batch] == long_reminders
+    for batch, message in messages:
+        assert len(message['embed'].fields) == len(batch) <= MAX_EMBED_FIELDS
+        assert len(message['embed']) <= MAX_EMBED_LENGTH
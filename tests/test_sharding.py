@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+
+from sqlite_database import SqliteDatabase
+from tests.fakes import FakeUser
+
+ONESHOTS = 200
+
+
+def test_processes_sharing_the_sqlite_file_get_unique_oneshot_ids(db_env):
+    db_env('sqlite')
+
+    async def scenario() -> None:
+        # Each connection writes from its own thread, like the processes running the other shards
+        databases = [SqliteDatabase() for _ in range(3)]
+        try:
+            ids = await asyncio.gather(*[db.add_oneshot('Oneshot {}'.format(i), FakeUser(1), '', '2030-01-01 5:00pm', None, 1)
+                                         for i in range(ONESHOTS) for db in databases])
+            assert sorted(ids) == list(range(1, len(databases) * ONESHOTS + 1))
+
+            reader = databases[0]
+            assert reader.executor.submit(lambda: reader.connection.execute('SELECT COUNT(*) FROM oneshots').fetchone()[0]).result() == len(ids)
+        finally:
+            for db in databases:
+                db.executor.submit(db.connection.close).result()
+
+    asyncio.run(scenario())
+
+
+def test_only_sqlite_can_be_shared_by_processes(db_env, monkeypatch):
+    db_env('json')
+    import main
+    monkeypatch.setattr(main.bot, 'shard_count', 2)
+
+    monkeypatch.setattr(main.bot, 'shard_ids', [0, 1])
+    main.check_storage()
+
+    monkeypatch.setattr(main.bot, 'shard_ids', [1])
+    for storage in ['json', 'journal']:
+        monkeypatch.setenv('DB_STORAGE', storage)
+        with pytest.raises(SystemExit):
+            main.check_storage()
+    monkeypatch.setenv('DB_STORAGE', 'sqlite')
+    main.check_storage()
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from database import Database
+from tests.fakes import FakeUser
+
+
+def test_rapid_mutations_are_written_once(db_env):
+    db_env('json', flush_delay=0.05)
+
+    async def scenario():
+        db = Database()
+        writes_before = db.write_count
+        for i in range(50):
+            await db.add_campaign('Campaign {}'.format(i), 1, 'Homebrew', 'Description', str(i))
+            await db.update_campaign_description(str(i), 'Changed')
+        await asyncio.sleep(0.3)
+        return db.write_count - writes_before
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_failed_write_is_retried(db_env, monkeypatch):
+    db_env('json', flush_delay=0.05)
+
+    async def scenario():
+        db = Database()
+        write_snapshot = db.storage.write_snapshot
+        failures = []
+
+        def fail_once(data):
+            if len(failures) == 0:
+                failures.append(True)
+                raise OSError(28, 'No space left on device')
+            write_snapshot(data)
+
+        monkeypatch.setattr(db.storage, 'write_snapshot', fail_once)
+        await db.add_campaign('Campaign', 1, 'Homebrew', 'Description', '1')
+        await asyncio.sleep(0.3)
+        return failures, db.storage.dirty
+
+    failures, dirty = asyncio.run(scenario())
+    assert failures == [True]
+    assert not dirty
+    assert '1' in Database().data['campaigns']
+
+
+def test_changes_during_append_are_not_replayed_after_compaction(db_env, monkeypatch):
+    db_env('journal')
+    # Every append is followed by a compaction
+    monkeypatch.setenv('DB_JOURNAL_MAX_SIZE', '1')
+
+    async def scenario():
+        db = Database()
+        append_to_journal = db.storage.append_to_journal
+        appending, release = threading.Event(), threading.Event()
+
+        def slow_append(changes):
+            appending.set()
+            release.wait(5)
+            append_to_journal(changes)
+
+        monkeypatch.setattr(db.storage, 'append_to_journal', slow_append)
+        await db.add_campaign('Campaign', 1, 'Homebrew', 'Description', 'x')
+        flush = asyncio.create_task(db.flush())
+        await asyncio.get_running_loop().run_in_executor(None, appending.wait, 5)
+        await db.update_campaign_description('x', 'Changed')
+        await db.delete_campaign('x')
+        release.set()
+        await flush
+        # The next append must stay in the journal for the load below to replay it
+        db.storage.max_journal_size = 1024 * 1024
+        await db.flush()
+        return db.data
+
+    data = asyncio.run(scenario())
+    assert 'x' not in data['campaigns']
+    assert Database().data == data
+
+
+def test_crash_between_snapshot_and_truncation_does_not_replay_the_journal(db_env, monkeypatch):
+    db_env('journal')
+
+    async def scenario():
+        db = Database()
+        await db.add_oneshot('First', FakeUser(1), 'Description', '2030-01-01 5:00pm', 2)
+        await db.add_campaign('Campaign', 1, 'Homebrew', 'Description', 'x')
+        await db.flush()
+
+        # The changes made during the next append are only folded into the snapshot, they never reach the old journal
+        db.storage.max_journal_size = 1
+        append_to_journal = db.storage.append_to_journal
+        appending, release = threading.Event(), threading.Event()
+
+        def slow_append(changes):
+            appending.set()
+            release.wait(5)
+            append_to_journal(changes)
+
+        def crash_before_truncation(data):
+            db.storage.write_snapshot(data)
+            raise OSError('Killed')
+
+        monkeypatch.setattr(db.storage, 'append_to_journal', slow_append)
+        monkeypatch.setattr(db.storage, 'compact', crash_before_truncation)
+        await db.update_campaign_description('x', 'Changed')
+        flush = asyncio.create_task(db.flush())
+        await asyncio.get_running_loop().run_in_executor(None, appending.wait, 5)
+        await db.add_oneshot('Second', FakeUser(1), 'Description', '2030-01-01 5:00pm', 2)
+        await db.delete_campaign('x')
+        release.set()
+        with pytest.raises(OSError):
+            await flush
+        return db.data
+
+    data = asyncio.run(scenario())
+    restarted = Database()
+    assert restarted.data == data
+    assert (restarted.data['last_oneshot_id'], 'x' in restarted.data['campaigns']) == (2, False)
+
+    async def add_after_restart():
+        return await restarted.add_oneshot('Third', FakeUser(1), 'Description', '2030-01-01 5:00pm', 2)
+
+    # The ID of the second oneshot is not handed out again
+    assert asyncio.run(add_after_restart()) == 3
+
+
+def test_replay_skips_changes_to_missing_entries(db_env):
+    file_path = db_env('journal')
+
+    async def scenario():
+        db = Database()
+        await db.add_campaign('Campaign', 1, 'Homebrew', 'Description', 'x')
+        await db.flush()
+
+    asyncio.run(scenario())
+    # Journaled without a number, like older versions did
+    with open(file_path + '.journal', 'a') as journal_file:
+        journal_file.write(json.dumps({'op': 'delete', 'path': ['campaigns', 'x']}) + '\n')
+        journal_file.write(json.dumps({'op': 'update', 'path': ['campaigns', 'x'], 'value': {'description': 'Changed'}}) + '\n')
+    assert 'x' not in Database().data['campaigns']
+
+
+def test_failed_append_keeps_the_changes(db_env, monkeypatch):
+    db_env('journal', flush_delay=0.05)
+
+    async def scenario():
+        db = Database()
+        append_to_journal = db.storage.append_to_journal
+        failures = []
+
+        def fail_once(changes):
+            if len(failures) == 0:
+                failures.append(True)
+                raise OSError(13, 'Permission denied')
+            append_to_journal(changes)
+
+        monkeypatch.setattr(db.storage, 'append_to_journal', fail_once)
+        await db.add_campaign('First', 1, 'Homebrew', 'Description', '1')
+        await asyncio.sleep(0.02)
+        await db.add_campaign('Second', 1, 'Homebrew', 'Description', '2')
+        await asyncio.sleep(0.3)
+        return failures, db.data
+
+    failures, data = asyncio.run(scenario())
+    assert failures == [True]
+    assert Database().data == data
@@ -0,0 +1,57 @@
+import asyncio
+import random
+
+import pytest
+
+from database import create_database
+from tests.fakes import FakeUser
+
+TASKS = 300
+
+
+async def append_with_retry(read, write, token: str) -> int:
+    """Read-modify-write of a description that starts over whenever another task changed it in between, returns the conflicts"""
+    conflicts = 0
+    while True:
+        entry = (await read())[0]
+        # Lets the other tasks read the same version before this one writes
+        await asyncio.sleep(0)
+        if await write(entry['description'] + token + ',', entry.get('version', 0)):
+            return conflicts
+        conflicts += 1
+        # Backs off a little, like a user trying again, so that the retries do not all collide again
+        await asyncio.sleep(random.random() * 0.002 * conflicts)
+
+
+@pytest.mark.parametrize('storage', ['json', 'journal', 'sqlite'])
+def test_concurrent_updates_are_not_lost(db_env, storage):
+    db_env(storage)
+
+    async def scenario() -> None:
+        db = create_database()
+        try:
+            await db.add_campaign('Campaign', 1, 'Homebrew', '', 'c1')
+            oneshot_id = str(await db.add_oneshot('Oneshot', FakeUser(1), '', '2030-01-01 5:00pm', 2))
+            tokens = [str(i) for i in range(TASKS)]
+
+            conflicts = await asyncio.gather(
+                *[append_with_retry(lambda: db.campaign_details('c1'),
+                                    lambda description, version: db.update_campaign_description('c1', description, expected_version=version), token) for token in tokens],
+                *[append_with_retry(lambda: db.oneshot_details(oneshot_id),
+                                    lambda description, version: db.update_oneshot_description(oneshot_id, description, expected_version=version), token) for token in tokens])
+            # The test is only meaningful if the tasks actually got in each other's way
+            assert sum(conflicts) > 0
+
+            for entry in [(await db.campaign_details('c1'))[0], (await db.oneshot_details(oneshot_id))[0]]:
+                assert sorted(entry['description'].rstrip(',').split(','), key=int) == tokens
+                assert entry['version'] == TASKS
+
+            # A write with a version that is not the current one any more is refused and changes nothing
+            assert not await db.update_campaign_description('c1', 'Stale', expected_version=TASKS - 1)
+            assert not await db.delete_campaign('c1', expected_version=TASKS - 1)
+            assert (await db.campaign_details('c1'))[0]['version'] == TASKS
+        finally:
+            if storage == 'sqlite':
+                db.executor.submit(db.connection.close).result()
+
+    asyncio.run(scenario())